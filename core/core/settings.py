@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -45,6 +46,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "users.middleware.QueryProfilerMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -78,11 +80,72 @@ WSGI_APPLICATION = "core.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# DB_ENGINE is "sqlite" (the default) or "postgresql". SQLite takes
+# DB_NAME as the file path; PostgreSQL takes DB_NAME, DB_USER,
+# DB_PASSWORD, DB_HOST and DB_PORT. Setting DB_REPLICA_NAME (SQLite) or
+# DB_REPLICA_HOST (PostgreSQL) adds a "replica" alias, any other
+# DB_REPLICA_* value defaulting to the primary's; users.routers sends
+# report and export reads there.
+DB_ENGINE = os.environ.get("DB_ENGINE", "sqlite")
+
+
+def database_from_env(prefix, primary=None):
+    def env(key, default=""):
+        return os.environ.get(f"{prefix}_{key}",
+                              (primary or {}).get(key, default))
+
+    database = {
+        # Reuse connections across requests (per worker thread) for this
+        # many seconds, checking they still work before each request.
+        "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", 60)),
+        "CONN_HEALTH_CHECKS": True,
     }
+    if DB_ENGINE == "postgresql":
+        database.update({
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": env("NAME", "hospital"),
+            "USER": env("USER"),
+            "PASSWORD": env("PASSWORD"),
+            "HOST": env("HOST", "localhost"),
+            "PORT": env("PORT", "5432"),
+        })
+    elif DB_ENGINE == "sqlite":
+        database.update({
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": env("NAME", BASE_DIR / "db.sqlite3"),
+            # BEGIN IMMEDIATE takes the write lock when a transaction
+            # starts, so a read-then-write transaction waits out
+            # busy_timeout instead of failing with "database is locked"
+            # when it tries to upgrade.
+            "OPTIONS": {"transaction_mode": "IMMEDIATE"},
+        })
+    else:
+        raise ImproperlyConfigured(
+            f"DB_ENGINE must be sqlite or postgresql, not {DB_ENGINE!r}.")
+    return database
+
+
+DATABASES = {"default": database_from_env("DB")}
+if os.environ.get("DB_REPLICA_NAME") or os.environ.get("DB_REPLICA_HOST"):
+    DATABASES["replica"] = database_from_env("DB_REPLICA",
+                                             DATABASES["default"])
+    # The replica receives the primary's data by replication, so tests
+    # read it through the primary's test database.
+    DATABASES["replica"]["TEST"] = {"MIRROR": "default"}
+DATABASE_ROUTERS = ["users.routers.PrimaryReplicaRouter"]
+
+# Applied to every new SQLite connection (users.sqlite). WAL lets readers
+# carry on while a write commits; synchronous=normal skips the fsync per
+# commit, which in WAL mode can lose the last commits on power failure
+# but never corrupts the database. cache_size is in KiB when negative.
+# busy_timeout (ms) is how long a writer waits for the lock.
+SQLITE_PRAGMAS = {
+    "journal_mode": "wal",
+    "synchronous": "normal",
+    "cache_size": -64 * 1024,
+    "mmap_size": 256 * 1024 * 1024,
+    "busy_timeout": 10_000,
+    "temp_store": "memory",
 }
 
 
@@ -104,6 +167,60 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing. PASSWORD_HASHER picks the tier new passwords are
+# hashed with: "pbkdf2" (the default), "scrypt" or "argon2" (needs
+# argon2-cffi). The other tiers stay listed so existing hashes still
+# verify; users.hashers applies the PASSWORD_* costs below, and a
+# password hashed with another tier or other costs is rehashed at its
+# next successful login. The defaults are Django's own. Login latency
+# per tier is exported at /metrics/auth/; compare tiers and costs with
+# "manage.py bench_logins".
+PASSWORD_HASHER_TIERS = {
+    "pbkdf2": "users.hashers.PBKDF2PasswordHasher",
+    "scrypt": "users.hashers.ScryptPasswordHasher",
+    "argon2": "users.hashers.Argon2PasswordHasher",
+}
+PASSWORD_HASHER = os.environ.get("PASSWORD_HASHER", "pbkdf2")
+if PASSWORD_HASHER not in PASSWORD_HASHER_TIERS:
+    raise ImproperlyConfigured(
+        f"PASSWORD_HASHER must be one of "
+        f"{', '.join(PASSWORD_HASHER_TIERS)}, not {PASSWORD_HASHER!r}.")
+PASSWORD_HASHERS = [
+    PASSWORD_HASHER_TIERS[PASSWORD_HASHER],
+    *(path for tier, path in PASSWORD_HASHER_TIERS.items()
+      if tier != PASSWORD_HASHER),
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+]
+PASSWORD_HASHER_PARAMS = {
+    "pbkdf2": {
+        "iterations": int(os.environ.get("PASSWORD_PBKDF2_ITERATIONS",
+                                         1_000_000)),
+    },
+    "scrypt": {
+        "work_factor": int(os.environ.get("PASSWORD_SCRYPT_WORK_FACTOR",
+                                          2 ** 14)),
+        "block_size": int(os.environ.get("PASSWORD_SCRYPT_BLOCK_SIZE", 8)),
+        "parallelism": int(os.environ.get("PASSWORD_SCRYPT_PARALLELISM", 5)),
+    },
+    "argon2": {
+        "time_cost": int(os.environ.get("PASSWORD_ARGON2_TIME_COST", 2)),
+        # KiB
+        "memory_cost": int(os.environ.get("PASSWORD_ARGON2_MEMORY_COST",
+                                          102_400)),
+        "parallelism": int(os.environ.get("PASSWORD_ARGON2_PARALLELISM",
+                                          8)),
+    },
+}
+
+# ModelBackend that also records how long each authentication takes
+# (users.authentication). Plain ModelBackend stays listed so sessions
+# logged in through it remain valid; it never checks a password itself.
+AUTHENTICATION_BACKENDS = [
+    "users.authentication.TimedModelBackend",
+    "django.contrib.auth.backends.ModelBackend",
+]
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -134,6 +251,40 @@ STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Admin changelists over unfiltered tables larger than this use the
+# planner's row estimate (or a count cached for the timeout, in seconds)
+# instead of SELECT COUNT(*).
+ESTIMATED_COUNT_THRESHOLD = 100_000
+ESTIMATED_COUNT_CACHE_TIMEOUT = 300
+
+# "reference" holds rarely changing lookups (users.reference): an
+# in-process LRU with a TTL by default, or Redis shared by every worker
+# when REDIS_URL is set.
+REFERENCE_CACHE_TIMEOUT = 300
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "reference": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "reference",
+        "TIMEOUT": REFERENCE_CACHE_TIMEOUT,
+        "OPTIONS": {"MAX_ENTRIES": 1000},
+    },
+}
+if os.environ.get("REDIS_URL"):
+    CACHES["reference"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ["REDIS_URL"],
+        "TIMEOUT": REFERENCE_CACHE_TIMEOUT,
+        "KEY_PREFIX": "hospital",
+    }
+
+# Per-request query counts, DB time and N+1 warnings (Server-Timing
+# header and logs/django.log). Off unless DEBUG or QUERY_PROFILER=1.
+QUERY_PROFILER_ENABLED = DEBUG or os.environ.get("QUERY_PROFILER") == "1"
+QUERY_PROFILER_N_PLUS_ONE_THRESHOLD = 5
+
 # Crispy Forms
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap4"
 CRISPY_TEMPLATE_PACK = "bootstrap4"
@@ -151,7 +302,7 @@ LOGGING = {
     },
     "handlers": {
         "file": {
-            "level": "WARNING",
+            "level": "INFO",
             "class": "logging.FileHandler",
             "filename": log_file_path,
             "formatter": "verbose",
@@ -159,5 +310,7 @@ LOGGING = {
     },
     "loggers": {
         "django": {"handlers": ["file"], "level": "WARNING", "propagate": True},
+        "users.queries": {"handlers": ["file"], "level": "INFO",
+                          "propagate": False},
     },
 }
\ No newline at end of file
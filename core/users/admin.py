@@ -1,16 +1,131 @@
 from django.contrib import admin
 from .models import CustomUser, Patients, Department
-from .models import Doctors, Insurance, Appointments
+from .models import Doctors, Insurance, Appointments, DoctorSchedule
+from .models import Patient_Doctor
+from .paginators import EstimatedCountPaginator
 
 
 admin.site.site_header = "My Hospital Administration System"
 admin.site.site_title = "Hospital Admin Portal"
 admin.site.index_title = "Welcome to the Hospital Management Dashboard"
 
-# Register your models here.
-admin.site.register(CustomUser)
-admin.site.register(Patients)
-admin.site.register(Department)
-admin.site.register(Doctors)
-admin.site.register(Insurance)
-admin.site.register(Appointments)
+
+# Changelists join everything their rows display (list_select_related),
+# so a page costs the same number of queries however many rows it shows.
+# Names come from the denormalised full_name columns, so listing, sorting
+# and searching by name never join CustomUser.
+# FK pickers are autocompletes instead of <select>s of every row, and
+# show_full_result_count=False skips the unfiltered COUNT(*). Past
+# ESTIMATED_COUNT_THRESHOLD rows the paginator estimates that count too.
+class HospitalAdmin(admin.ModelAdmin):
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    list_per_page = 50
+
+
+@admin.register(CustomUser)
+class CustomUserAdmin(HospitalAdmin):
+    list_display = ("email", "first_name", "last_name", "is_staff",
+                    "is_active")
+    list_filter = ("is_staff", "is_active")
+    search_fields = ("email", "first_name", "last_name")
+    readonly_fields = ("last_login", "date_joined")
+    filter_horizontal = ("groups", "user_permissions")
+
+
+@admin.register(Patients)
+class PatientsAdmin(HospitalAdmin):
+    list_display = ("name", "email", "dob", "gender")
+    list_select_related = ("user",)
+    list_filter = ("gender",)
+    search_fields = ("full_name", "user__email")
+    autocomplete_fields = ("user",)
+
+    @admin.display(ordering="full_name")
+    def name(self, obj):
+        return obj.name
+
+    @admin.display(ordering="user__email")
+    def email(self, obj):
+        return obj.user.email
+
+
+@admin.register(Department)
+class DepartmentAdmin(HospitalAdmin):
+    list_display = ("name", "head_doctor_name")
+    list_select_related = ("head_doctor",)
+    search_fields = ("name",)
+    autocomplete_fields = ("head_doctor",)
+
+    @admin.display(description="Head doctor",
+                   ordering="head_doctor__full_name")
+    def head_doctor_name(self, obj):
+        return obj.head_doctor.name if obj.head_doctor else None
+
+
+class DoctorScheduleInline(admin.TabularInline):
+    model = DoctorSchedule
+    extra = 0
+
+
+@admin.register(Doctors)
+class DoctorsAdmin(HospitalAdmin):
+    inlines = (DoctorScheduleInline,)
+    list_display = ("name", "specialization", "department", "gender")
+    list_select_related = ("department",)
+    list_filter = ("gender",)
+    search_fields = ("full_name", "specialization", "user__email")
+    autocomplete_fields = ("user", "department")
+
+    @admin.display(ordering="full_name")
+    def name(self, obj):
+        return obj.name
+
+
+@admin.register(Insurance)
+class InsuranceAdmin(HospitalAdmin):
+    list_display = ("patient_name", "provider", "policy_number")
+    list_select_related = ("patient",)
+    search_fields = ("provider", "policy_number")
+    autocomplete_fields = ("patient",)
+
+    @admin.display(description="Patient", ordering="patient__full_name")
+    def patient_name(self, obj):
+        return obj.patient.name
+
+
+@admin.register(Appointments)
+class AppointmentsAdmin(HospitalAdmin):
+    list_display = ("appointment_date", "patient_name", "doctor_name",
+                    "status")
+    list_select_related = ("patient", "doctor")
+    list_filter = ("status",)
+    date_hierarchy = "appointment_date"
+    autocomplete_fields = ("patient", "doctor")
+
+    @admin.display(description="Patient", ordering="patient__full_name")
+    def patient_name(self, obj):
+        return obj.patient.name
+
+    @admin.display(description="Doctor", ordering="doctor__full_name")
+    def doctor_name(self, obj):
+        return obj.doctor.name
+
+
+# Doctors.patient goes through Patient_Doctor, which the doctor form
+# cannot edit; panels are managed here, a page at a time.
+@admin.register(Patient_Doctor)
+class PatientDoctorAdmin(HospitalAdmin):
+    list_display = ("patient_name", "doctor_name", "relationship_type")
+    list_select_related = ("patient", "doctor")
+    list_filter = ("relationship_type",)
+    search_fields = ("patient__full_name", "doctor__full_name")
+    autocomplete_fields = ("patient", "doctor")
+
+    @admin.display(description="Patient", ordering="patient__full_name")
+    def patient_name(self, obj):
+        return obj.patient.name
+
+    @admin.display(description="Doctor", ordering="doctor__full_name")
+    def doctor_name(self, obj):
+        return obj.doctor.name
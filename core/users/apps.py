@@ -1,6 +1,25 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+
+
+def install_search_triggers(using, **kwargs):
+    # Table rebuilds during migrate drop SQLite triggers; put them back.
+    from django.db import connections
+    from . import search
+
+    search.install_triggers(connections[using])
 
 
 class UsersConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "users"
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .sqlite import configure_connection
+
+        connection_created.connect(configure_connection,
+                                   dispatch_uid="users.sqlite_pragmas")
+
+        post_migrate.connect(install_search_triggers, sender=self)
@@ -0,0 +1,181 @@
+from collections import namedtuple
+from time import monotonic, sleep
+from django.db import transaction
+from django.db.models import BooleanField, F, Max, Value
+from .models import (
+    Appointments, ArchivedAppointments, ArchivedPrescriptions,
+    ArchivedSurgeries, Prescriptions, Status, Surgeries
+)
+from .routers import on_replica
+from .scheduling import pk_ranges
+
+# Cold data. archive_records moves Completed and Cancelled appointments
+# (with their prescriptions) and surgeries older than a cutoff into the
+# Archived* tables, keeping their primary keys; records() reads a date
+# range from both sides, touching the archive only when the range
+# reaches back into it. Code that can only read the hot tables calls
+# require_hot() so a range reaching the archive fails loudly instead of
+# silently missing rows.
+#
+# Hot rows are removed with _raw_delete, a plain DELETE: the rollup
+# signals must not fire (archived rows still count in DailyStatistics)
+# and prescriptions are moved explicitly rather than cascaded.
+
+ARCHIVED_STATUSES = (Status.COMPLETED, Status.CANCELLED)
+
+
+class ArchivedRange(ValueError):
+    pass
+
+
+Archived = namedtuple("Archived",
+                      ["appointments", "prescriptions", "surgeries",
+                       "seconds"])
+
+# "horizon" is the indexed archive column holding the latest archived
+# date; prescriptions are dated by their appointment.
+SOURCES = {
+    "appointments": {
+        "hot": Appointments, "archive": ArchivedAppointments,
+        "date_field": "appointment_date",
+        "horizon": (ArchivedAppointments, "appointment_date"),
+    },
+    "prescriptions": {
+        "hot": Prescriptions, "archive": ArchivedPrescriptions,
+        "date_field": "appointment__appointment_date",
+        "horizon": (ArchivedAppointments, "appointment_date"),
+    },
+    "surgeries": {
+        "hot": Surgeries, "archive": ArchivedSurgeries,
+        "date_field": "surgery_date",
+        "horizon": (ArchivedSurgeries, "surgery_date"),
+    },
+}
+
+
+def _columns(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def _move(rows, archive):
+    """Copy ``rows`` into ``archive`` and delete them; returns the count."""
+    columns = _columns(rows.model)
+    moved = len(archive.objects.bulk_create(
+        [archive(**row) for row in rows.values(*columns)]))
+    if moved:
+        rows._raw_delete(rows.db)
+    return moved
+
+
+def archive_appointment_batch(low, high, cutoff):
+    """Archive eligible appointments with pk in [low, high).
+
+    Returns (appointments, prescriptions) moved.
+    """
+    with transaction.atomic():
+        ids = list(Appointments.objects.select_for_update().filter(
+            pk__gte=low, pk__lt=high, status__in=ARCHIVED_STATUSES,
+            appointment_date__lt=cutoff,
+        ).values_list("pk", flat=True))
+        if not ids:
+            return 0, 0
+        # Parents first, so the archived prescriptions' key resolves.
+        appointments = _move(Appointments.objects.filter(pk__in=ids),
+                             ArchivedAppointments)
+        prescriptions = _move(
+            Prescriptions.objects.filter(appointment_id__in=ids),
+            ArchivedPrescriptions)
+    return appointments, prescriptions
+
+
+def archive_surgery_batch(low, high, cutoff):
+    with transaction.atomic():
+        ids = list(Surgeries.objects.select_for_update().filter(
+            pk__gte=low, pk__lt=high, surgery_date__lt=cutoff,
+        ).values_list("pk", flat=True))
+        if not ids:
+            return 0
+        return _move(Surgeries.objects.filter(pk__in=ids), ArchivedSurgeries)
+
+
+def archive_records(cutoff, batch_size=1000, pause=0, progress=None):
+    """Move everything older than ``cutoff`` into the archive tables.
+
+    Works through primary-key ranges of ``batch_size`` with a short
+    transaction each (see scheduling.pk_ranges), sleeping ``pause``
+    seconds after each batch that moved rows.
+    ``progress(kind, moved_so_far)`` is called after every batch. Safe
+    to re-run: rows already moved are no longer candidates.
+    """
+    started = monotonic()
+    appointments = prescriptions = surgeries = 0
+    candidates = Appointments.objects.filter(
+        status__in=ARCHIVED_STATUSES, appointment_date__lt=cutoff)
+    wrote = False
+    for low, high in pk_ranges(candidates, batch_size):
+        if wrote and pause:
+            sleep(pause)
+        moved = archive_appointment_batch(low, high, cutoff)
+        wrote = any(moved)
+        appointments += moved[0]
+        prescriptions += moved[1]
+        if progress is not None:
+            progress("appointments", appointments)
+
+    candidates = Surgeries.objects.filter(surgery_date__lt=cutoff)
+    for low, high in pk_ranges(candidates, batch_size):
+        if wrote and pause:
+            sleep(pause)
+        moved = archive_surgery_batch(low, high, cutoff)
+        wrote = moved > 0
+        surgeries += moved
+        if progress is not None:
+            progress("surgeries", surgeries)
+    return Archived(appointments, prescriptions, surgeries,
+                    monotonic() - started)
+
+
+def horizon(kind):
+    """The latest archived date for ``kind``, or None if none archived."""
+    archive, date_field = SOURCES[kind]["horizon"]
+    return archive.objects.aggregate(latest=Max(date_field))["latest"]
+
+
+def reaches_archive(kind, start):
+    """Whether ``kind`` rows from ``start`` on include archived ones."""
+    latest = horizon(kind)
+    return latest is not None and (start is None or start <= latest)
+
+
+def require_hot(kind, start):
+    """Raise ArchivedRange if rows from ``start`` on have been archived."""
+    if reaches_archive(kind, start):
+        raise ArchivedRange(
+            f"{kind} up to {horizon(kind):%Y-%m-%d} are archived; start "
+            f"after that or read them with archive.records().")
+
+
+@on_replica
+def records(kind, start=None, end=None, **filters):
+    """``kind`` rows dated in [start, end) from hot and archived tables.
+
+    Rows are dicts of the model's columns plus ``date`` and ``archived``,
+    ordered by date and id. ``filters`` apply to both sides, so they may
+    only name fields the two models share.
+    """
+    source = SOURCES[kind]
+
+    def select(model, archived):
+        rows = model.objects.filter(**filters)
+        if start is not None:
+            rows = rows.filter(**{f"{source['date_field']}__gte": start})
+        if end is not None:
+            rows = rows.filter(**{f"{source['date_field']}__lt": end})
+        return rows.values(
+            *_columns(source["hot"]), date=F(source["date_field"]),
+            archived=Value(archived, output_field=BooleanField()))
+
+    rows = select(source["hot"], False)
+    if reaches_archive(kind, start):
+        rows = rows.union(select(source["archive"], True), all=True)
+    return rows.order_by("date", source["hot"]._meta.pk.attname)
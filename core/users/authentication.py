@@ -0,0 +1,77 @@
+import threading
+from bisect import bisect_left
+from time import perf_counter
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import get_hasher
+from django.core.exceptions import PermissionDenied
+
+# Login latency histograms for this process, exported in Prometheus text
+# format by the auth_metrics view. Almost all of an authentication is the
+# password hash (the backend hashes even for unknown emails, so failures
+# cost the same), plus the rehash and its UPDATE on the first login after
+# the hasher tier or its costs change. Observations are labelled with the
+# preferred hasher so tiers can be compared across deploys.
+
+# Upper bounds in seconds; a final +Inf bucket is implied.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_lock = threading.Lock()
+_histograms = {}
+
+
+def observe(outcome, seconds, hasher=None):
+    if hasher is None:
+        hasher = get_hasher().algorithm
+    with _lock:
+        histogram = _histograms.setdefault(
+            (outcome, hasher),
+            {"buckets": [0] * (len(BUCKETS) + 1), "sum": 0.0, "count": 0})
+        histogram["buckets"][bisect_left(BUCKETS, seconds)] += 1
+        histogram["sum"] += seconds
+        histogram["count"] += 1
+
+
+def stats():
+    """{(outcome, hasher): {"buckets", "sum", "count"}} for this process.
+
+    "buckets" holds the count per bucket of BUCKETS (plus +Inf), not the
+    cumulative counts Prometheus expects.
+    """
+    with _lock:
+        return {key: {**histogram, "buckets": list(histogram["buckets"])}
+                for key, histogram in _histograms.items()}
+
+
+def reset_stats():
+    with _lock:
+        _histograms.clear()
+
+
+class TimedModelBackend(ModelBackend):
+    """ModelBackend recording each authentication's duration and outcome.
+
+    Sessions store the path of the backend that logged them in, and
+    settings keep plain ModelBackend listed after this one so sessions
+    from before it still load. A rejected password ends authentication
+    here (PermissionDenied) instead of ModelBackend hashing it again.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        started = perf_counter()
+        user = super().authenticate(request, username, password, **kwargs)
+        return self.record(user, password, started)
+
+    async def aauthenticate(self, request, username=None, password=None,
+                            **kwargs):
+        started = perf_counter()
+        user = await super().aauthenticate(request, username, password,
+                                           **kwargs)
+        return self.record(user, password, started)
+
+    def record(self, user, password, started):
+        if password is None:
+            return user
+        observe("success" if user else "failure", perf_counter() - started)
+        if user is None:
+            raise PermissionDenied
+        return user
@@ -0,0 +1,651 @@
+import asyncio
+import inspect
+import random
+import statistics
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import timedelta
+from functools import partial
+from wsgiref.util import setup_testing_defaults
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import (
+    OperationalError, connection, connections, transaction
+)
+from django.db.models import Count, Max, Min, Prefetch, Q, QuerySet
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import now
+from . import reports, rollups, sqlite
+from .models import (
+    Appointments, Department, Doctors, Insurance, Patients, Prescriptions
+)
+
+# The reports from Queries.py, keyed "<set><number>_<summary>": set "a" is
+# the first list in that file and "b" the second. Write-only snippets
+# (a04, a12, b10) and b30, which has no meaningful query, are left out;
+# b28 is the same query as b19.
+QUERIES = {}
+
+
+def benchmark(name):
+    def register(func):
+        QUERIES[name] = func
+        return func
+    return register
+
+
+@benchmark("a01_appointments_next_7_days")
+def appointments_next_7_days():
+    today = now()
+    return Appointments.objects.filter(
+        appointment_date__range=[today, today + timedelta(days=7)]
+    ).select_related("patient", "doctor")
+
+
+@benchmark("a02_uninsured_patients_seen_last_month")
+def uninsured_patients_seen_last_month():
+    last_month = now() - timedelta(days=30)
+    return Patients.objects.filter(
+        insurance_patient__isnull=True,
+        appointments_as_patient__appointment_date__gte=last_month,
+    ).distinct()
+
+
+@benchmark("a03_doctors_over_10_appointments_6_months")
+def doctors_over_10_appointments_6_months():
+    last_6_months = now() - timedelta(days=180)
+    return Doctors.objects.annotate(appointment_count=Count(
+        "appointments_as_doctor",
+        filter=Q(appointments_as_doctor__appointment_date__gte=last_6_months),
+    )).filter(appointment_count__gt=10)
+
+
+@benchmark("a06_providers_with_active_patients")
+def providers_with_active_patients():
+    return Insurance.objects.filter(patient__user__is_active=True).values(
+        "provider").distinct().order_by("provider")
+
+
+@benchmark("a07_departments_3_doctors_no_head")
+def departments_3_doctors_no_head():
+    return Department.objects.annotate(doctor_count=Count("doctors")).filter(
+        doctor_count__gte=3, head_doctor__isnull=True)
+
+
+@benchmark("a09_recent_patients_with_prescriptions")
+def recent_patients_with_prescriptions():
+    time_limit = now() - timedelta(days=30)
+    return Patients.objects.filter(
+        appointments_as_patient__appointment_date__gte=time_limit
+    ).prefetch_related(Prefetch(
+        "prescription_patient_id", queryset=Prescriptions.objects.all()
+    )).order_by("-appointments_as_patient__appointment_date")
+
+
+@benchmark("a11_average_age_surgery_without_appointment")
+def average_age_surgery_without_appointment():
+    today = now()
+    patients = Patients.objects.filter(
+        patient_surgery__isnull=False,
+        appointments_as_patient__isnull=True,
+        dob__isnull=False,
+    )
+    ages = [today.year - patient.dob.year for patient in patients]
+    return sum(ages) / len(ages) if ages else None
+
+
+@benchmark("a13_doctors_5_prescriptions")
+def doctors_5_prescriptions():
+    return Doctors.objects.annotate(
+        prescription_count=Count("prescription_doctor_id")
+    ).filter(prescription_count__gte=5)
+
+
+@benchmark("a14_xyz_insured_appointments_not_sunday")
+def xyz_insured_appointments_not_sunday():
+    return Appointments.objects.filter(
+        patient__insurance_patient__provider="XYZ Insurance"
+    ).exclude(appointment_date__week_day=1)
+
+
+@benchmark("b01_doctors_5_surgeries_past_year")
+def doctors_5_surgeries_past_year():
+    past_year = now() - timedelta(days=365)
+    return Doctors.objects.annotate(surgery_count=Count(
+        "doctor_surgery",
+        filter=Q(doctor_surgery__surgery_date__gte=past_year),
+    )).filter(surgery_count__gte=5).values_list("doctor_id", flat=True)
+
+
+@benchmark("b02_patients_with_appointment_or_surgery")
+def patients_with_appointment_or_surgery():
+    patient_appoint = Patients.objects.filter(
+        appointments_as_patient__isnull=False).distinct()
+    patient_sur = Patients.objects.filter(
+        patient_surgery__isnull=False).distinct()
+    return patient_appoint.union(patient_sur)
+
+
+@benchmark("b03_patients_with_appointment_and_prescription")
+def patients_with_appointment_and_prescription():
+    return Patients.objects.filter(
+        Q(appointments_as_patient__isnull=False)
+        & Q(prescription_patient_id__isnull=False))
+
+
+@benchmark("b04_patients_with_appointment_no_prescription")
+def patients_with_appointment_no_prescription():
+    return Patients.objects.filter(
+        Q(appointments_as_patient__isnull=False)
+        & Q(prescription_patient_id__isnull=True))
+
+
+@benchmark("b05_uninsured_patients_multiple_doctors")
+def uninsured_patients_multiple_doctors():
+    return Patients.objects.annotate(doctor_count=Count(
+        "appointments_as_patient__doctor", distinct=True
+    )).filter(doctor_count__gt=1).exclude(
+        insurance_patient__isnull=False
+    ).prefetch_related("appointments_as_patient__doctor")
+
+
+@benchmark("b06_specializations_by_doctor_count")
+def specializations_by_doctor_count():
+    return Doctors.objects.values("specialization").distinct().annotate(
+        number_of_doc=Count("doctor_id")).order_by("-number_of_doc")
+
+
+@benchmark("b08_painkiller_patients")
+def painkiller_patients():
+    prescrip = Prescriptions.objects.filter(
+        medicine_detail__icontains="Painkiller")
+    return Patients.objects.filter(
+        Q(prescription_patient_id__in=prescrip.values("patient"))
+        & Q(prescription_patient_id__isnull=False))
+
+
+@benchmark("b09_doctors_5_to_15_patients_past_year")
+def doctors_5_to_15_patients_past_year():
+    one_year_ago = now() - timedelta(days=365)
+    return Doctors.objects.annotate(patient_count=Count(
+        "appointments_as_doctor__patient", distinct=True
+    )).filter(
+        patient_count__gt=5, patient_count__lt=15,
+        appointments_as_doctor__appointment_date__gte=one_year_ago,
+    ).distinct()
+
+
+@benchmark("b11_insured_patients_with_surgery")
+def insured_patients_with_surgery():
+    return Patients.objects.filter(
+        Q(insurance_patient__isnull=False) & Q(patient_surgery__isnull=False)
+    ).select_related("insurance_patient").prefetch_related("patient_surgery")
+
+
+@benchmark("b12_doctor_appointment_counts")
+def doctor_appointment_counts():
+    return Doctors.objects.annotate(
+        count_appoint=Count("appointments_as_doctor"))
+
+
+@benchmark("b13_scheduled_next_30_days")
+def scheduled_next_30_days():
+    current_time = now()
+    return Appointments.objects.filter(
+        appointment_date__range=[current_time,
+                                 current_time + timedelta(days=30)],
+        status="Scheduled",
+    ).order_by("appointment_date")
+
+
+@benchmark("b14_youngest_and_oldest_patient")
+def youngest_and_oldest_patient():
+    dob_agg = Patients.objects.aggregate(old=Min("dob"), elder=Max("dob"))
+    oldest = Patients.objects.filter(dob=dob_agg["old"]).first()
+    youngest = Patients.objects.filter(dob=dob_agg["elder"]).first()
+    return [oldest, youngest]
+
+
+@benchmark("b15_departments_by_doctor_count")
+def departments_by_doctor_count():
+    return Department.objects.annotate(
+        count_doc=Count("doctors")).order_by("-count_doc")
+
+
+@benchmark("b16_dermatology_appointments")
+def dermatology_appointments():
+    return Appointments.objects.filter(
+        doctor__specialization__icontains="Dermatology"
+    ).select_related("doctor")
+
+
+@benchmark("b17_patients_appointment_no_surgery")
+def patients_appointment_no_surgery():
+    patient1 = Patients.objects.filter(appointments_as_patient__isnull=False)
+    patient2 = Patients.objects.filter(patient_surgery__isnull=False)
+    return patient1.difference(patient2)
+
+
+@benchmark("b18_department_head_doctors")
+def department_head_doctors():
+    return Department.objects.select_related("head_doctor").all()
+
+
+@benchmark("b19_surgeries_per_department")
+def surgeries_per_department():
+    return Department.objects.annotate(
+        total_surgeries=Count("doctors__doctor_surgery")
+    ).values("name", "total_surgeries")
+
+
+@benchmark("b20_patients_appointment_prescription_surgery")
+def patients_appointment_prescription_surgery():
+    with_appointments = Patients.objects.filter(
+        appointments_as_patient__isnull=False)
+    with_prescriptions = Patients.objects.filter(
+        prescription_patient_id__isnull=False)
+    with_surgeries = Patients.objects.filter(patient_surgery__isnull=False)
+    return with_appointments.intersection(with_prescriptions, with_surgeries)
+
+
+@benchmark("b21_prescriptions_last_7_days")
+def prescriptions_last_7_days():
+    return Prescriptions.objects.filter(
+        Q(appointment__appointment_date__gte=now() - timedelta(days=7)))
+
+
+@benchmark("b22_providers_over_5_patients")
+def providers_over_5_patients():
+    return Insurance.objects.values("provider").annotate(
+        count_provider=Count("patient")).filter(count_provider__gt=5)
+
+
+@benchmark("b23_doctors_10_prescriptions")
+def doctors_10_prescriptions():
+    return Doctors.objects.annotate(
+        prescription_count=Count("prescription_doctor_id")
+    ).filter(prescription_count__gte=10)
+
+
+@benchmark("b24_patients_last_name_s")
+def patients_last_name_s():
+    return Patients.objects.filter(user__last_name__startswith="S")
+
+
+@benchmark("b25_gender_counts")
+def gender_counts():
+    return Patients.objects.aggregate(
+        male_count=Count("patient_id", filter=Q(gender="Male")),
+        female_count=Count("patient_id", filter=Q(gender="Female")),
+    )
+
+
+@benchmark("b26_top_surgeon")
+def top_surgeon():
+    return Doctors.objects.annotate(
+        surgery_count=Count("doctor_surgery")
+    ).order_by("-surgery_count").first()
+
+
+@benchmark("b27_repeat_visits")
+def repeat_visits():
+    return Appointments.objects.values("patient", "doctor").annotate(
+        visit_count=Count("appointment_id")).filter(visit_count__gt=1)
+
+
+@benchmark("b31_patients_without_phone")
+def patients_without_phone():
+    return Patients.objects.exclude(
+        user__phone_number__isnull=False
+    ).exclude(user__phone_number__exact="")
+
+
+@benchmark("b32_top_doctors_by_patients")
+def top_doctors_by_patients():
+    return Doctors.objects.annotate(
+        patient_count=Count("patient")).order_by("-patient_count")[:5]
+
+
+@benchmark("b33_departments_10_doctors")
+def departments_10_doctors():
+    return Department.objects.annotate(
+        doctor_count=Count("doctors")).filter(doctor_count__gte=10)
+
+
+@benchmark("b34_patients_surgery_no_prescription")
+def patients_surgery_no_prescription():
+    with_surgery = Patients.objects.filter(patient_surgery__isnull=False)
+    with_prescriptions = Patients.objects.filter(
+        prescription_patient_id__isnull=False)
+    return with_surgery.difference(with_prescriptions)
+
+
+@benchmark("b35_most_prescribed_medicine")
+def most_prescribed_medicine():
+    return Prescriptions.objects.values("medicine_detail").annotate(
+        medicine_count=Count("medicine_detail")
+    ).order_by("-medicine_count")[:1]
+
+
+# The optimized users.reports versions run alongside as "reports.<name>".
+for _name, _func in inspect.getmembers(reports, inspect.isfunction):
+    if _func.__module__ == reports.__name__ and not _name.startswith("_"):
+        QUERIES[f"reports.{_name}"] = _func
+
+# Dashboard totals read from the DailyStatistics rollup instead.
+QUERIES["rollups.appointments_per_doctor"] = rollups.appointments_per_doctor
+QUERIES["rollups.surgeries_per_department"] = rollups.surgeries_per_department
+QUERIES["rollups.prescriptions_per_doctor"] = rollups.prescriptions_per_doctor
+
+
+def evaluate(result):
+    if isinstance(result, QuerySet):
+        result = list(result)
+    if result is None:
+        return result, 0
+    if isinstance(result, (list, tuple)):
+        return result, len(result)
+    return result, 1
+
+
+def explain(func):
+    result = func()
+    if not isinstance(result, QuerySet):
+        return None
+    try:
+        return result.explain()
+    except Exception:
+        # Compound queries (union/difference) cannot be explained on
+        # every backend.
+        return None
+
+
+def run_benchmark(func, runs=5):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        evaluate(func())
+        timings.append((time.perf_counter() - started) * 1000)
+
+    # Statement count and memory come from one extra run, since tracing
+    # allocations slows the timed runs down.
+    # Reports may run on the replica, so every alias is captured.
+    tracemalloc.start()
+    try:
+        with ExitStack() as stack:
+            captured = [stack.enter_context(CaptureQueriesContext(alias))
+                        for alias in connections.all()]
+            _, rows = evaluate(func())
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "wall_ms": statistics.median(timings),
+        "min_ms": min(timings),
+        "queries": sum(len(queries) for queries in captured),
+        "rows": rows,
+        "peak_kib": round(peak / 1024, 1),
+        "plan": explain(func),
+    }
+
+
+def compare(baseline, current, threshold=1.25):
+    """Yield (name, baseline, current, problems) for every shared query."""
+    for name, new in current["queries"].items():
+        old = baseline["queries"].get(name)
+        if old is None:
+            continue
+        problems = []
+        # Ignore sub-millisecond jitter on the very fast queries.
+        if (new["wall_ms"] > old["wall_ms"] * threshold
+                and new["wall_ms"] - old["wall_ms"] > 1):
+            problems.append("slower")
+        if new["queries"] > old["queries"]:
+            problems.append("more queries")
+        if new["plan"] != old["plan"]:
+            problems.append("plan changed")
+        yield name, old, new, problems
+
+
+# Concurrency: reader and writer threads against the live database, each
+# with its own connection, under a named PROFILES entry. "baseline" is
+# SQLite as Django opens it by default (rollback journal, full fsync,
+# 2 MiB cache, deferred transactions, Python's 5 s busy timeout);
+# "tuned" is settings.SQLITE_PRAGMAS with IMMEDIATE transactions.
+PROFILES = {
+    "baseline": ({"journal_mode": "delete", "synchronous": "full",
+                  "cache_size": -2000, "mmap_size": 0,
+                  "busy_timeout": 5000, "temp_store": "default"}, None),
+    "tuned": (settings.SQLITE_PRAGMAS, "IMMEDIATE"),
+}
+
+
+def read_appointments(rng, doctor_ids, appointment_ids):
+    # A doctor's day sheet: the latest appointments with patient names.
+    doctor = Doctors.objects.filter(pk__gte=rng.randint(*doctor_ids)).order_by(
+        "pk").first()
+    return list(Appointments.objects.filter(doctor=doctor).select_related(
+        "patient").order_by("-appointment_date")[:20])
+
+
+def write_appointment(rng, doctor_ids, appointment_ids):
+    # Read-then-write in one transaction, like an admin edit: the pre_save
+    # rollup signal reads the row before the UPDATE.
+    with transaction.atomic():
+        appointment = Appointments.objects.filter(
+            pk__gte=rng.randint(*appointment_ids)).order_by("pk").first()
+        appointment.save(update_fields=["notes"])
+
+
+def _worker(operation, profile, seed, bounds, deadline, start, results):
+    pragmas, transaction_mode = PROFILES[profile]
+    rng = random.Random(seed)
+    timings, errors = [], 0
+    try:
+        connection.ensure_connection()
+        sqlite.apply_pragmas(connection.connection, pragmas)
+        connection.transaction_mode = transaction_mode
+        start.wait()
+        while time.perf_counter() < deadline[0]:
+            started = time.perf_counter()
+            try:
+                operation(rng, *bounds)
+            except OperationalError:
+                # "database is locked" once busy_timeout runs out.
+                errors += 1
+                continue
+            timings.append(time.perf_counter() - started)
+    except BaseException:
+        start.abort()
+        raise
+    finally:
+        connection.close()
+        results.append((operation, timings, errors))
+
+
+def _summary(results, operation, seconds):
+    timings = sorted(t for op, times, _ in results if op is operation
+                     for t in times)
+    errors = sum(e for op, _, e in results if op is operation)
+    p95 = timings[int(len(timings) * 0.95)] * 1000 if timings else None
+    return {"ops": len(timings), "per_second": len(timings) / seconds,
+            "p95_ms": p95, "errors": errors}
+
+
+def run_concurrency(profile, readers=4, writers=2, seconds=5.0, seed=0):
+    """Run ``readers`` + ``writers`` threads for ``seconds`` on ``profile``.
+
+    Writers re-save existing appointments unchanged, so the data is left
+    as it was. Only works on a file-backed SQLite database; journal_mode
+    is switched before the threads start and put back afterwards.
+    """
+    pragmas, _ = PROFILES[profile]
+    bounds = tuple(
+        tuple(model.objects.aggregate(Min("pk"), Max("pk")).values())
+        for model in (Doctors, Appointments))
+    connection.close()
+    connection.ensure_connection()
+    sqlite.apply_pragmas(connection.connection,
+                         {"journal_mode": pragmas["journal_mode"]})
+    connection.close()
+
+    results = []
+    start = threading.Barrier(readers + writers + 1)
+    deadline = [float("inf")]
+    threads = [
+        threading.Thread(target=_worker, args=(
+            operation, profile, seed + number, bounds, deadline, start,
+            results))
+        for number, operation in enumerate(
+            [read_appointments] * readers + [write_appointment] * writers)
+    ]
+    running = []
+    try:
+        for thread in threads:
+            thread.start()
+            running.append(thread)
+        deadline[0] = time.perf_counter() + seconds
+        start.wait()
+    except BaseException:
+        start.abort()
+        raise
+    finally:
+        # A worker that fails breaks the barrier, which stops the rest;
+        # the database goes back to its own journal_mode either way.
+        for thread in running:
+            thread.join()
+        connection.ensure_connection()
+        sqlite.apply_pragmas(connection.connection, {
+            "journal_mode": settings.SQLITE_PRAGMAS.get("journal_mode",
+                                                        "wal")})
+    return {"profile": profile, "readers": readers, "writers": writers,
+            "seconds": seconds,
+            "reads": _summary(results, read_appointments, seconds),
+            "writes": _summary(results, write_appointment, seconds)}
+
+
+# Patient summary load test: ``clients`` concurrent clients send
+# ``requests`` GETs in total through Django's own WSGI and ASGI handlers,
+# in process, so only the handler and view differ between the modes and
+# no server or network is measured. WSGI clients are threads calling the
+# sync view; ASGI clients are tasks on one event loop calling the async
+# view, as under uvicorn or daphne.
+def _summary_paths(mode, patient_ids, requests):
+    name = "patient_summary" if mode == "asgi" else "patient_summary_sync"
+    return [reverse(name, args=[patient_ids[number % len(patient_ids)]])
+            for number in range(requests)]
+
+
+def _wsgi_get(handler, path, cookie):
+    environ = {}
+    setup_testing_defaults(environ)
+    environ.update(PATH_INFO=path, HTTP_HOST="localhost",
+                   HTTP_COOKIE=cookie)
+    status = []
+    response = handler(environ, lambda line, headers, exc_info=None:
+                       status.append(line))
+    try:
+        b"".join(response)
+    finally:
+        response.close()
+    return int(status[0].split()[0])
+
+
+async def _asgi_get(handler, path, cookie):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path,
+        "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"host", b"localhost"), (b"cookie", cookie.encode())],
+        "client": ("127.0.0.1", 0), "server": ("localhost", 80),
+    }
+    request = [{"type": "http.request", "body": b"", "more_body": False}]
+    status = []
+
+    async def receive():
+        if request:
+            return request.pop()
+        # Django listens for a disconnect until the response is sent.
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await handler(scope, receive, send)
+    return status[0]
+
+
+def _load_summary(latencies, statuses, seconds):
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "per_second": len(latencies) / seconds,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000,
+        "errors": sum(1 for status in statuses if status != 200),
+    }
+
+
+def run_summary_load(mode, patient_ids, cookie, clients=16, requests=400):
+    """Latency of the patient summary under ``mode`` ("wsgi" or "asgi")."""
+    paths = _summary_paths(mode, patient_ids, requests)
+    latencies, statuses = [], []
+
+    def timed(get):
+        started = time.perf_counter()
+        statuses.append(get())
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    if mode == "wsgi":
+        handler = WSGIHandler()
+        with ThreadPoolExecutor(clients) as pool:
+            for path in paths:
+                pool.submit(timed, partial(_wsgi_get, handler, path, cookie))
+    else:
+        handler = ASGIHandler()
+
+        async def client(queue):
+            while queue:
+                path = queue.pop()
+                began = time.perf_counter()
+                statuses.append(await _asgi_get(handler, path, cookie))
+                latencies.append(time.perf_counter() - began)
+
+        async def load():
+            queue = list(paths)
+            await asyncio.gather(*(client(queue) for _ in range(clients)))
+
+        asyncio.run(load())
+    return _load_summary(latencies, statuses, time.perf_counter() - started)
+
+
+def run_login_load(credentials, clients=4, logins=40):
+    """Latency of ``logins`` authenticate() calls over ``clients`` threads.
+
+    ``credentials`` are (email, password) pairs, used in turn; passwords
+    are checked with whatever PASSWORD_HASHERS holds at the time. A
+    rejected login counts as an error.
+    """
+    latencies, statuses = [], []
+
+    def login(email, password):
+        began = time.perf_counter()
+        user = authenticate(username=email, password=password)
+        latencies.append(time.perf_counter() - began)
+        statuses.append(200 if user is not None else 401)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        for number in range(logins):
+            pool.submit(login, *credentials[number % len(credentials)])
+    return _load_summary(latencies, statuses, time.perf_counter() - started)
@@ -0,0 +1,124 @@
+import csv
+import json
+import zlib
+from django.db.models import F
+from . import archive
+from .models import Appointments, Prescriptions, Surgeries
+from .routers import read_db, replica_reads
+
+# Streaming extracts. Rows come from values_list(...).iterator(), which
+# uses a server-side cursor where the backend has one and fetches
+# chunk_size rows at a time otherwise, and are written out one at a time,
+# so memory stays flat however large the table is. When the date range
+# reaches back into the archive (users.archive), the archived rows are
+# read alongside the hot ones with UNION ALL.
+
+
+EXPORTS = {
+    "appointments": {
+        "model": Appointments,
+        "date_field": "appointment_date",
+        "columns": ("appointment_id", "appointment_date", "status",
+                    "patient_id", "patient_name", "doctor_id",
+                    "doctor_name", "notes"),
+    },
+    "prescriptions": {
+        "model": Prescriptions,
+        "date_field": "appointment__appointment_date",
+        "columns": ("prescription_id", "appointment_id",
+                    "appointment__appointment_date", "patient_id",
+                    "patient_name", "doctor_id", "doctor_name",
+                    "medicine_detail", "instructions"),
+    },
+    "surgeries": {
+        "model": Surgeries,
+        "date_field": "surgery_date",
+        "columns": ("surgery_id", "surgery_date", "surgery_type",
+                    "patient_id", "patient_name", "doctor_id",
+                    "doctor_name", "notes"),
+    },
+}
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def export_rows(kind, start=None, end=None, chunk_size=2000):
+    export = EXPORTS[kind]
+
+    def select(model):
+        rows = model.objects.annotate(
+            patient_name=F("patient__full_name"),
+            doctor_name=F("doctor__full_name"),
+        )
+        if start is not None:
+            rows = rows.filter(**{f"{export['date_field']}__gte": start})
+        if end is not None:
+            rows = rows.filter(**{f"{export['date_field']}__lt": end})
+        return rows.values_list(*export["columns"])
+
+    rows = select(export["model"])
+    with replica_reads():
+        if archive.reaches_archive(kind, start):
+            rows = rows.union(select(archive.SOURCES[kind]["archive"]),
+                              all=True)
+    pk = export["model"]._meta.pk.name
+    # Exports read the replica when there is one. The alias is fixed here
+    # because the rows are only fetched while the response streams.
+    return rows.using(read_db()).order_by(pk).iterator(
+        chunk_size=chunk_size)
+
+
+class Echo:
+    # csv.writer wants a file; this one hands each line straight back.
+    def write(self, value):
+        return value
+
+
+def render_csv(kind, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORTS[kind]["columns"])
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def render_ndjson(kind, rows):
+    columns = EXPORTS[kind]["columns"]
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), default=str) + "\n"
+
+
+def render(kind, fmt, rows):
+    if fmt == "csv":
+        return render_csv(kind, rows)
+    return render_ndjson(kind, rows)
+
+
+def buffered(chunks, size=1 << 16):
+    """Join small str chunks into bytes chunks of roughly ``size``."""
+    parts, pending = [], 0
+    for chunk in chunks:
+        parts.append(chunk)
+        pending += len(chunk)
+        if pending >= size:
+            yield "".join(parts).encode()
+            parts, pending = [], 0
+    if parts:
+        yield "".join(parts).encode()
+
+
+def gzip_chunks(chunks, flush_every=1 << 16):
+    """Gzip an iterable of str into bytes chunks of roughly flush_every."""
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    pending = 0
+    for chunk in chunks:
+        data = chunk.encode()
+        pending += len(data)
+        compressed = compressor.compress(data)
+        if pending >= flush_every:
+            compressed += compressor.flush(zlib.Z_SYNC_FLUSH)
+            pending = 0
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,93 @@
+import random
+from datetime import timedelta
+from faker import Faker
+from django.utils.timezone import now
+
+# Row generators for populate_db. They only produce plain dicts and never
+# touch the ORM, so they can run inside worker processes.
+
+GENDERS = ["Male", "Female", "Other"]
+STATUSES = ["Scheduled", "Completed", "Cancelled"]
+MEDICINES = [
+    "Paracetamol 500mg", "Ibuprofen 400mg", "Amoxicillin 500mg",
+    "Metformin 850mg", "Atorvastatin 20mg", "Lisinopril 10mg",
+    "Amlodipine 5mg", "Omeprazole 20mg", "Salbutamol inhaler",
+    "Cetirizine 10mg", "Sertraline 50mg", "Levothyroxine 50mcg",
+    "Prednisolone 5mg", "Tramadol 50mg (painkiller)",
+    "Codeine 30mg (painkiller)", "Azithromycin 250mg",
+]
+
+
+def user_row(fake, number):
+    # The running number keeps emails unique across runs and shards
+    # without fake.unique's ever-growing retry set.
+    return {
+        "email": f"{fake.user_name()}.{number}@{fake.free_email_domain()}",
+        "first_name": fake.first_name()[:20],
+        "last_name": fake.last_name()[:20],
+    }
+
+
+def generate_doctors(fake, rng, start, count):
+    for number in range(start, start + count):
+        yield {
+            "user": user_row(fake, number),
+            "specialization": fake.job(),
+            "gender": rng.choice(GENDERS),
+        }
+
+
+def generate_patients(fake, rng, start, count):
+    for number in range(start, start + count):
+        insurance = None
+        if rng.random() < 0.5:
+            insurance = {
+                "provider": fake.company(),
+                "policy_number": fake.uuid4(),
+                "coverage_details": fake.text(),
+            }
+        yield {
+            "user": user_row(fake, number),
+            "dob": fake.date_of_birth(minimum_age=18, maximum_age=90),
+            "gender": rng.choice(GENDERS),
+            "address": fake.address(),
+            "insurance": insurance,
+        }
+
+
+def generate_appointments(fake, rng, start, count):
+    today = now()
+    for number in range(start, start + count):
+        prescription = None
+        # Half of the appointments get prescriptions
+        if number % 2 == 0:
+            prescription = {
+                "medicine_detail": rng.choice(MEDICINES),
+                "instructions": fake.sentence(),
+            }
+        yield {
+            "appointment_date": today + timedelta(
+                days=rng.randint(-365, 30), minutes=rng.randint(0, 1439)),
+            "status": rng.choice(STATUSES),
+            "notes": fake.text(max_nb_chars=200),
+            "prescription": prescription,
+        }
+
+
+def generate_surgeries(fake, rng, start, count):
+    today = now()
+    for _ in range(start, start + count):
+        yield {
+            "surgery_date": today + timedelta(
+                days=rng.randint(-365, 60), minutes=rng.randint(0, 1439)),
+            "surgery_type": fake.bs(),
+            "notes": fake.text(),
+        }
+
+
+def generate_shard(shard):
+    """Generate one shard of rows with its own deterministic seed."""
+    generator, seed, start, count = shard
+    fake = Faker()
+    fake.seed_instance(seed)
+    return list(generator(fake, random.Random(seed), start, count))
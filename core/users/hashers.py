@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+
+# Django's hashers with their cost parameters taken from
+# settings.PASSWORD_HASHER_PARAMS[tier] instead of the class defaults.
+# The algorithm names are unchanged, so hashes made by the stock classes
+# verify as before. Django rehashes a password at its next successful
+# login whenever the stored algorithm is not the preferred one (the first
+# of PASSWORD_HASHERS) or its parameters differ from these, so raising a
+# cost or switching tier only needs a deploy.
+
+
+class TunedHasher:
+    tier = None
+
+    def __init__(self):
+        params = getattr(settings, "PASSWORD_HASHER_PARAMS", {})
+        for name, value in params.get(self.tier, {}).items():
+            setattr(self, name, value)
+
+
+class PBKDF2PasswordHasher(TunedHasher, hashers.PBKDF2PasswordHasher):
+    tier = "pbkdf2"
+
+
+class ScryptPasswordHasher(TunedHasher, hashers.ScryptPasswordHasher):
+    tier = "scrypt"
+
+    def __init__(self):
+        super().__init__()
+        if not self.maxmem:
+            # scrypt needs about 128 * work_factor * block_size bytes and
+            # OpenSSL refuses more than 32 MiB unless given a limit.
+            self.maxmem = 2 * 128 * self.work_factor * self.block_size
+
+
+class Argon2PasswordHasher(TunedHasher, hashers.Argon2PasswordHasher):
+    # Needs the argon2-cffi package.
+    tier = "argon2"
@@ -0,0 +1,20 @@
+from argparse import ArgumentTypeError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+
+def aware_datetime(value):
+    """argparse type: an ISO 8601 datetime, made aware if naive.
+
+    parse_datetime returns None for text it does not recognise, which
+    would otherwise reach the command as "not given".
+    """
+    try:
+        when = parse_datetime(value)
+    except ValueError:
+        when = None
+    if when is None:
+        raise ArgumentTypeError(f"{value!r} is not an ISO 8601 datetime.")
+    if timezone.is_naive(when):
+        when = timezone.make_aware(when)
+    return when
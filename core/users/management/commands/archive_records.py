@@ -0,0 +1,37 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from users import archive
+
+
+class Command(BaseCommand):
+    help = ("Move Completed/Cancelled appointments with their prescriptions, "
+            "and surgeries, older than a cutoff into the archive tables")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than", type=int, required=True,
+                            metavar="DAYS",
+                            help="Archive records dated more than this many "
+                                 "days ago.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--sleep", type=float, default=0.05,
+                            help="Seconds to pause between batches.")
+
+    def handle(self, *args, **options):
+        if options["older_than"] < 1:
+            raise CommandError("--older-than must be at least 1 day.")
+        cutoff = timezone.now() - timedelta(days=options["older_than"])
+
+        def progress(kind, moved):
+            if options["verbosity"] > 1:
+                self.stdout.write(f"  {moved} {kind} archived")
+
+        result = archive.archive_records(cutoff, options["batch_size"],
+                                         options["sleep"], progress)
+        total = result.appointments + result.prescriptions + result.surgeries
+        rate = total / result.seconds if result.seconds else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"✔ Archived {result.appointments} appointments, "
+            f"{result.prescriptions} prescriptions and {result.surgeries} "
+            f"surgeries before {cutoff:%Y-%m-%d %H:%M} in "
+            f"{result.seconds:.2f}s ({rate:.0f} rows/s)"))
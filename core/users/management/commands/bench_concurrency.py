@@ -0,0 +1,47 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from users.benchmarks import PROFILES, run_concurrency
+
+
+class Command(BaseCommand):
+    help = ("Measure reader/writer throughput on SQLite under the baseline "
+            "and tuned connection settings")
+
+    def add_arguments(self, parser):
+        parser.add_argument("profiles", nargs="*",
+                            help=f"Any of {', '.join(PROFILES)}; all by "
+                                 "default.")
+        parser.add_argument("--readers", type=int, default=4)
+        parser.add_argument("--writers", type=int, default=2)
+        parser.add_argument("--seconds", type=float, default=5.0)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output",
+                            help="Write results to this JSON file.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("bench_concurrency only applies to SQLite.")
+        unknown = set(options["profiles"]) - set(PROFILES)
+        if unknown:
+            raise CommandError(f"Unknown profiles: {', '.join(unknown)}")
+        results = []
+        for profile in options["profiles"] or PROFILES:
+            result = run_concurrency(
+                profile, readers=options["readers"],
+                writers=options["writers"], seconds=options["seconds"],
+                seed=options["seed"])
+            results.append(result)
+            for kind in ("reads", "writes"):
+                line = result[kind]
+                p95 = ("-" if line["p95_ms"] is None
+                       else f"{line['p95_ms']:.2f}")
+                self.stdout.write(
+                    f"{profile:<10} {kind:<7} {line['per_second']:>10.1f}/s "
+                    f"p95 {p95:>9} ms {line['errors']:>5} locked")
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(
+                f"Results written to {options['output']}"))
@@ -0,0 +1,69 @@
+import json
+import secrets
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from users.benchmarks import run_login_load
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = ("Measure login latency under each password hasher tier with "
+            "the configured PASSWORD_* costs")
+
+    def add_arguments(self, parser):
+        tiers = settings.PASSWORD_HASHER_TIERS
+        parser.add_argument("tiers", nargs="*",
+                            help=f"Any of {', '.join(tiers)}; all by "
+                                 "default.")
+        parser.add_argument("--users", type=int, default=8,
+                            help="Temporary users to log in as.")
+        parser.add_argument("--clients", type=int, default=4)
+        parser.add_argument("--logins", type=int, default=40)
+        parser.add_argument("--output",
+                            help="Write results to this JSON file.")
+
+    def handle(self, *args, **options):
+        tiers = settings.PASSWORD_HASHER_TIERS
+        unknown = set(options["tiers"]) - set(tiers)
+        if unknown:
+            raise CommandError(f"Unknown tiers: {', '.join(unknown)}")
+        results = {}
+        for tier in options["tiers"] or tiers:
+            hashers = [tiers[tier], *(path for name, path in tiers.items()
+                                      if name != tier)]
+            credentials = [
+                (f"bench-login-{tier}-{number}@example.invalid",
+                 secrets.token_urlsafe(12))
+                for number in range(options["users"])
+            ]
+            with override_settings(PASSWORD_HASHERS=hashers):
+                try:
+                    CustomUser.objects.bulk_create_users(
+                        {"email": email, "password": password}
+                        for email, password in credentials)
+                except ValueError as error:
+                    # Argon2 without argon2-cffi installed.
+                    self.stderr.write(f"{tier:<7} skipped: {error}")
+                    continue
+                try:
+                    result = run_login_load(credentials,
+                                            clients=options["clients"],
+                                            logins=options["logins"])
+                finally:
+                    CustomUser.objects.filter(
+                        email__in=[email for email, _ in credentials]
+                    ).delete()
+            results[tier] = result
+            self.stdout.write(
+                f"{tier:<7} {result['per_second']:>7.1f} logins/s "
+                f"p50 {result['p50_ms']:>8.1f} ms "
+                f"p95 {result['p95_ms']:>8.1f} ms "
+                f"p99 {result['p99_ms']:>8.1f} ms "
+                f"{result['errors']:>4} rejected")
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(
+                f"Results written to {options['output']}"))
@@ -0,0 +1,77 @@
+import json
+import random
+from django.conf import settings
+from django.contrib.auth import (
+    BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+)
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from users.benchmarks import run_summary_load
+from users.models import CustomUser, Patients
+
+MODES = ("wsgi", "asgi")
+
+
+class Command(BaseCommand):
+    help = ("Load test the patient summary: sync view over WSGI against the "
+            "async view over ASGI")
+
+    def add_arguments(self, parser):
+        parser.add_argument("modes", nargs="*",
+                            help=f"Any of {', '.join(MODES)}; both by "
+                                 "default.")
+        parser.add_argument("--clients", type=int, default=16)
+        parser.add_argument("--requests", type=int, default=400)
+        parser.add_argument("--patients", type=int, default=200,
+                            help="Number of random patients to request.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output",
+                            help="Write results to this JSON file.")
+
+    def handle(self, *args, **options):
+        unknown = set(options["modes"]) - set(MODES)
+        if unknown:
+            raise CommandError(f"Unknown modes: {', '.join(unknown)}")
+        staff = CustomUser.objects.filter(is_staff=True).first()
+        if staff is None:
+            raise CommandError("No staff user to send the requests as.")
+        patient_ids = list(Patients.objects.values_list("pk", flat=True))
+        if not patient_ids:
+            raise CommandError("No patients; run populate_db first.")
+        patient_ids = random.Random(options["seed"]).sample(
+            patient_ids, min(options["patients"], len(patient_ids)))
+
+        session = SessionStore()
+        session.update({
+            SESSION_KEY: str(staff.pk),
+            BACKEND_SESSION_KEY: settings.AUTHENTICATION_BACKENDS[0],
+            HASH_SESSION_KEY: staff.get_session_auth_hash(),
+        })
+        session.create()
+        cookie = f"{settings.SESSION_COOKIE_NAME}={session.session_key}"
+        results = {}
+        try:
+            # As deployed: no DEBUG query log and no profiler middleware,
+            # whose per-request bookkeeping would be measured too.
+            with override_settings(DEBUG=False, ALLOWED_HOSTS=["localhost"],
+                                   QUERY_PROFILER_ENABLED=False):
+                for mode in options["modes"] or MODES:
+                    result = run_summary_load(
+                        mode, patient_ids, cookie,
+                        clients=options["clients"],
+                        requests=options["requests"])
+                    results[mode] = result
+                    self.stdout.write(
+                        f"{mode:<5} {result['per_second']:>8.1f} req/s "
+                        f"p50 {result['p50_ms']:>8.2f} ms "
+                        f"p95 {result['p95_ms']:>8.2f} ms "
+                        f"{result['errors']:>4} errors")
+        finally:
+            session.delete()
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(
+                f"Results written to {options['output']}"))
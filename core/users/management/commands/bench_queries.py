@@ -0,0 +1,91 @@
+import json
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils.timezone import now
+from users.benchmarks import QUERIES, compare, run_benchmark
+from users.models import (
+    Appointments, Doctors, Patients, Prescriptions, Surgeries
+)
+
+
+class Command(BaseCommand):
+    help = "Benchmark the Queries.py reports and compare benchmark runs"
+
+    def add_arguments(self, parser):
+        parser.add_argument("names", nargs="*",
+                            help="Only run queries whose name contains one "
+                                 "of these strings.")
+        parser.add_argument("--scale", type=int,
+                            help="Seed 10*N doctors, 100*N patients, "
+                                 "1000*N appointments and 100*N surgeries "
+                                 "with populate_db before running.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument("--output",
+                            help="Write results to this JSON file.")
+        parser.add_argument("--compare", nargs=2,
+                            metavar=("BASELINE", "CURRENT"),
+                            help="Compare two JSON result files instead of "
+                                 "running the benchmarks.")
+        parser.add_argument("--threshold", type=float, default=1.25,
+                            help="Slowdown ratio reported as a regression.")
+
+    def handle(self, *args, **options):
+        if options["compare"]:
+            return self.compare(*options["compare"], options["threshold"])
+
+        if options["scale"]:
+            scale = options["scale"]
+            call_command("populate_db", doctors=10 * scale,
+                         patients=100 * scale, appointments=1000 * scale,
+                         surgeries=100 * scale, seed=options["seed"],
+                         stdout=self.stdout)
+
+        results = {
+            "created": now().isoformat(),
+            "vendor": connection.vendor,
+            "counts": {
+                model.__name__: model.objects.count()
+                for model in (Doctors, Patients, Appointments, Prescriptions,
+                              Surgeries)
+            },
+            "queries": {},
+        }
+        for name, func in QUERIES.items():
+            if options["names"] and not any(
+                    part in name for part in options["names"]):
+                continue
+            result = run_benchmark(func, options["runs"])
+            results["queries"][name] = result
+            self.stdout.write(
+                f"{name:<56} {result['wall_ms']:>10.2f} ms "
+                f"{result['queries']:>4} sql {result['rows']:>8} rows "
+                f"{result['peak_kib']:>10.1f} KiB")
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(
+                f"Results written to {options['output']}"))
+
+    def compare(self, baseline_path, current_path, threshold):
+        with open(baseline_path) as baseline, open(current_path) as current:
+            rows = list(compare(json.load(baseline), json.load(current),
+                                threshold))
+
+        regressions = 0
+        for name, old, new, problems in rows:
+            line = (f"{name:<56} {old['wall_ms']:>10.2f} -> "
+                    f"{new['wall_ms']:>10.2f} ms "
+                    f"{old['queries']:>3} -> {new['queries']:>3} sql")
+            if problems:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(
+                    f"{line}  {', '.join(problems)}"))
+            else:
+                self.stdout.write(line)
+
+        if regressions:
+            raise CommandError(f"{regressions} queries regressed.")
+        self.stdout.write(self.style.SUCCESS("No regressions."))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from users import scheduling
+from users.management.commands._arguments import aware_datetime
+from users.models import Status
+
+
+class Command(BaseCommand):
+    help = ("Mark past Scheduled appointments as Completed (or another "
+            "status) in short primary-key-ranged batches")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--before", type=aware_datetime,
+                            help="ISO datetime; defaults to now.")
+        parser.add_argument("--status", choices=[Status.COMPLETED,
+                                                 Status.CANCELLED],
+                            default=Status.COMPLETED)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--sleep", type=float, default=0.05,
+                            help="Seconds to pause between batches.")
+        parser.add_argument("--start-after", type=int,
+                            help="Resume after this appointment id.")
+
+    def handle(self, *args, **options):
+        last = {"pk": options["start_after"]}
+
+        def progress(closed, last_pk):
+            last["pk"] = last_pk
+            if options["verbosity"] > 1:
+                self.stdout.write(f"  {closed} closed, up to id {last_pk}")
+
+        try:
+            result = scheduling.close_past_appointments(
+                options["before"], options["batch_size"], options["sleep"],
+                options["start_after"], options["status"], progress)
+        except KeyboardInterrupt:
+            if last["pk"] is not None:
+                self.stderr.write(
+                    f"Interrupted; resume with --start-after {last['pk']}")
+            raise
+        rate = result.closed / result.seconds if result.seconds else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"✔ Closed {result.closed} appointments in {result.seconds:.2f}s"
+            f" ({rate:.0f}/s), up to id {result.last_pk}"))
@@ -0,0 +1,137 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Q, UniqueConstraint
+from django.utils.timezone import now
+from users.models import Appointments, Doctors, Surgeries
+
+
+def hot_queries():
+    today = now()
+    doctor_id = (Appointments.objects.values_list("doctor_id", flat=True)
+                 .order_by("doctor_id").first())
+    patient_id = (Appointments.objects.values_list("patient_id", flat=True)
+                  .order_by("patient_id").first())
+    return {
+        "appointments_next_7_days": Appointments.objects.filter(
+            appointment_date__range=[today, today + timedelta(days=7)]
+        ).select_related("patient", "doctor"),
+        "doctor_appointments_6_months": Appointments.objects.filter(
+            doctor_id=doctor_id,
+            appointment_date__gte=today - timedelta(days=180)),
+        "patient_appointments_last_month": Appointments.objects.filter(
+            patient_id=patient_id,
+            appointment_date__gte=today - timedelta(days=30)),
+        "scheduled_next_30_days": Appointments.objects.filter(
+            appointment_date__range=[today, today + timedelta(days=30)],
+            status="Scheduled").order_by("appointment_date"),
+        "past_scheduled": Appointments.objects.filter(
+            appointment_date__lt=today, status="Scheduled"),
+        "completed_last_month": Appointments.objects.filter(
+            appointment_date__gte=today - timedelta(days=30),
+            status="Completed"),
+        "doctors_over_10_appointments_6_months": Doctors.objects.annotate(
+            appointment_count=Count("appointments_as_doctor", filter=Q(
+                appointments_as_doctor__appointment_date__gte=(
+                    today - timedelta(days=180))))
+        ).filter(appointment_count__gt=10),
+        "doctor_surgeries_past_year": Surgeries.objects.filter(
+            doctor_id=doctor_id,
+            surgery_date__gte=today - timedelta(days=365)),
+    }
+
+
+class Command(BaseCommand):
+    help = ("Compare query plans and timings of the hot appointment/surgery "
+            "queries with and without the composite indexes")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5,
+                            help="Timed runs per query; the best is kept.")
+        parser.add_argument("--yes", action="store_true",
+                            help="Confirm the run. Until the \"before\" "
+                                 "run ends, the transaction dropping the "
+                                 "indexes holds the database write lock "
+                                 "(SQLite) or ACCESS EXCLUSIVE locks on "
+                                 "the tables (PostgreSQL), blocking other "
+                                 "writes; only use it on a development "
+                                 "copy.")
+
+    def handle(self, *args, **options):
+        if not options["yes"]:
+            raise CommandError(
+                "explain_indexes drops indexes inside one transaction, "
+                "blocking writes to the database until it rolls back. Run "
+                "it against a development copy and pass --yes.")
+        self.runs = options["runs"]
+        # Drop the indexes inside a transaction that is always rolled back,
+        # so the "before" numbers never leave the schema changed.
+        with transaction.atomic():
+            dropped, missing = self.drop_indexes()
+            before = self.measure()
+            transaction.set_rollback(True)
+        # sqlite3 caches prepared statements and a cached EXPLAIN does not
+        # notice the schema change, so start the "after" run on a fresh
+        # connection.
+        connection.close()
+        after = self.measure()
+
+        self.stdout.write(f"Dropped for the \"before\" run: "
+                          f"{', '.join(dropped) or 'nothing'}")
+        if missing:
+            self.stdout.write(f"Not in the database, skipped: "
+                              f"{', '.join(missing)}")
+        self.stdout.write(
+            f"Kept, as they back constraints: {', '.join(self.kept())}. "
+            f"The \"before\" plans may still use them, so the baseline is "
+            f"not index-free.")
+        for name in after:
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for label, result in (("before", before[name]),
+                                  ("after", after[name])):
+                self.stdout.write(
+                    f"  {label}: {result['ms']:.2f} ms, "
+                    f"{result['rows']} rows")
+                for line in result["plan"].splitlines():
+                    self.stdout.write(f"    {line}")
+
+    def drop_indexes(self):
+        """Drop the models' Meta.indexes; return (dropped, missing) names.
+
+        Indexes the backend never created (partial indexes where they are
+        unsupported) or that are already gone are skipped.
+        """
+        dropped, missing = [], []
+        with connection.cursor() as cursor:
+            for model in (Appointments, Surgeries):
+                existing = connection.introspection.get_constraints(
+                    cursor, model._meta.db_table)
+                for index in model._meta.indexes:
+                    if index.name not in existing:
+                        missing.append(index.name)
+                        continue
+                    cursor.execute(
+                        f"DROP INDEX {connection.ops.quote_name(index.name)}")
+                    dropped.append(index.name)
+        return dropped, missing
+
+    def kept(self):
+        return [constraint.name for model in (Appointments, Surgeries)
+                for constraint in model._meta.constraints
+                if isinstance(constraint, UniqueConstraint)]
+
+    def measure(self):
+        results = {}
+        for name, queryset in hot_queries().items():
+            timings = []
+            for _ in range(self.runs):
+                started = time.perf_counter()
+                rows = len(list(queryset.all()))
+                timings.append(time.perf_counter() - started)
+            results[name] = {
+                "ms": min(timings) * 1000,
+                "rows": rows,
+                "plan": queryset.explain(),
+            }
+        return results
@@ -0,0 +1,42 @@
+import sys
+from django.core.management.base import BaseCommand
+from users import exports
+from users.management.commands._arguments import aware_datetime
+
+
+class Command(BaseCommand):
+    help = ("Stream appointments, prescriptions or surgeries as CSV or "
+            "NDJSON to stdout or a file")
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(exports.EXPORTS))
+        parser.add_argument("--format", choices=sorted(exports.FORMATS),
+                            default="csv")
+        parser.add_argument("--gzip", action="store_true")
+        parser.add_argument("--output",
+                            help="File to write; defaults to stdout.")
+        parser.add_argument("--from", dest="start", type=aware_datetime)
+        parser.add_argument("--to", dest="end", type=aware_datetime)
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        rows = exports.export_rows(options["kind"], options["start"],
+                                   options["end"], options["chunk_size"])
+        chunks = exports.render(options["kind"], options["format"], rows)
+
+        if options["output"]:
+            with open(options["output"], "wb") as output:
+                self.write(output, chunks, options["gzip"])
+        elif options["gzip"]:
+            self.write(sys.stdout.buffer, chunks, gzip=True)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
+
+    def write(self, output, chunks, gzip):
+        if gzip:
+            chunks = exports.gzip_chunks(chunks)
+        else:
+            chunks = exports.buffered(chunks)
+        for chunk in chunks:
+            output.write(chunk)
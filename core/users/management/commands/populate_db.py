@@ -1,133 +1,255 @@
 import random
-from datetime import timedelta
+from collections import deque
+from datetime import time
+from itertools import chain, islice
+from multiprocessing import Pool
 from faker import Faker
+from django.contrib.auth.hashers import make_password
 from django.core.management.base import BaseCommand
-from django.utils.timezone import now
+from django.db import transaction
+from django.db.models import Max
+from users import reference, rollups, search
+from users.fake_data import (
+    generate_appointments, generate_doctors, generate_patients,
+    generate_shard, generate_surgeries
+)
 from users.models import (
     CustomUser, Patients, Doctors, Department, Appointments, Prescriptions,
-    Surgeries, Patient_Doctor, Insurance
+    Surgeries, Patient_Doctor, Insurance, DoctorSchedule
 )
 
 fake = Faker()
 
+RELATIONSHIP_TYPES = ["Primary_Care", "Consultation", "Specialist"]
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
 
 class Command(BaseCommand):
     help = "Populate database with fake data"
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        parser.add_argument("--departments", type=int, default=5)
+        parser.add_argument("--doctors", type=int, default=10)
+        parser.add_argument("--patients", type=int, default=20)
+        parser.add_argument("--appointments", type=int, default=30)
+        parser.add_argument("--surgeries", type=int, default=10)
+        parser.add_argument("--batch-size", type=int, default=5000,
+                            help="Rows per bulk_create/transaction.")
+        parser.add_argument("--seed", type=int,
+                            help="Seed Faker and random for repeatable data.")
+        parser.add_argument("--workers", type=int, default=1,
+                            help="Processes generating rows in parallel.")
+
+    def handle(self, *args, **options):
+        self.batch_size = options["batch_size"]
+        self.workers = options["workers"]
+        self.seed = options["seed"]
+        if self.seed is None:
+            self.seed = random.randrange(2 ** 32)
+        self.rng = random.Random(self.seed)
+        fake.seed_instance(self.seed)
+        # create_user() hashes once per row; every seeded user gets the same
+        # unusable password instead.
+        self.password = make_password(None)
+        self.next_user_number = (
+            CustomUser.objects.aggregate(last=Max("id"))["last"] or 0) + 1
+
         self.stdout.write("Populating database with fake data...")
 
-        # Create Departments
-        departments = []
-        for _ in range(5):
-            dept = Department.objects.create(
-                name=fake.unique.company()
-            )
-            departments.append(dept)
+        self.pool = Pool(self.workers) if self.workers > 1 else None
+        try:
+            self.populate(options)
+        finally:
+            if self.pool is not None:
+                self.pool.terminate()
+
+        self.stdout.write(self.style.SUCCESS(
+            "🎉 Database population complete!"))
+
+    def populate(self, options):
+        # Create Departments. Seeded names repeat from run to run, so,
+        # like emails, they carry a running number.
+        start = (Department.objects.aggregate(
+            last=Max("department_id"))["last"] or 0) + 1
+        departments = Department.objects.bulk_create(
+            Department(name=f"{fake.company()} {number}")
+            for number in range(start, start + options["departments"])
+        )
+        self.department_ids = [dept.pk for dept in departments]
 
         self.stdout.write("✔ Created Departments")
 
         # Create Users, Patients, and Doctors
-        doctors = []
-        patients = []
-        users = []
-
-        for _ in range(10):  # 10 Doctors
-            user = CustomUser.objects.create_user(
-                email=fake.unique.email(),
-                first_name=fake.first_name(),
-                last_name=fake.last_name(),
-                is_staff=True
-            )
-            doctor = Doctors.objects.create(
-                user=user,
-                specialization=fake.job(),
-                department=random.choice(departments)
-            )
-            doctors.append(doctor)
-            users.append(user)
-
-        for _ in range(20):  # 20 Patients
-            user = CustomUser.objects.create_user(
-                email=fake.unique.email(),
-                first_name=fake.first_name(),
-                last_name=fake.last_name()
-            )
-            patient = Patients.objects.create(
-                user=user,
-                dob=fake.date_of_birth(minimum_age=18, maximum_age=90),
-                gender=random.choice(["Male", "Female", "Other"]),
-                address=fake.address()
-            )
-            patients.append(patient)
-            users.append(user)
-
-        self.stdout.write("✔ Created Users, Doctors, and Patients")
-
-        # Assign Patients to Doctors
+        self.doctor_ids = self.create_doctors(options["doctors"])
+        self.patient_ids = self.create_patients(options["patients"])
+
+        self.stdout.write(
+            "✔ Created Users, Doctors, Patients, "
+            "Patient assignments and Insurance")
+
+        if self.doctor_ids and self.patient_ids:
+            total = self.create_appointments(options["appointments"])
+            self.stdout.write(
+                f"✔ Created {total} Appointments and Prescriptions")
+
+            total = self.create_surgeries(options["surgeries"])
+            self.stdout.write(f"✔ Created {total} Surgeries")
+
+        # bulk_create skips the signals that maintain the rollup and
+        # invalidate cached reference data
+        rollups.rebuild(batch_size=self.batch_size)
+        reference.invalidate()
+        self.stdout.write("✔ Rebuilt Daily Statistics")
+
+    def take_user_numbers(self, count):
+        start = self.next_user_number
+        self.next_user_number += count
+        return start
+
+    def generate(self, generator, count, start=0):
+        # Rows are generated in batch-sized shards, each seeded from the
+        # command seed and its own offset, so the data only depends on
+        # --seed and --batch-size, never on --workers.
+        shards = [
+            (generator, f"{self.seed}-{generator.__name__}-{offset}",
+             start + offset, min(self.batch_size, count - offset))
+            for offset in range(0, count, self.batch_size)
+        ]
+        if self.pool is None:
+            return chain.from_iterable(map(generate_shard, shards))
+        return chain.from_iterable(self.stream(shards))
+
+    def stream(self, shards):
+        # Keep a bounded number of shards in flight so a slow writer does
+        # not let generated rows pile up in memory.
+        pending = deque()
+        for shard in shards:
+            pending.append(self.pool.apply_async(generate_shard, (shard,)))
+            if len(pending) >= self.workers * 2:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+    def create_users(self, rows, is_staff=False):
+        return CustomUser.objects.bulk_create([
+            CustomUser(password=self.password, is_staff=is_staff,
+                       **row["user"])
+            for row in rows
+        ])
+
+    def create_doctors(self, count):
+        doctor_ids = []
+        rows = self.generate(generate_doctors, count,
+                             self.take_user_numbers(count))
+        for batch in batched(rows, self.batch_size):
+            with transaction.atomic():
+                users = self.create_users(batch, is_staff=True)
+                doctors = Doctors.objects.bulk_create([
+                    Doctors(
+                        user=user,
+                        full_name=user.full_name,
+                        specialization=row["specialization"],
+                        gender=row["gender"],
+                        department_id=(
+                            self.rng.choice(self.department_ids)
+                            if self.department_ids else None),
+                    )
+                    for user, row in zip(users, batch)
+                ])
+                # Monday to Friday, 9 to 5
+                DoctorSchedule.objects.bulk_create([
+                    DoctorSchedule(doctor=doctor, weekday=weekday,
+                                   start_time=time(9), end_time=time(17))
+                    for doctor in doctors
+                    for weekday in range(5)
+                ])
+            doctor_ids.extend(doctor.pk for doctor in doctors)
+        return doctor_ids
+
+    def create_patients(self, count):
+        patient_ids = []
+        rows = self.generate(generate_patients, count,
+                             self.take_user_numbers(count))
+        for batch in batched(rows, self.batch_size):
+            with transaction.atomic():
+                users = self.create_users(batch)
+                patients = Patients.objects.bulk_create([
+                    Patients(user=user, full_name=user.full_name,
+                             dob=row["dob"], gender=row["gender"],
+                             address=row["address"])
+                    for user, row in zip(users, batch)
+                ])
+                self.assign_doctors(patients)
+                Insurance.objects.bulk_create([
+                    Insurance(patient=patient, **row["insurance"])
+                    for patient, row in zip(patients, batch)
+                    if row["insurance"]
+                ])
+            patient_ids.extend(patient.pk for patient in patients)
+        return patient_ids
+
+    def assign_doctors(self, patients):
+        if not self.doctor_ids:
+            return
+        relationships = []
         for patient in patients:
             # 1 to 3 doctors per patient
-            assigned_doctors = random.sample(doctors, k=random.randint(1, 3))
-            for doctor in assigned_doctors:
-                Patient_Doctor.objects.create(
+            k = min(self.rng.randint(1, 3), len(self.doctor_ids))
+            for doctor_id in self.rng.sample(self.doctor_ids, k=k):
+                relationships.append(Patient_Doctor(
                     patient=patient,
-                    doctor=doctor,
-                    relationship_type=random.choice(
-                        ["Primary_Care", "Consultation", "Specialist"])
-                )
-
-        self.stdout.write("✔ Assigned Patients to Doctors")
-
-        # Create Appointments
-        appointments = []
-        for _ in range(30):
-            appointment = Appointments.objects.create(
-                patient=random.choice(patients),
-                doctor=random.choice(doctors),
-                appointment_date=now() + timedelta(days=random.randint(1, 30)),
-                status=random.choice(["Scheduled", "Completed", "Cancelled"]),
-                notes=fake.text(max_nb_chars=200)
-            )
-            appointments.append(appointment)
-
-        self.stdout.write("✔ Created Appointments")
-
-        # Create Prescriptions
-        # Half of the appointments get prescriptions
-        for appointment in appointments[:15]:
-            Prescriptions.objects.create(
-                appointment=appointment,
-                doctor=appointment.doctor,
-                patient=appointment.patient,
-                medicine_detail=fake.sentence(),
-                instructions=fake.sentence()
-            )
-
-        self.stdout.write("✔ Created Prescriptions")
-
-        # Create Surgeries
-        for _ in range(10):  # 10 Surgeries
-            Surgeries.objects.create(
-                patient=random.choice(patients),
-                doctor=random.choice(doctors),
-                surgery_date=now() + timedelta(days=random.randint(10, 60)),
-                surgery_type=fake.bs(),
-                notes=fake.text()
-            )
-
-        self.stdout.write("✔ Created Surgeries")
-
-        # Create Insurance for some Patients
-        # 10 Patients get insurance
-        for patient in random.sample(patients, k=10):
-            Insurance.objects.create(
-                patient=patient,
-                provider=fake.company(),
-                policy_number=fake.uuid4(),
-                coverage_details=fake.text()
-            )
-
-        self.stdout.write("✔ Created Insurance Data")
-
-        self.stdout.write(self.style.SUCCESS(
-            "🎉 Database population complete!"))
+                    doctor_id=doctor_id,
+                    relationship_type=self.rng.choice(RELATIONSHIP_TYPES),
+                ))
+        Patient_Doctor.objects.bulk_create(relationships)
+
+    def create_appointments(self, count):
+        total = 0
+        rows = self.generate(generate_appointments, count)
+        for batch in batched(rows, self.batch_size):
+            with transaction.atomic():
+                appointments = Appointments.objects.bulk_create([
+                    Appointments(
+                        patient_id=self.rng.choice(self.patient_ids),
+                        doctor_id=self.rng.choice(self.doctor_ids),
+                        appointment_date=row["appointment_date"],
+                        status=row["status"],
+                        notes=row["notes"],
+                    )
+                    for row in batch
+                ])
+                prescriptions = [
+                    Prescriptions(
+                        appointment=appointment,
+                        doctor_id=appointment.doctor_id,
+                        patient_id=appointment.patient_id,
+                        **row["prescription"],
+                    )
+                    for appointment, row in zip(appointments, batch)
+                    if row["prescription"]
+                ]
+                search.link_medicines(prescriptions)
+                Prescriptions.objects.bulk_create(prescriptions)
+            total += len(appointments)
+        return total
+
+    def create_surgeries(self, count):
+        total = 0
+        rows = self.generate(generate_surgeries, count)
+        for batch in batched(rows, self.batch_size):
+            with transaction.atomic():
+                surgeries = Surgeries.objects.bulk_create([
+                    Surgeries(
+                        patient_id=self.rng.choice(self.patient_ids),
+                        doctor_id=self.rng.choice(self.doctor_ids),
+                        **row,
+                    )
+                    for row in batch
+                ])
+            total += len(surgeries)
+        return total
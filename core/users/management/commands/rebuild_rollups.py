@@ -0,0 +1,17 @@
+from datetime import date
+from django.core.management.base import BaseCommand
+from users import rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the DailyStatistics rollup from the source tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", type=date.fromisoformat,
+                            help="Only rebuild days from this ISO date on.")
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        total = rollups.rebuild(options["since"], options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"✔ Rebuilt {total} daily statistics rows"))
@@ -0,0 +1,32 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from users import scheduling
+from users.management.commands._arguments import aware_datetime
+from users.models import Doctors
+
+
+class Command(BaseCommand):
+    help = ("Book a follow-up with a doctor for each of their past "
+            "patients who has nothing scheduled with them")
+
+    def add_arguments(self, parser):
+        parser.add_argument("doctor", type=int, help="Doctor primary key.")
+        parser.add_argument("--when", type=aware_datetime,
+                            help="ISO datetime; defaults to three days "
+                                 "from now.")
+        parser.add_argument("--notes")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        doctor = Doctors.objects.filter(pk=options["doctor"]).first()
+        if doctor is None:
+            raise CommandError(f"No doctor with id {options['doctor']}.")
+        when = options["when"] or timezone.now() + timedelta(days=3)
+
+        result = scheduling.schedule_followups(
+            doctor, when, options["notes"], options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"✔ Scheduled {result.created} follow-ups at {when:%Y-%m-%d %H:%M}"
+            f" ({result.eligible} eligible, {result.skipped} already booked)"
+        ))
@@ -1,4 +1,32 @@
+import os
+from collections import namedtuple
+from itertools import islice
+from multiprocessing import Pool
 from django.contrib.auth.base_user import BaseUserManager
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.db import transaction
+
+Provisioned = namedtuple("Provisioned", ["created", "duplicates"])
+
+# Fewer raw passwords than this are hashed in-process: starting the pool
+# costs more than the hashes.
+PARALLEL_HASH_MIN = 8
+
+
+def hash_passwords(passwords, workers=None):
+    """make_password() for each raw password, over ``workers`` processes.
+
+    Each hash is a full PBKDF2 (or whichever PASSWORD_HASHERS comes
+    first) run, which is CPU bound, so it is spread over processes rather
+    than threads. ``workers`` defaults to the number of CPUs.
+    """
+    passwords = list(passwords)
+    workers = min(workers or os.cpu_count() or 1, len(passwords))
+    if workers < 2 or len(passwords) < PARALLEL_HASH_MIN:
+        return [make_password(password) for password in passwords]
+    with Pool(workers) as pool:
+        return pool.map(make_password, passwords,
+                        chunksize=-(-len(passwords) // (workers * 4)))
 
 
 class CustomUserManager(BaseUserManager):
@@ -14,6 +42,62 @@ class CustomUserManager(BaseUserManager):
         user.save()
         return user
 
+    def bulk_create_users(self, rows, batch_size=1000, workers=None):
+        """Create a user for each dict in ``rows`` with batched INSERTs.
+
+        Rows hold CustomUser fields. ``password`` is a raw password to
+        hash, or None (or absent) for an unusable one; ``password_hash``
+        is a value already hashed elsewhere, stored as is. Raw passwords
+        are hashed with hash_passwords() over ``workers`` processes.
+
+        Emails are normalized as in create_user(). Rows whose email is
+        already taken, in the database or earlier in ``rows``, are
+        skipped. Returns Provisioned(created users, skipped emails).
+        Signals are not sent.
+        """
+        pending = {}
+        duplicates = []
+        for row in rows:
+            fields = dict(row)
+            if not fields.get("email"):
+                raise ValueError("Email must be provided")
+            fields["email"] = self.normalize_email(fields["email"])
+            if fields.get("password_hash") is not None:
+                if fields.get("password") is not None:
+                    raise ValueError(
+                        f"{fields['email']}: give password or "
+                        f"password_hash, not both")
+                # Raises ValueError for anything no hasher recognises.
+                identify_hasher(fields["password_hash"])
+            if fields["email"] in pending:
+                duplicates.append(fields["email"])
+            else:
+                pending[fields["email"]] = fields
+
+        emails = iter(list(pending))
+        while batch := list(islice(emails, batch_size)):
+            for email in self.filter(email__in=batch).values_list(
+                    "email", flat=True):
+                del pending[email]
+                duplicates.append(email)
+
+        raw = [fields for fields in pending.values()
+               if fields.get("password") is not None]
+        hashed = hash_passwords(
+            [fields["password"] for fields in raw], workers)
+        for fields, password in zip(raw, hashed):
+            fields["password_hash"] = password
+
+        users = []
+        for fields in pending.values():
+            fields.pop("password", None)
+            password = fields.pop("password_hash", None)
+            users.append(self.model(password=password or make_password(None),
+                                    **fields))
+        with transaction.atomic():
+            return Provisioned(
+                self.bulk_create(users, batch_size=batch_size), duplicates)
+
     def create_superuser(self, email, password, **extra_fields):
         extra_fields.setdefault("is_staff", True)
         extra_fields.setdefault("is_superuser", True)
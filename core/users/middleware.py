@@ -0,0 +1,115 @@
+import logging
+import re
+from collections import Counter
+from contextlib import ExitStack
+from time import perf_counter
+from asgiref.sync import (
+    iscoroutinefunction, markcoroutinefunction, sync_to_async
+)
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger("users.queries")
+
+# Placeholder lists of any length ("IN (%s, %s, ...)") share a fingerprint.
+PLACEHOLDERS = re.compile(r"%s(?:\s*,\s*%s)+")
+
+
+def fingerprint(sql):
+    return PLACEHOLDERS.sub("%s, ...", sql)
+
+
+class QueryRecorder:
+    # A connection.execute_wrapper that counts and times every statement.
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += perf_counter() - started
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def repeated(self, threshold):
+        return [(sql, count)
+                for sql, count in self.fingerprints.most_common()
+                if count >= threshold]
+
+
+class QueryProfilerMiddleware:
+    """Per-request query count, DB time and repeated statements.
+
+    Adds a Server-Timing header, logs one line per request to the
+    "users.queries" logger and a warning for each statement run at least
+    QUERY_PROFILER_N_PLUS_ONE_THRESHOLD times, the usual sign of lazy
+    foreign key loads in a loop. With QUERY_PROFILER_ENABLED off Django
+    drops the middleware at startup, so it costs nothing.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "QUERY_PROFILER_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = getattr(settings,
+                                 "QUERY_PROFILER_N_PLUS_ONE_THRESHOLD", 5)
+        # Under ASGI async views stay on the event loop instead of being
+        # moved to a thread for this middleware.
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        with self.recording(recorder):
+            response = self.get_response(request)
+        return self.report(request, response, recorder)
+
+    async def __acall__(self, request):
+        # Async ORM calls run on the request's thread-sensitive
+        # sync_to_async thread, whose connections are not the ones seen
+        # from the event loop, so the wrappers are installed there.
+        recorder = QueryRecorder()
+        recording = await sync_to_async(self.recording)(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(recording.close)()
+        return self.report(request, response, recorder)
+
+    def recording(self, recorder):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        return stack
+
+    def report(self, request, response, recorder):
+        repeated = recorder.repeated(self.threshold)
+        db_ms = recorder.seconds * 1000
+        timing = (f'db;dur={db_ms:.2f};desc="{recorder.count} queries, '
+                  f'{len(repeated)} repeated"')
+        if response.has_header("Server-Timing"):
+            timing = f"{response['Server-Timing']}, {timing}"
+        response["Server-Timing"] = timing
+
+        details = {"method": request.method, "path": request.path,
+                   "status": response.status_code,
+                   "queries": recorder.count, "db_ms": round(db_ms, 2),
+                   "repeated": len(repeated)}
+        logger.info(" ".join(f"{key}={value}"
+                             for key, value in details.items()),
+                    extra={"query_profile": details})
+        for sql, count in repeated:
+            logger.warning("N+1 suspected path=%s count=%d sql=%s",
+                           request.path, count, sql,
+                           extra={"query_profile": details})
+        return response
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0003_doctors_gender"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="appointments",
+            index=models.Index(
+                fields=["doctor", "appointment_date"],
+                name="appointment_doctor_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="appointments",
+            index=models.Index(
+                fields=["patient", "appointment_date"],
+                name="appointment_patient_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="appointments",
+            index=models.Index(
+                fields=["status", "appointment_date"],
+                name="appointment_status_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="appointments",
+            index=models.Index(
+                condition=models.Q(("status", "Scheduled")),
+                fields=["appointment_date"],
+                name="appointment_scheduled_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="surgeries",
+            index=models.Index(
+                fields=["doctor", "surgery_date"], name="surgery_doctor_date_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0004_appointment_surgery_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyStatistics",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("Appointment", "Appointment"),
+                            ("Surgery", "Surgery"),
+                            ("Prescription", "Prescription"),
+                        ],
+                        max_length=15,
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("status", models.CharField(blank=True, default="", max_length=15)),
+                ("count", models.IntegerField(default=0)),
+                (
+                    "doctor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_statistics",
+                        to="users.doctors",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["kind", "date"], name="daily_statistics_kind_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("kind", "doctor", "date", "status"),
+                        name="daily_statistics_unique_key",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0005_daily_statistics"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="appointments",
+            index=models.Index(
+                fields=["appointment_date"], name="appointment_date_idx"
+            ),
+        ),
+    ]
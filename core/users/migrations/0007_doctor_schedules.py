@@ -0,0 +1,82 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0006_appointment_date_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DoctorSchedule",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "weekday",
+                    models.PositiveSmallIntegerField(
+                        choices=[
+                            (0, "Monday"),
+                            (1, "Tuesday"),
+                            (2, "Wednesday"),
+                            (3, "Thursday"),
+                            (4, "Friday"),
+                            (5, "Saturday"),
+                            (6, "Sunday"),
+                        ]
+                    ),
+                ),
+                ("start_time", models.TimeField()),
+                ("end_time", models.TimeField()),
+                ("slot_minutes", models.PositiveSmallIntegerField(default=30)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="appointments",
+            name="duration_minutes",
+            field=models.PositiveSmallIntegerField(default=30),
+        ),
+        migrations.AddConstraint(
+            model_name="appointments",
+            constraint=models.CheckConstraint(
+                condition=models.Q(
+                    ("duration_minutes__gt", 0), ("duration_minutes__lte", 240)
+                ),
+                name="appointment_duration_range",
+            ),
+        ),
+        migrations.AddField(
+            model_name="doctorschedule",
+            name="doctor",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="schedules",
+                to="users.doctors",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="doctorschedule",
+            constraint=models.CheckConstraint(
+                condition=models.Q(("start_time__lt", models.F("end_time"))),
+                name="doctor_schedule_start_before_end",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="doctorschedule",
+            constraint=models.CheckConstraint(
+                condition=models.Q(("slot_minutes__gt", 0), ("slot_minutes__lte", 240)),
+                name="doctor_schedule_slot_range",
+            ),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:54
+
+from django.db import migrations, models
+from django.utils import timezone
+
+BATCH_SIZE = 2000
+
+
+def cancel_duplicate_bookings(apps, schema_editor):
+    # Nothing stopped double-booking before this constraint: keep the
+    # oldest Scheduled row of each (doctor, patient, appointment_date)
+    # and cancel the rest, one primary key range at a time. Signals do
+    # not run here, so the daily rollup is moved by hand.
+    Appointments = apps.get_model("users", "Appointments")
+    DailyStatistics = apps.get_model("users", "DailyStatistics")
+    scheduled = Appointments.objects.filter(status="Scheduled")
+    older = scheduled.filter(
+        doctor_id=models.OuterRef("doctor_id"),
+        patient_id=models.OuterRef("patient_id"),
+        appointment_date=models.OuterRef("appointment_date"),
+        pk__lt=models.OuterRef("pk"),
+    )
+    bounds = scheduled.aggregate(low=models.Min("pk"), high=models.Max("pk"))
+    if bounds["low"] is None:
+        return
+    for low in range(bounds["low"], bounds["high"] + 1, BATCH_SIZE):
+        duplicates = scheduled.filter(
+            models.Exists(older), pk__gte=low, pk__lt=low + BATCH_SIZE
+        )
+        rows = list(duplicates.values_list("pk", "doctor_id", "appointment_date"))
+        if not rows:
+            continue
+        Appointments.objects.filter(pk__in=[pk for pk, _, _ in rows]).update(
+            status="Cancelled"
+        )
+        for _, doctor_id, appointment_date in rows:
+            day = timezone.localdate(appointment_date)
+            key = {"kind": "Appointment", "doctor_id": doctor_id, "date": day}
+            # Rows loaded in bulk since the last rebuild are not counted.
+            if not DailyStatistics.objects.filter(status="Scheduled", **key).update(
+                count=models.F("count") - 1
+            ):
+                continue
+            DailyStatistics.objects.get_or_create(status="Cancelled", **key)
+            DailyStatistics.objects.filter(status="Cancelled", **key).update(
+                count=models.F("count") + 1
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0007_doctor_schedules"),
+    ]
+
+    operations = [
+        migrations.RunPython(cancel_duplicate_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="appointments",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("status", "Scheduled")),
+                fields=("doctor", "patient", "appointment_date"),
+                name="appointment_unique_scheduled_visit",
+            ),
+        ),
+    ]
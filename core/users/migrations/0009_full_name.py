@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:00
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Concat, Trim
+
+
+def backfill_full_names(apps, schema_editor):
+    # One UPDATE per table; matches users.models.display_name.
+    CustomUser = apps.get_model("users", "CustomUser")
+    full_name = Trim(
+        Concat(
+            Coalesce("first_name", Value("")),
+            Value(" "),
+            Coalesce("last_name", Value("")),
+        )
+    )
+    name = Subquery(
+        CustomUser.objects.filter(pk=OuterRef("user_id"))
+        .annotate(full_name=full_name)
+        .values("full_name")[:1]
+    )
+    for model_name in ("Patients", "Doctors"):
+        apps.get_model("users", model_name).objects.update(full_name=name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0008_appointment_unique_scheduled_visit"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="doctors",
+            name="full_name",
+            field=models.CharField(
+                blank=True, db_index=True, default="", editable=False, max_length=41
+            ),
+        ),
+        migrations.AddField(
+            model_name="patients",
+            name="full_name",
+            field=models.CharField(
+                blank=True, db_index=True, default="", editable=False, max_length=41
+            ),
+        ),
+        migrations.RunPython(backfill_full_names, migrations.RunPython.noop),
+    ]
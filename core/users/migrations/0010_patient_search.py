@@ -0,0 +1,96 @@
+from django.db import migrations
+
+# The search schema as this migration created it; users.search holds the
+# queries and reinstalls the triggers after every migrate.
+TABLE = "users_patientsearch"
+SQLITE_TABLE = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5(
+    full_name, email, phone_number, address,
+    tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3'
+)
+"""
+SQLITE_ROW = """
+SELECT p.patient_id, p.full_name, substr(u.email, 1, instr(u.email, '@') - 1),
+       u.phone_number, p.address
+FROM users_patients p JOIN users_customuser u ON u.id = p.user_id
+"""
+SQLITE_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLE}_insert
+    AFTER INSERT ON users_patients BEGIN
+        INSERT INTO {TABLE} (rowid, full_name, email, phone_number, address)
+        {SQLITE_ROW} WHERE p.patient_id = new.patient_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLE}_update
+    AFTER UPDATE OF full_name, address, user_id ON users_patients BEGIN
+        DELETE FROM {TABLE} WHERE rowid = old.patient_id;
+        INSERT INTO {TABLE} (rowid, full_name, email, phone_number, address)
+        {SQLITE_ROW} WHERE p.patient_id = new.patient_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLE}_delete
+    AFTER DELETE ON users_patients BEGIN
+        DELETE FROM {TABLE} WHERE rowid = old.patient_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLE}_user
+    AFTER UPDATE OF email, phone_number ON users_customuser BEGIN
+        UPDATE {TABLE}
+        SET email = substr(new.email, 1, instr(new.email, '@') - 1),
+            phone_number = new.phone_number
+        WHERE rowid IN (
+            SELECT patient_id FROM users_patients WHERE user_id = new.id);
+    END
+    """,
+]
+POSTGRES_INDEXES = {
+    "patient_full_name_trgm": ("users_patients", "full_name"),
+    "patient_address_trgm": ("users_patients", "address"),
+    "user_email_trgm": ("users_customuser", "email"),
+    "user_phone_number_trgm": ("users_customuser", "phone_number"),
+}
+
+
+def create_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(SQLITE_TABLE)
+        schema_editor.execute(
+            f"INSERT INTO {TABLE} (rowid, full_name, email, phone_number, "
+            f"address) {SQLITE_ROW}"
+        )
+        for trigger in SQLITE_TRIGGERS:
+            schema_editor.execute(trigger)
+    elif vendor == "postgresql":
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for name, (table, column) in POSTGRES_INDEXES.items():
+            schema_editor.execute(
+                f"CREATE INDEX IF NOT EXISTS {name} ON {table} "
+                f"USING gin ({column} gin_trgm_ops)"
+            )
+
+
+def drop_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        for suffix in ("insert", "update", "delete", "user"):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {TABLE}_{suffix}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+    elif vendor == "postgresql":
+        for name in POSTGRES_INDEXES:
+            schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0009_full_name"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,137 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# The clinical search schema as this migration created it; users.search
+# holds the queries and reinstalls the triggers after every migrate.
+# (source table, primary key, FTS5 table, indexed columns)
+TEXT_INDEXES = [
+    (
+        "users_prescriptions",
+        "prescription_id",
+        "users_prescriptionsearch",
+        ["medicine_detail", "instructions"],
+    ),
+    ("users_appointments", "appointment_id", "users_appointmentsearch", ["notes"]),
+    ("users_surgeries", "surgery_id", "users_surgerysearch", ["notes"]),
+]
+
+
+def normalize_medicine(detail):
+    # users.search.normalize_medicine as of this migration.
+    if not detail:
+        return None
+    return " ".join(detail.lower().split()).strip(" .,;:")[:255] or None
+
+
+def link_medicines(apps, schema_editor):
+    # Fill the vocabulary from existing prescriptions, 2000 at a time.
+    Prescriptions = apps.get_model("users", "Prescriptions")
+    Medicines = apps.get_model("users", "Medicines")
+    last = 0
+    while True:
+        rows = list(
+            Prescriptions.objects.filter(pk__gt=last)
+            .order_by("pk")
+            .values_list("pk", "medicine_detail")[:2000]
+        )
+        if not rows:
+            break
+        last = rows[-1][0]
+        names = {pk: normalize_medicine(detail) for pk, detail in rows}
+        wanted = set(names.values()) - {None}
+        Medicines.objects.bulk_create(
+            [Medicines(name=name) for name in wanted], ignore_conflicts=True
+        )
+        ids = dict(Medicines.objects.filter(name__in=wanted).values_list("name", "pk"))
+        Prescriptions.objects.bulk_update(
+            [
+                Prescriptions(pk=pk, medicine_id=ids[name])
+                for pk, name in names.items()
+                if name
+            ],
+            ["medicine"],
+            batch_size=500,
+        )
+
+
+def text_triggers(source, pk, table, columns):
+    names = ", ".join(columns)
+    new = ", ".join(f"new.{column}" for column in columns)
+    old = ", ".join(f"old.{column}" for column in columns)
+    delete = (
+        f"INSERT INTO {table} ({table}, rowid, {names}) "
+        f"VALUES ('delete', old.{pk}, {old});"
+    )
+    insert = f"INSERT INTO {table} (rowid, {names}) VALUES (new.{pk}, {new});"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {table}_insert AFTER INSERT ON "
+        f"{source} BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_delete AFTER DELETE ON "
+        f"{source} BEGIN {delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_update AFTER UPDATE OF "
+        f"{names} ON {source} BEGIN {delete} {insert} END",
+    ]
+
+
+def create_text_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for source, pk, table, columns in TEXT_INDEXES:
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+            f"{', '.join(columns)}, content='{source}', content_rowid='{pk}', "
+            f"tokenize='porter unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        schema_editor.execute(f"INSERT INTO {table} ({table}) VALUES ('rebuild')")
+        for trigger in text_triggers(source, pk, table, columns):
+            schema_editor.execute(trigger)
+
+
+def drop_text_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for source, pk, table, columns in TEXT_INDEXES:
+        for suffix in ("insert", "delete", "update"):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {table}_{suffix}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0010_patient_search"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Medicines",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=255, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="prescriptions",
+            name="medicine",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="prescriptions",
+                to="users.medicines",
+            ),
+        ),
+        migrations.RunPython(link_medicines, migrations.RunPython.noop),
+        migrations.RunPython(create_text_indexes, drop_text_indexes),
+    ]
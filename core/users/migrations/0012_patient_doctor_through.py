@@ -0,0 +1,144 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+
+def remove_duplicate_relationships(apps, schema_editor):
+    # Keep the oldest row of each (patient, doctor) pair so the unique
+    # constraint can be added; one primary key range at a time.
+    Patient_Doctor = apps.get_model("users", "Patient_Doctor")
+    older = Patient_Doctor.objects.filter(
+        patient_id=models.OuterRef("patient_id"),
+        doctor_id=models.OuterRef("doctor_id"),
+        pk__lt=models.OuterRef("pk"),
+    )
+    bounds = Patient_Doctor.objects.aggregate(
+        low=models.Min("pk"), high=models.Max("pk")
+    )
+    if bounds["low"] is None:
+        return
+    for low in range(bounds["low"], bounds["high"] + 1, BATCH_SIZE):
+        Patient_Doctor.objects.filter(
+            models.Exists(older), pk__gte=low, pk__lt=low + BATCH_SIZE
+        ).delete()
+
+
+def auto_through(apps):
+    # The implicit users_doctors_patient table of the old Doctors.patient.
+    return (
+        apps.get_model("users", "Doctors")
+        ._meta.get_field("patient")
+        .remote_field.through
+    )
+
+
+def merge_doctor_patients(apps, schema_editor):
+    # Pairs only in the old table become Primary_Care relationships.
+    Patient_Doctor = apps.get_model("users", "Patient_Doctor")
+    Through = auto_through(apps)
+    last = 0
+    while True:
+        rows = list(
+            Through.objects.filter(pk__gt=last)
+            .order_by("pk")
+            .values_list("pk", "patients_id", "doctors_id")[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+        last = rows[-1][0]
+        Patient_Doctor.objects.bulk_create(
+            [
+                Patient_Doctor(patient_id=patient_id, doctor_id=doctor_id)
+                for _, patient_id, doctor_id in rows
+            ],
+            ignore_conflicts=True,
+        )
+
+
+def drop_auto_through(apps, schema_editor):
+    schema_editor.delete_model(auto_through(apps))
+
+
+def restore_auto_through(apps, schema_editor):
+    Patient_Doctor = apps.get_model("users", "Patient_Doctor")
+    Through = auto_through(apps)
+    schema_editor.create_model(Through)
+    last = 0
+    while True:
+        rows = list(
+            Patient_Doctor.objects.filter(pk__gt=last)
+            .order_by("pk")
+            .values_list("pk", "patient_id", "doctor_id")[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+        last = rows[-1][0]
+        Through.objects.bulk_create(
+            [
+                Through(patients_id=patient_id, doctors_id=doctor_id)
+                for _, patient_id, doctor_id in rows
+            ]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0011_clinical_search"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_relationships, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="patient_doctor",
+            constraint=models.UniqueConstraint(
+                fields=("patient", "doctor"), name="patient_doctor_unique"
+            ),
+        ),
+        migrations.RunPython(merge_doctor_patients, migrations.RunPython.noop),
+        migrations.RunPython(drop_auto_through, restore_auto_through),
+        # Django cannot alter a field to a custom through model; the table
+        # changes are done above, so only the state changes here.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name="doctors",
+                    name="patient",
+                    field=models.ManyToManyField(
+                        related_name="patient_doc",
+                        through="users.Patient_Doctor",
+                        to="users.patients",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="patient_doctor",
+            index=models.Index(
+                fields=["doctor", "patient"], name="patient_doctor_doctor_idx"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="patient_doctor",
+            name="doctor",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="patient_relationships",
+                to="users.doctors",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="patient_doctor",
+            name="patient",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="doctor_relationships",
+                to="users.patients",
+            ),
+        ),
+    ]
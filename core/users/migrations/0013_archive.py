@@ -0,0 +1,164 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0012_patient_doctor_through"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedAppointments",
+            fields=[
+                (
+                    "appointment_id",
+                    models.IntegerField(primary_key=True, serialize=False),
+                ),
+                ("appointment_date", models.DateTimeField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("Scheduled", "Scheduled"),
+                            ("Completed", "Completed"),
+                            ("Cancelled", "Cancelled"),
+                        ],
+                        max_length=15,
+                    ),
+                ),
+                ("notes", models.TextField(blank=True, null=True)),
+                ("duration_minutes", models.PositiveSmallIntegerField(default=30)),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "doctor",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_appointments",
+                        to="users.doctors",
+                    ),
+                ),
+                (
+                    "patient",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_appointments",
+                        to="users.patients",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ArchivedPrescriptions",
+            fields=[
+                (
+                    "prescription_id",
+                    models.IntegerField(primary_key=True, serialize=False),
+                ),
+                ("medicine_detail", models.TextField(blank=True, null=True)),
+                ("instructions", models.TextField(blank=True, null=True)),
+                (
+                    "appointment",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="prescription",
+                        to="users.archivedappointments",
+                    ),
+                ),
+                (
+                    "doctor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_prescriptions",
+                        to="users.doctors",
+                    ),
+                ),
+                (
+                    "medicine",
+                    models.ForeignKey(
+                        blank=True,
+                        editable=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="archived_prescriptions",
+                        to="users.medicines",
+                    ),
+                ),
+                (
+                    "patient",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_prescriptions",
+                        to="users.patients",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ArchivedSurgeries",
+            fields=[
+                ("surgery_id", models.IntegerField(primary_key=True, serialize=False)),
+                ("surgery_date", models.DateTimeField()),
+                (
+                    "surgery_type",
+                    models.CharField(blank=True, max_length=255, null=True),
+                ),
+                ("notes", models.TextField(blank=True, null=True)),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "doctor",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_surgeries",
+                        to="users.doctors",
+                    ),
+                ),
+                (
+                    "patient",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_surgeries",
+                        to="users.patients",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="archivedappointments",
+            index=models.Index(
+                fields=["doctor", "appointment_date"],
+                name="archived_appt_doctor_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="archivedappointments",
+            index=models.Index(
+                fields=["patient", "appointment_date"],
+                name="archived_appt_patient_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="archivedappointments",
+            index=models.Index(
+                fields=["appointment_date"], name="archived_appt_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="archivedsurgeries",
+            index=models.Index(
+                fields=["doctor", "surgery_date"], name="archived_surgery_doctor_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="archivedsurgeries",
+            index=models.Index(
+                fields=["surgery_date"], name="archived_surgery_date_idx"
+            ),
+        ),
+    ]
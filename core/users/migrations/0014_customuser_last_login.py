@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:32
+
+from django.db import migrations, models
+
+# Rebuilding users_customuser on SQLite fails while the patient search
+# triggers refer to it, so the search triggers are dropped first and
+# recreated afterwards from the SQL they were created with.
+SEARCH_TABLES = (
+    "users_patientsearch",
+    "users_prescriptionsearch",
+    "users_appointmentsearch",
+    "users_surgerysearch",
+)
+saved_triggers = {}
+
+
+def drop_search_triggers(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'")
+        triggers = [
+            (name, sql)
+            for name, sql in cursor.fetchall()
+            if name.rsplit("_", 1)[0] in SEARCH_TABLES
+        ]
+    saved_triggers[connection.alias] = [sql for name, sql in triggers]
+    for name, sql in triggers:
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+
+def install_search_triggers(apps, schema_editor):
+    connection = schema_editor.connection
+    for sql in saved_triggers.pop(connection.alias, []):
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0013_archive"),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_search_triggers, install_search_triggers),
+        migrations.AlterField(
+            model_name="customuser",
+            name="last_login",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(install_search_triggers, drop_search_triggers),
+    ]
@@ -0,0 +1,44 @@
+from django.db import migrations
+
+# icontains compiles to UPPER(column::text) LIKE UPPER(%s) on PostgreSQL,
+# which the plain trigram indexes from 0010 cannot serve; index the same
+# UPPER expression instead.
+COLUMNS = [
+    ("patient_full_name", "users_patients", "full_name"),
+    ("patient_address", "users_patients", "address"),
+    ("user_email", "users_customuser", "email"),
+    ("user_phone_number", "users_customuser", "phone_number"),
+]
+
+
+def index_upper(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for prefix, table, column in COLUMNS:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {prefix}_trgm")
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {prefix}_upper_trgm ON {table} "
+            f"USING gin ((UPPER({column}::text)) gin_trgm_ops)"
+        )
+
+
+def index_columns(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for prefix, table, column in COLUMNS:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {prefix}_upper_trgm")
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {prefix}_trgm ON {table} "
+            f"USING gin ({column} gin_trgm_ops)"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0014_customuser_last_login"),
+    ]
+
+    operations = [
+        migrations.RunPython(index_upper, index_columns),
+    ]
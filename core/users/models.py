@@ -9,11 +9,15 @@ class Gender(models.TextChoices):
     OTHER = "Other"
 
 
+def display_name(first_name, last_name):
+    return " ".join(part for part in (first_name, last_name) if part)
+
+
 class CustomUser(AbstractBaseUser, PermissionsMixin):
     email = models.EmailField(max_length=255, unique=True)
     first_name = models.CharField(max_length=20, blank=True, null=True)
     last_name = models.CharField(max_length=20, blank=True, null=True)
-    last_login = models.DateTimeField(auto_now=True)
+    last_login = models.DateTimeField(blank=True, null=True)
     phone_number = models.CharField(max_length=11, blank=True, null=True)
     date_joined = models.DateTimeField(auto_now_add=True)
     is_staff = models.BooleanField(default=False)
@@ -23,6 +27,10 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return f'{self.email}'
 
+    @property
+    def full_name(self):
+        return display_name(self.first_name, self.last_name)
+
     def has_prem(self, perm, obj=None):
         return self.is_superuser
 
@@ -43,10 +51,14 @@ class Patients(models.Model):
                               choices=Gender.choices,
                               blank=True, null=True)
     address = models.TextField(max_length=600, blank=True, null=True)
+    # Copy of user.full_name kept current by users.signals, so names can
+    # be shown, searched and sorted without joining CustomUser.
+    full_name = models.CharField(max_length=41, blank=True, default="",
+                                 db_index=True, editable=False)
 
     @property
     def name(self):
-        return f'{self.user.first_name} {self.user.last_name}'
+        return self.full_name
 
     def __str__(self):
         return f"Patient: {self.name} <{self.user.email}>"
@@ -94,12 +106,15 @@ class Doctors(models.Model):
         null=True,
         related_name='doctors'
     )
-    patient = models.ManyToManyField(Patients,
+    patient = models.ManyToManyField(Patients, through="Patient_Doctor",
                                      related_name="patient_doc")
+    # See Patients.full_name.
+    full_name = models.CharField(max_length=41, blank=True, default="",
+                                 db_index=True, editable=False)
 
     @property
     def name(self):
-        return f'{self.user.first_name} {self.user.last_name}'
+        return self.full_name
 
     def __str__(self):
         dept_name = self.department.name if self.department else "No Depart"
@@ -121,11 +136,85 @@ class Appointments(models.Model):
     appointment_date = models.DateTimeField()
     status = models.CharField(max_length=15, choices=Status.choices)
     notes = models.TextField(blank=True, null=True)
+    duration_minutes = models.PositiveSmallIntegerField(default=30)
+
+    class Meta:
+        constraints = [
+            # users.scheduling bounds its overlap searches by this.
+            models.CheckConstraint(
+                condition=models.Q(duration_minutes__gt=0,
+                                   duration_minutes__lte=240),
+                name="appointment_duration_range"),
+            # Makes re-running users.scheduling.schedule_followups for
+            # the same doctor and time a no-op.
+            models.UniqueConstraint(
+                fields=["doctor", "patient", "appointment_date"],
+                condition=models.Q(status=Status.SCHEDULED),
+                name="appointment_unique_scheduled_visit"),
+        ]
+        indexes = [
+            models.Index(fields=["doctor", "appointment_date"],
+                         name="appointment_doctor_date_idx"),
+            models.Index(fields=["patient", "appointment_date"],
+                         name="appointment_patient_date_idx"),
+            models.Index(fields=["status", "appointment_date"],
+                         name="appointment_status_date_idx"),
+            models.Index(fields=["appointment_date"],
+                         name="appointment_date_idx"),
+            # Partial index; backends without support skip it.
+            models.Index(fields=["appointment_date"],
+                         condition=models.Q(status=Status.SCHEDULED),
+                         name="appointment_scheduled_idx"),
+        ]
 
     def __str__(self):
         return f"{self.patient.name} - {self.appointment_date}"
 
 
+class Weekday(models.IntegerChoices):
+    MONDAY = 0
+    TUESDAY = 1
+    WEDNESDAY = 2
+    THURSDAY = 3
+    FRIDAY = 4
+    SATURDAY = 5
+    SUNDAY = 6
+
+
+class DoctorSchedule(models.Model):
+    # A doctor's working hours on one weekday, split into fixed slots.
+    doctor = models.ForeignKey(Doctors, on_delete=models.CASCADE,
+                               related_name="schedules")
+    weekday = models.PositiveSmallIntegerField(choices=Weekday.choices)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    slot_minutes = models.PositiveSmallIntegerField(default=30)
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(start_time__lt=models.F("end_time")),
+                name="doctor_schedule_start_before_end"),
+            models.CheckConstraint(
+                condition=models.Q(slot_minutes__gt=0,
+                                   slot_minutes__lte=240),
+                name="doctor_schedule_slot_range"),
+        ]
+
+    def __str__(self):
+        return (f"{self.get_weekday_display()} "
+                f"{self.start_time:%H:%M}-{self.end_time:%H:%M}")
+
+
+class Medicines(models.Model):
+    # Vocabulary of normalised Prescriptions.medicine_detail values, so
+    # "most prescribed" groups on an indexed id instead of free text.
+    name = models.CharField(max_length=255, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
 class Prescriptions(models.Model):
     prescription_id = models.AutoField(primary_key=True)
     appointment = models.OneToOneField(Appointments,
@@ -139,6 +228,10 @@ class Prescriptions(models.Model):
                                 related_name="prescription_patient_id")
     medicine_detail = models.TextField(blank=True, null=True)
     instructions = models.TextField(blank=True, null=True)
+    # Set from medicine_detail by users.signals.
+    medicine = models.ForeignKey(Medicines, on_delete=models.SET_NULL,
+                                 blank=True, null=True, editable=False,
+                                 related_name="prescriptions")
 
     def __str__(self):
         return f"Prescription for {self.patient.name}"
@@ -154,6 +247,12 @@ class Surgeries(models.Model):
     surgery_type = models.CharField(max_length=255, blank=True, null=True)
     notes = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["doctor", "surgery_date"],
+                         name="surgery_doctor_date_idx"),
+        ]
+
     def __str__(self):
         return f"{self.patient.name} - {self.surgery_date}"
 
@@ -165,13 +264,135 @@ class RelationshipType(models.TextChoices):
 
 
 class Patient_Doctor(models.Model):
+    # The through table of Doctors.patient. The unique (patient, doctor)
+    # index answers lookups by patient and the (doctor, patient) one
+    # panel queries by doctor, so neither key has an index of its own.
     patient = models.ForeignKey(Patients, on_delete=models.CASCADE,
-                                related_name="doctor_relationships")
+                                related_name="doctor_relationships",
+                                db_index=False)
     doctor = models.ForeignKey(Doctors, on_delete=models.CASCADE,
-                               related_name="patient_relationships")
+                               related_name="patient_relationships",
+                               db_index=False)
     relationship_type = models.CharField(max_length=15,
                                          choices=RelationshipType.choices,
                                          default=RelationshipType.PRIMARY_CARE)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["patient", "doctor"],
+                                    name="patient_doctor_unique"),
+        ]
+        indexes = [
+            models.Index(fields=["doctor", "patient"],
+                         name="patient_doctor_doctor_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.patient.name} - {self.doctor.name}"
+
+
+class StatisticKind(models.TextChoices):
+    APPOINTMENT = "Appointment"
+    SURGERY = "Surgery"
+    PRESCRIPTION = "Prescription"
+
+
+class DailyStatistics(models.Model):
+    # Per doctor/day rollup of Appointments (per status), Surgeries and
+    # Prescriptions, kept current by users.signals. Department totals
+    # group on doctor__department.
+    kind = models.CharField(max_length=15, choices=StatisticKind.choices)
+    doctor = models.ForeignKey(Doctors, on_delete=models.CASCADE,
+                               related_name="daily_statistics")
+    date = models.DateField()
+    status = models.CharField(max_length=15, blank=True, default="")
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["kind", "doctor", "date", "status"],
+                name="daily_statistics_unique_key"),
+        ]
+        indexes = [
+            models.Index(fields=["kind", "date"],
+                         name="daily_statistics_kind_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.date}: {self.count}"
+
+
+# Cold copies of Appointments (Completed or Cancelled), their
+# Prescriptions and Surgeries older than an archive cutoff, moved by
+# users.archive with their primary keys unchanged. users.archive.records
+# reads across both sides; DailyStatistics keeps counting archived rows.
+class ArchivedAppointments(models.Model):
+    appointment_id = models.IntegerField(primary_key=True)
+    patient = models.ForeignKey(Patients, on_delete=models.CASCADE,
+                                related_name="archived_appointments",
+                                db_index=False)
+    doctor = models.ForeignKey(Doctors, on_delete=models.CASCADE,
+                               related_name="archived_appointments",
+                               db_index=False)
+    appointment_date = models.DateTimeField()
+    status = models.CharField(max_length=15, choices=Status.choices)
+    notes = models.TextField(blank=True, null=True)
+    duration_minutes = models.PositiveSmallIntegerField(default=30)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["doctor", "appointment_date"],
+                         name="archived_appt_doctor_date_idx"),
+            models.Index(fields=["patient", "appointment_date"],
+                         name="archived_appt_patient_date_idx"),
+            models.Index(fields=["appointment_date"],
+                         name="archived_appt_date_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.patient.name} - {self.appointment_date} (archived)"
+
+
+class ArchivedPrescriptions(models.Model):
+    prescription_id = models.IntegerField(primary_key=True)
+    appointment = models.OneToOneField(ArchivedAppointments,
+                                       on_delete=models.CASCADE,
+                                       related_name="prescription")
+    doctor = models.ForeignKey(Doctors, on_delete=models.CASCADE,
+                               related_name="archived_prescriptions")
+    patient = models.ForeignKey(Patients, on_delete=models.CASCADE,
+                                related_name="archived_prescriptions")
+    medicine_detail = models.TextField(blank=True, null=True)
+    instructions = models.TextField(blank=True, null=True)
+    medicine = models.ForeignKey(Medicines, on_delete=models.SET_NULL,
+                                 blank=True, null=True, editable=False,
+                                 related_name="archived_prescriptions")
+
+    def __str__(self):
+        return f"Prescription for {self.patient.name} (archived)"
+
+
+class ArchivedSurgeries(models.Model):
+    surgery_id = models.IntegerField(primary_key=True)
+    patient = models.ForeignKey(Patients, on_delete=models.CASCADE,
+                                related_name="archived_surgeries")
+    doctor = models.ForeignKey(Doctors, on_delete=models.CASCADE,
+                               related_name="archived_surgeries",
+                               db_index=False)
+    surgery_date = models.DateTimeField()
+    surgery_type = models.CharField(max_length=255, blank=True, null=True)
+    notes = models.TextField(blank=True, null=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["doctor", "surgery_date"],
+                         name="archived_surgery_doctor_idx"),
+            models.Index(fields=["surgery_date"],
+                         name="archived_surgery_date_idx"),
+        ]
+
     def __str__(self):
-        return f"{self.patient.user.first_name}-{self.doctor.user.first_name}"
+        return f"{self.patient.name} - {self.surgery_date} (archived)"
@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
+
+def planner_estimate(model, using):
+    """Row count the database planner believes ``model`` has, or None."""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+                [connection.ops.quote_name(table)])
+            row = cursor.fetchone()
+            # reltuples is -1 until the table is first analyzed
+            if row and row[0] >= 0:
+                return int(row[0])
+        elif connection.vendor == "sqlite":
+            # sqlite_stat1 only exists once ANALYZE has run
+            try:
+                cursor.execute(
+                    "SELECT stat FROM sqlite_stat1 WHERE tbl = %s", [table])
+            except DatabaseError:
+                return None
+            counts = [int(stat.split()[0]) for stat, in cursor.fetchall()]
+            if counts:
+                return max(counts)
+    return None
+
+
+def estimated_count(model, using="default"):
+    """Planner estimate, else an exact count cached for a few minutes.
+
+    Returns (count, exact); ``exact`` is true only when the count was run
+    just now, so callers can use it instead of counting again.
+    """
+    estimate = planner_estimate(model, using)
+    if estimate is not None:
+        return estimate, False
+    key = f"estimated-count:{using}:{model._meta.db_table}"
+    count = cache.get(key)
+    if count is not None:
+        return count, False
+    count = model._default_manager.using(using).count()
+    cache.set(key, count,
+              getattr(settings, "ESTIMATED_COUNT_CACHE_TIMEOUT", 300))
+    return count, True
+
+
+class EstimatedCountPaginator(Paginator):
+    # Unfiltered querysets over big tables report an estimated count
+    # instead of running SELECT COUNT(*); filtered or small ones still
+    # count exactly.
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and not queryset.query.where:
+            estimate, exact = estimated_count(queryset.model, queryset.db)
+            if exact or estimate >= getattr(
+                    settings, "ESTIMATED_COUNT_THRESHOLD", 100_000):
+                return estimate
+        return super().count
@@ -0,0 +1,110 @@
+import hashlib
+import threading
+import time
+from collections import Counter
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from . import reports
+from .models import Department, Doctors
+
+# Read-through cache for reference data that changes rarely but is read
+# on most pages: departments, specializations, doctors per specialization
+# and department heads. Entries live in the "reference" cache (in-process
+# LocMemCache by default, Redis when REDIS_URL is set) under the current
+# generation as their key version. users.signals starts a new generation
+# whenever a Department or Doctors row changes, which drops every entry
+# at once without knowing their keys. With the in-process default other
+# workers only see the change once their entries expire; point
+# REDIS_URL at a shared server when that matters.
+
+GENERATION_KEY = "reference:generation"
+
+_lock = threading.Lock()
+_counts = Counter()
+
+
+def _cache():
+    return caches["reference"]
+
+
+def _generation():
+    generation = _cache().get(GENERATION_KEY)
+    if generation is None:
+        generation = invalidate()
+    return generation
+
+
+def invalidate():
+    """Start a new generation; every cached lookup misses afterwards."""
+    # A fresh timestamp rather than a counter, so a generation key lost
+    # to eviction can never bring back entries from an older one.
+    generation = time.time_ns()
+    _cache().set(GENERATION_KEY, generation, timeout=None)
+    return generation
+
+
+def cached(name, loader, *args):
+    key = f"reference:{name}"
+    if args:
+        # Arguments such as specializations may hold spaces, which some
+        # cache backends reject in keys.
+        key += ":" + hashlib.md5(repr(args).encode()).hexdigest()
+    generation = _generation()
+    value = _cache().get(key, version=generation)
+    with _lock:
+        _counts[name, "hit" if value is not None else "miss"] += 1
+    if value is None:
+        value = loader(*args)
+        _cache().set(key, value, version=generation)
+    return value
+
+
+def stats():
+    """{(lookup, "hit" | "miss"): count} for this process."""
+    with _lock:
+        return dict(_counts)
+
+
+def reset_stats():
+    with _lock:
+        _counts.clear()
+
+
+def _departments():
+    return list(Department.objects.select_related("head_doctor")
+                .order_by("name"))
+
+
+# Entries live until the next write invalidates them, so the report
+# queries are pinned to the primary: a lagging replica could otherwise
+# refill the cache with the data that write just replaced.
+def _specializations():
+    return list(reports.specializations_by_doctor_count().using(
+        DEFAULT_DB_ALIAS))
+
+
+def _doctors_in(specialization):
+    return list(Doctors.objects.filter(specialization=specialization)
+                .select_related("department").order_by("full_name"))
+
+
+def _department_heads():
+    return list(reports.department_head_doctors().using(DEFAULT_DB_ALIAS))
+
+
+def departments():
+    return cached("departments", _departments)
+
+
+def specializations():
+    """Queries.py #6: specializations by number of doctors."""
+    return cached("specializations", _specializations)
+
+
+def doctors_in(specialization):
+    return cached("doctors_in", _doctors_in, specialization)
+
+
+def department_heads():
+    """Queries.py #18: departments with their head doctor."""
+    return cached("department_heads", _department_heads)
@@ -0,0 +1,351 @@
+from datetime import timedelta
+from django.db.models import (
+    Avg, Count, Exists, F, FloatField, Func, IntegerField, Max, OuterRef,
+    Prefetch, Q, Subquery, Value
+)
+from django.db.models.functions import ExtractYear
+from django.utils.timezone import now
+from . import archive, search
+from .models import (
+    Appointments, ArchivedAppointments, ArchivedPrescriptions,
+    ArchivedSurgeries, Department, Doctors, Insurance, Medicines, Patients,
+    Prescriptions, Surgeries
+)
+from .routers import on_replica
+
+# The Queries.py reports as reusable functions. Membership checks use
+# EXISTS subqueries instead of join + DISTINCT, and aggregates run in the
+# database, so each report is a single statement unless it prefetches.
+# Reports are read-only and run on the replica when one is configured.
+#
+# Membership checks and counts include archived rows (users.archive), as
+# DailyStatistics does. Reports returning hot rows for a date range call
+# archive.require_hot() first and raise ArchivedRange when the range
+# reaches the archive. Unranged listings, the text match and the
+# distinct doctor/patient counts only see the hot tables.
+
+
+def _exists(model, archived, **filters):
+    return (Exists(model.objects.filter(patient=OuterRef("pk"), **filters))
+            | Exists(archived.objects.filter(patient=OuterRef("pk"),
+                                             **filters)))
+
+
+def _count(model, archived, **filters):
+    """Rows of ``model`` plus ``archived`` matching ``filters``."""
+    def count(rows):
+        return Subquery(rows.filter(**filters).order_by().annotate(
+            total=Func(F("pk"), function="COUNT")).values("total"),
+            output_field=IntegerField())
+
+    return count(model.objects) + count(archived.objects)
+
+
+def _has_appointment(**filters):
+    return _exists(Appointments, ArchivedAppointments, **filters)
+
+
+def _has_prescription(**filters):
+    return _exists(Prescriptions, ArchivedPrescriptions, **filters)
+
+
+def _has_surgery():
+    return _exists(Surgeries, ArchivedSurgeries)
+
+
+def _has_insurance():
+    return Exists(Insurance.objects.filter(patient=OuterRef("pk")))
+
+
+@on_replica
+def appointments_between(start=None, end=None):
+    """Appointments in [start, end] with patient and doctor joined."""
+    start = start or now()
+    end = end or start + timedelta(days=7)
+    archive.require_hot("appointments", start)
+    return Appointments.objects.filter(
+        appointment_date__range=[start, end]
+    ).select_related("patient", "doctor")
+
+
+@on_replica
+def uninsured_patients_seen_since(since=None):
+    since = since or now() - timedelta(days=30)
+    return Patients.objects.filter(
+        ~_has_insurance(),
+        _has_appointment(appointment_date__gte=since),
+    )
+
+
+@on_replica
+def doctors_with_appointments_since(since=None, minimum=10):
+    since = since or now() - timedelta(days=180)
+    return Doctors.objects.annotate(appointment_count=_count(
+        Appointments, ArchivedAppointments, doctor=OuterRef("pk"),
+        appointment_date__gte=since,
+    )).filter(appointment_count__gt=minimum)
+
+
+@on_replica
+def providers_with_active_patients():
+    return Insurance.objects.filter(
+        patient__user__is_active=True
+    ).values_list("provider", flat=True).distinct().order_by("provider")
+
+
+@on_replica
+def departments_without_head(minimum_doctors=3):
+    return Department.objects.filter(head_doctor__isnull=True).annotate(
+        doctor_count=Count("doctors")
+    ).filter(doctor_count__gte=minimum_doctors)
+
+
+@on_replica
+def recent_patients_with_prescriptions(since=None):
+    """Patients seen since ``since``, most recent visit first, once each."""
+    since = since or now() - timedelta(days=30)
+    archive.require_hot("appointments", since)
+    return Patients.objects.annotate(last_visit=Max(
+        "appointments_as_patient__appointment_date",
+        filter=Q(appointments_as_patient__appointment_date__gte=since),
+    )).filter(
+        last_visit__isnull=False
+    ).order_by("-last_visit").prefetch_related(Prefetch(
+        "prescription_patient_id", queryset=Prescriptions.objects.all()))
+
+
+@on_replica
+def average_age_surgery_without_appointment(today=None):
+    """Average age in years, computed by the database, or None."""
+    today = today or now()
+    return Patients.objects.filter(
+        _has_surgery(), ~_has_appointment(), dob__isnull=False,
+    ).aggregate(average_age=Avg(
+        Value(today.year) - ExtractYear("dob"), output_field=FloatField(),
+    ))["average_age"]
+
+
+@on_replica
+def doctors_with_prescriptions(minimum=5):
+    return Doctors.objects.annotate(prescription_count=_count(
+        Prescriptions, ArchivedPrescriptions, doctor=OuterRef("pk"),
+    )).filter(prescription_count__gte=minimum)
+
+
+@on_replica
+def insured_appointments_excluding_sunday(provider="XYZ Insurance"):
+    return Appointments.objects.filter(
+        patient__insurance_patient__provider=provider
+    ).exclude(appointment_date__week_day=1)
+
+
+@on_replica
+def doctors_with_surgeries_since(since=None, minimum=5):
+    since = since or now() - timedelta(days=365)
+    return Doctors.objects.annotate(surgery_count=_count(
+        Surgeries, ArchivedSurgeries, doctor=OuterRef("pk"),
+        surgery_date__gte=since,
+    )).filter(surgery_count__gte=minimum).values_list("doctor_id", flat=True)
+
+
+@on_replica
+def patients_with_appointment_or_surgery():
+    return Patients.objects.filter(_has_appointment() | _has_surgery())
+
+
+@on_replica
+def patients_with_appointment_and_prescription():
+    return Patients.objects.filter(_has_appointment(), _has_prescription())
+
+
+@on_replica
+def patients_with_appointment_no_prescription():
+    return Patients.objects.filter(_has_appointment(), ~_has_prescription())
+
+
+@on_replica
+def uninsured_patients_with_several_doctors():
+    return Patients.objects.filter(~_has_insurance()).annotate(
+        doctor_count=Count("appointments_as_patient__doctor", distinct=True)
+    ).filter(doctor_count__gt=1).prefetch_related(Prefetch(
+        "appointments_as_patient",
+        queryset=Appointments.objects.select_related("doctor"),
+    ))
+
+
+@on_replica
+def specializations_by_doctor_count():
+    return Doctors.objects.values("specialization").annotate(
+        number_of_doc=Count("doctor_id")).order_by("-number_of_doc")
+
+
+@on_replica
+def patients_with_prescription_matching(term="Painkiller"):
+    # Driven from the prescription text index rather than a LIKE scan.
+    return Patients.objects.filter(pk__in=Prescriptions.objects.filter(
+        search.text_filter("prescriptions", term)).values("patient_id"))
+
+
+@on_replica
+def doctors_with_patient_count_between(since=None, low=5, high=15):
+    """Doctors who saw more than ``low`` and fewer than ``high`` patients."""
+    since = since or now() - timedelta(days=365)
+    archive.require_hot("appointments", since)
+    return Doctors.objects.annotate(patient_count=Count(
+        "appointments_as_doctor__patient", distinct=True,
+        filter=Q(appointments_as_doctor__appointment_date__gte=since),
+    )).filter(patient_count__gt=low, patient_count__lt=high)
+
+
+@on_replica
+def insured_patients_with_surgery():
+    return Patients.objects.filter(
+        _has_surgery(), insurance_patient__isnull=False,
+    ).select_related("user", "insurance_patient").prefetch_related(
+        "patient_surgery")
+
+
+@on_replica
+def doctor_appointment_counts():
+    return Doctors.objects.annotate(count_appoint=_count(
+        Appointments, ArchivedAppointments, doctor=OuterRef("pk")))
+
+
+@on_replica
+def scheduled_between(start=None, end=None):
+    start = start or now()
+    end = end or start + timedelta(days=30)
+    return Appointments.objects.filter(
+        appointment_date__range=[start, end], status="Scheduled",
+    ).order_by("appointment_date")
+
+
+@on_replica
+def oldest_and_youngest_patient():
+    """Return ``(oldest, youngest)``; both are None without patients."""
+    by_dob = Patients.objects.values("pk")
+    patients = sorted(
+        Patients.objects.filter(pk__in=[
+            Subquery(by_dob.order_by("dob", "pk")[:1]),
+            Subquery(by_dob.order_by("-dob", "pk")[:1]),
+        ]).select_related("user"),
+        key=lambda patient: patient.dob,
+    )
+    if not patients:
+        return None, None
+    return patients[0], patients[-1]
+
+
+@on_replica
+def departments_by_doctor_count():
+    return Department.objects.annotate(
+        count_doc=Count("doctors")).order_by("-count_doc")
+
+
+@on_replica
+def appointments_for_specialization(term="Dermatology"):
+    return Appointments.objects.filter(
+        doctor__specialization__icontains=term
+    ).select_related("doctor")
+
+
+@on_replica
+def patients_with_appointment_no_surgery():
+    return Patients.objects.filter(_has_appointment(), ~_has_surgery())
+
+
+@on_replica
+def department_head_doctors():
+    return Department.objects.select_related("head_doctor")
+
+
+@on_replica
+def surgeries_per_department():
+    return Department.objects.annotate(total_surgeries=_count(
+        Surgeries, ArchivedSurgeries, doctor__department=OuterRef("pk"),
+    )).values("name", "total_surgeries")
+
+
+@on_replica
+def patients_with_appointment_prescription_surgery():
+    return Patients.objects.filter(
+        _has_appointment(), _has_prescription(), _has_surgery())
+
+
+@on_replica
+def prescriptions_since(since=None):
+    since = since or now() - timedelta(days=7)
+    archive.require_hot("prescriptions", since)
+    return Prescriptions.objects.filter(
+        appointment__appointment_date__gte=since)
+
+
+@on_replica
+def providers_covering_more_than(minimum=5):
+    return Insurance.objects.values("provider").annotate(
+        count_provider=Count("patient")).filter(count_provider__gt=minimum)
+
+
+@on_replica
+def patients_by_last_name_prefix(prefix="S"):
+    return Patients.objects.filter(
+        user__last_name__startswith=prefix).select_related("user")
+
+
+@on_replica
+def gender_counts():
+    return Patients.objects.aggregate(
+        male_count=Count("patient_id", filter=Q(gender="Male")),
+        female_count=Count("patient_id", filter=Q(gender="Female")),
+    )
+
+
+@on_replica
+def top_surgeon():
+    return Doctors.objects.annotate(surgery_count=_count(
+        Surgeries, ArchivedSurgeries, doctor=OuterRef("pk"),
+    )).order_by("-surgery_count").first()
+
+
+@on_replica
+def repeat_visits():
+    return Appointments.objects.values("patient", "doctor").annotate(
+        visit_count=Count("appointment_id")).filter(visit_count__gt=1)
+
+
+@on_replica
+def patients_without_phone():
+    return Patients.objects.filter(
+        Q(user__phone_number__isnull=True) | Q(user__phone_number=""))
+
+
+@on_replica
+def top_doctors_by_patients(limit=5):
+    # Patient_Doctor holds each pair once, so counting its rows needs no
+    # DISTINCT and no join beyond the through table.
+    return Doctors.objects.annotate(
+        patient_count=Count("patient_relationships")
+    ).order_by("-patient_count")[:limit]
+
+
+@on_replica
+def departments_with_doctors(minimum=10):
+    return Department.objects.annotate(
+        doctor_count=Count("doctors")).filter(doctor_count__gte=minimum)
+
+
+@on_replica
+def patients_with_surgery_no_prescription():
+    return Patients.objects.filter(_has_surgery(), ~_has_prescription())
+
+
+@on_replica
+def most_prescribed_medicine():
+    """The ``{"name", "medicine_count"}`` Medicines row, or None.
+
+    Counts on the indexed medicine id (the normalised vocabulary) rather
+    than grouping the free-text medicine_detail.
+    """
+    return Medicines.objects.annotate(medicine_count=_count(
+        Prescriptions, ArchivedPrescriptions, medicine=OuterRef("pk"),
+    )).order_by("-medicine_count").values("name", "medicine_count").first()
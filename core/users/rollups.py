@@ -0,0 +1,202 @@
+from collections import Counter, defaultdict
+from itertools import islice
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import (
+    Appointments, ArchivedAppointments, ArchivedPrescriptions,
+    ArchivedSurgeries, DailyStatistics, Prescriptions, StatisticKind,
+    Surgeries
+)
+
+# Maintenance and reads for the DailyStatistics rollup. A rollup key is
+# (kind, doctor_id, date, status); signals move counts between keys as
+# rows change and rebuild() recomputes everything from the source tables
+# after bulk loads, which bypass signals.
+
+
+def _day(value):
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return timezone.localdate(value)
+
+
+def appointment_key(appointment):
+    return (StatisticKind.APPOINTMENT, appointment.doctor_id,
+            _day(appointment.appointment_date), appointment.status)
+
+
+def surgery_key(surgery):
+    return (StatisticKind.SURGERY, surgery.doctor_id,
+            _day(surgery.surgery_date), "")
+
+
+def prescription_key(prescription, appointment_date=None):
+    # Prescriptions are dated by their appointment.
+    if appointment_date is None:
+        appointment_date = Appointments.objects.filter(
+            pk=prescription.appointment_id
+        ).values_list("appointment_date", flat=True).first()
+    if appointment_date is None:
+        return None
+    return (StatisticKind.PRESCRIPTION, prescription.doctor_id,
+            _day(appointment_date), "")
+
+
+def reschedule_prescription(appointment, old_day):
+    """Move the count of ``appointment``'s prescription off ``old_day``."""
+    if old_day == _day(appointment.appointment_date):
+        return
+    prescription = Prescriptions.objects.filter(
+        appointment_id=appointment.pk).only("doctor_id").first()
+    if prescription is not None:
+        kind, doctor_id, day, status = prescription_key(
+            prescription, appointment.appointment_date)
+        move((kind, doctor_id, old_day, status),
+             (kind, doctor_id, day, status))
+
+
+def bump(key, delta):
+    kind, doctor_id, date, status = key
+    statistics = DailyStatistics.objects.filter(
+        kind=kind, doctor_id=doctor_id, date=date, status=status)
+    # Never create a row to decrement: the source row was either loaded
+    # in bulk before the last rebuild or its doctor is being deleted.
+    if statistics.update(count=F("count") + delta) or delta < 0:
+        return
+    DailyStatistics.objects.get_or_create(
+        kind=kind, doctor_id=doctor_id, date=date, status=status)
+    statistics.update(count=F("count") + delta)
+
+
+def move(old_key, new_key):
+    if old_key == new_key:
+        return
+    if old_key is not None:
+        bump(old_key, -1)
+    if new_key is not None:
+        bump(new_key, 1)
+
+
+def apply_deltas(deltas, batch_size=200):
+    """Add {key: delta} to the rollup in a handful of queries.
+
+    For bulk writes, which skip the signals and may touch hundreds of
+    keys at once. Like bump(), only positive deltas create rows.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    DailyStatistics.objects.bulk_create(
+        [DailyStatistics(kind=kind, doctor_id=doctor_id, date=date,
+                         status=status, count=0)
+         for (kind, doctor_id, date, status), delta in deltas.items()
+         if delta > 0],
+        ignore_conflicts=True)
+    # Read the rows back one doctor at a time (a date IN list each),
+    # which compiles far faster than one OR branch per key.
+    dates = defaultdict(set)
+    for kind, doctor_id, date, status in deltas:
+        dates[kind, doctor_id].add(date)
+    groups = iter(dates.items())
+    statistics = []
+    while batch := list(islice(groups, batch_size)):
+        matches = Q()
+        for (kind, doctor_id), days in batch:
+            matches |= Q(kind=kind, doctor_id=doctor_id, date__in=days)
+        for row in DailyStatistics.objects.select_for_update().filter(
+                matches):
+            delta = deltas.get((row.kind, row.doctor_id, row.date,
+                                row.status))
+            if delta:
+                row.count += delta
+                statistics.append(row)
+    # Every row exists by now, so this upsert only ever updates.
+    DailyStatistics.objects.bulk_create(
+        statistics, batch_size=batch_size, update_conflicts=True,
+        unique_fields=["kind", "doctor", "date", "status"],
+        update_fields=["count"])
+
+
+def move_counts(moves):
+    """Apply {(old_key, new_key): count} for bulk updates."""
+    deltas = Counter()
+    for (old_key, new_key), count in moves.items():
+        deltas[old_key] -= count
+        deltas[new_key] += count
+    apply_deltas(deltas)
+
+
+def _source_counts(since=None, archived=False):
+    if archived:
+        sources = (ArchivedAppointments, ArchivedSurgeries,
+                   ArchivedPrescriptions)
+    else:
+        sources = (Appointments, Surgeries, Prescriptions)
+    appointments = sources[0].objects.annotate(
+        day=TruncDate("appointment_date"))
+    surgeries = sources[1].objects.annotate(day=TruncDate("surgery_date"))
+    prescriptions = sources[2].objects.annotate(
+        day=TruncDate("appointment__appointment_date"))
+    if since is not None:
+        appointments = appointments.filter(day__gte=since)
+        surgeries = surgeries.filter(day__gte=since)
+        prescriptions = prescriptions.filter(day__gte=since)
+
+    for row in appointments.values("doctor_id", "day", "status").annotate(
+            total=Count("pk")).iterator():
+        yield StatisticKind.APPOINTMENT, row
+    for row in surgeries.values("doctor_id", "day").annotate(
+            total=Count("pk")).iterator():
+        yield StatisticKind.SURGERY, row
+    for row in prescriptions.values("doctor_id", "day").annotate(
+            total=Count("pk")).iterator():
+        yield StatisticKind.PRESCRIPTION, row
+
+
+def rebuild(since=None, batch_size=5000):
+    """Recompute the rollup, optionally only for days from ``since``."""
+    rows = (
+        DailyStatistics(kind=kind, doctor_id=row["doctor_id"],
+                        date=row["day"], status=row.get("status", ""),
+                        count=row["total"])
+        for kind, row in _source_counts(since)
+    )
+    total = 0
+    with transaction.atomic():
+        stale = DailyStatistics.objects.all()
+        if since is not None:
+            stale = stale.filter(date__gte=since)
+        stale.delete()
+        while batch := list(islice(rows, batch_size)):
+            total += len(DailyStatistics.objects.bulk_create(batch))
+        # Archived rows still count. A day can be split across both sides
+        # (the cutoff is a time), so they are added onto the hot counts.
+        archived = _source_counts(since, archived=True)
+        while batch := list(islice(archived, batch_size)):
+            apply_deltas({
+                (kind, row["doctor_id"], row["day"], row.get("status", "")):
+                row["total"] for kind, row in batch})
+    return total
+
+
+def totals(kind, group_by, since=None, until=None, **filters):
+    statistics = DailyStatistics.objects.filter(kind=kind, **filters)
+    if since is not None:
+        statistics = statistics.filter(date__gte=since)
+    if until is not None:
+        statistics = statistics.filter(date__lte=until)
+    return statistics.values(group_by).annotate(
+        total=Sum("count")).filter(total__gt=0).order_by(group_by)
+
+
+def appointments_per_doctor(since=None, until=None, **filters):
+    return totals(StatisticKind.APPOINTMENT, "doctor", since, until,
+                  **filters)
+
+
+def surgeries_per_department(since=None, until=None):
+    return totals(StatisticKind.SURGERY, "doctor__department", since, until)
+
+
+def prescriptions_per_doctor(since=None, until=None):
+    return totals(StatisticKind.PRESCRIPTION, "doctor", since, until)
@@ -0,0 +1,78 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import QuerySet
+
+# Primary/replica routing. Everything reads and writes the primary
+# ("default") unless it is report or export traffic, which goes to the
+# "replica" alias when settings define one. Report code opts in with
+# on_replica (or replica_reads() around code that evaluates queries
+# itself); nothing else ever sees replica lag.
+#
+# Read-after-write stays on the primary: inside an open transaction on
+# the primary, or after a write in the same replica_reads() block, reads
+# go to the primary, which is the only database holding those writes.
+
+REPLICA = "replica"
+
+_block = ContextVar("replica_reads", default=None)
+
+
+def read_db():
+    """The alias report reads should use right now."""
+    block = _block.get()
+    if (REPLICA not in connections
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+            or (block is not None and block["wrote"])):
+        return DEFAULT_DB_ALIAS
+    return REPLICA
+
+
+@contextmanager
+def replica_reads():
+    """Route reads evaluated inside the block through read_db()."""
+    token = _block.set({"wrote": False})
+    try:
+        yield
+    finally:
+        _block.reset(token)
+
+
+def on_replica(func):
+    """Run a report under replica_reads().
+
+    A returned QuerySet is bound to read_db() as well, since it is only
+    evaluated after the block has ended.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with replica_reads():
+            result = func(*args, **kwargs)
+            if isinstance(result, QuerySet) and result._db is None:
+                result = result.using(read_db())
+        return result
+    return wrapper
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _block.get() is None:
+            return None
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db:
+            # Related lookups follow the object they start from.
+            return instance._state.db
+        return read_db()
+
+    def db_for_write(self, model, **hints):
+        block = _block.get()
+        if block is not None:
+            block["wrote"] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, REPLICA}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
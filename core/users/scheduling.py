@@ -0,0 +1,261 @@
+from bisect import bisect_left
+from collections import Counter, defaultdict, namedtuple
+from datetime import datetime, time, timedelta
+from itertools import islice
+from time import monotonic, sleep
+from django.db import transaction
+from django.db.models import Exists, Max, Min, OuterRef
+from django.utils import timezone
+from . import rollups
+from .models import Appointments, DoctorSchedule, Doctors, Patients, Status
+
+# Slot booking on top of DoctorSchedule working hours. Appointments run
+# for at most MAX_APPOINTMENT_MINUTES (a check constraint on both
+# models), so every overlap search is a bounded range on the (doctor,
+# appointment_date) index.
+
+MAX_APPOINTMENT_MINUTES = 240
+MAX_APPOINTMENT = timedelta(minutes=MAX_APPOINTMENT_MINUTES)
+
+Slot = namedtuple("Slot", ["start", "end", "doctor_id"])
+Followups = namedtuple("Followups", ["eligible", "created", "skipped"])
+Closed = namedtuple("Closed", ["closed", "last_pk", "seconds"])
+
+
+class SlotUnavailable(ValueError):
+    pass
+
+
+def busy_intervals(doctor_ids, start, end):
+    """Sorted (start, end) pairs per doctor that may overlap [start, end)."""
+    rows = Appointments.objects.filter(
+        doctor_id__in=doctor_ids,
+        appointment_date__gt=start - MAX_APPOINTMENT,
+        appointment_date__lt=end,
+    ).exclude(status=Status.CANCELLED).order_by(
+        "appointment_date"
+    ).values_list("doctor_id", "appointment_date", "duration_minutes")
+    busy = defaultdict(list)
+    for doctor_id, when, minutes in rows:
+        busy[doctor_id].append((when, when + timedelta(minutes=minutes)))
+    return busy
+
+
+def is_free(busy, start, end):
+    # Only intervals starting in (start - MAX_APPOINTMENT, end) can
+    # overlap; walk back from the first one starting at or after end.
+    index = bisect_left(busy, (end,))
+    while index > 0:
+        index -= 1
+        busy_start, busy_end = busy[index]
+        if busy_start <= start - MAX_APPOINTMENT:
+            break
+        if busy_end > start:
+            return False
+    return True
+
+
+def _localize(day, at):
+    return timezone.make_aware(datetime.combine(day, at))
+
+
+def day_slots(schedule, day):
+    step = timedelta(minutes=schedule.slot_minutes)
+    start = _localize(day, schedule.start_time)
+    close = _localize(day, schedule.end_time)
+    while start + step <= close:
+        yield start, start + step
+        start += step
+
+
+def schedule_for(doctor, start):
+    """The DoctorSchedule whose slot grid has a slot starting at ``start``."""
+    local = timezone.localtime(start)
+    for schedule in DoctorSchedule.objects.filter(
+            doctor=doctor, weekday=local.weekday()):
+        for slot_start, slot_end in day_slots(schedule, local.date()):
+            if slot_start == start:
+                return schedule
+    raise SlotUnavailable(f"{start} is not a slot in the doctor's hours.")
+
+
+def book_appointment(doctor, patient, start, notes=None):
+    """Book the slot starting at ``start`` or raise SlotUnavailable."""
+    schedule = schedule_for(doctor, start)
+    end = start + timedelta(minutes=schedule.slot_minutes)
+    with transaction.atomic():
+        # Locking the doctor row serialises bookings per doctor, so two
+        # requests cannot both see the slot as free. SQLite ignores
+        # FOR UPDATE but already allows a single writer at a time.
+        Doctors.objects.select_for_update().filter(pk=doctor.pk).exists()
+        if not is_free(busy_intervals([doctor.pk], start, end)[doctor.pk],
+                       start, end):
+            raise SlotUnavailable(f"{start} is already booked.")
+        return Appointments.objects.create(
+            doctor=doctor, patient=patient, appointment_date=start,
+            duration_minutes=schedule.slot_minutes,
+            status=Status.SCHEDULED, notes=notes)
+
+
+def free_slots(doctor_ids, after=None, count=10, horizon_days=365,
+               window_days=14):
+    """The next ``count`` free slots across ``doctor_ids`` after ``after``.
+
+    Days are scanned in windows of ``window_days``, one bookings query
+    per window, until enough slots are found or the horizon is reached.
+    """
+    doctor_ids = list(doctor_ids)
+    after = after or timezone.now()
+    schedules = defaultdict(list)
+    for schedule in DoctorSchedule.objects.filter(doctor_id__in=doctor_ids):
+        schedules[schedule.weekday].append(schedule)
+    if not schedules:
+        return []
+
+    found = []
+    day = timezone.localtime(after).date()
+    last_day = day + timedelta(days=horizon_days)
+    while day <= last_day and len(found) < count:
+        window_end = min(day + timedelta(days=window_days),
+                         last_day + timedelta(days=1))
+        busy = busy_intervals(doctor_ids, _localize(day, time.min),
+                              _localize(window_end, time.min))
+        while day < window_end:
+            for schedule in schedules[day.weekday()]:
+                for start, end in day_slots(schedule, day):
+                    if start >= after and is_free(
+                            busy[schedule.doctor_id], start, end):
+                        found.append(Slot(start, end, schedule.doctor_id))
+            day += timedelta(days=1)
+    found.sort()
+    return found[:count]
+
+
+def free_slots_for_doctor(doctor, **options):
+    return free_slots([doctor.pk], **options)
+
+
+def free_slots_for_department(department, **options):
+    return free_slots(
+        department.doctors.values_list("pk", flat=True), **options)
+
+
+def followup_candidates(doctor):
+    """Patients who have seen ``doctor`` and have nothing scheduled."""
+    # The visit list is read off the (doctor, appointment_date) index
+    # rather than probing every patient, and the NOT EXISTS is answered
+    # by the partial unique index on scheduled visits.
+    seen = Appointments.objects.filter(
+        doctor=doctor, status=Status.COMPLETED).values("patient_id")
+    scheduled = Appointments.objects.filter(
+        patient=OuterRef("pk"), doctor=doctor, status=Status.SCHEDULED)
+    return Patients.objects.filter(pk__in=seen).filter(~Exists(scheduled))
+
+
+def schedule_followups(doctor, when, notes=None, batch_size=1000):
+    """Book a follow-up at ``when`` for every followup_candidates patient.
+
+    Only patient ids leave the database. Rows go in with
+    bulk_create(ignore_conflicts=True), one transaction per batch, so a
+    patient booked concurrently (or by an earlier run) is skipped rather
+    than failing the batch. bulk_create skips the rollup signals, so the
+    inserted count is added to DailyStatistics here.
+    """
+    patient_ids = list(followup_candidates(doctor).order_by(
+        "pk").values_list("pk", flat=True))
+    booked = Appointments.objects.filter(doctor=doctor, appointment_date=when,
+                                         status=Status.SCHEDULED)
+    key = rollups.appointment_key(Appointments(
+        doctor=doctor, appointment_date=when, status=Status.SCHEDULED))
+    ids = iter(patient_ids)
+    created = 0
+    while batch := list(islice(ids, batch_size)):
+        with transaction.atomic():
+            before = booked.count()
+            Appointments.objects.bulk_create(
+                [Appointments(doctor=doctor, patient_id=patient_id,
+                              appointment_date=when,
+                              status=Status.SCHEDULED, notes=notes)
+                 for patient_id in batch],
+                ignore_conflicts=True)
+            inserted = booked.count() - before
+            if inserted:
+                rollups.bump(key, inserted)
+        created += inserted
+    return Followups(len(patient_ids), created, len(patient_ids) - created)
+
+
+def pk_ranges(rows, batch_size):
+    """Yield [low, high) pk ranges over ``rows``, ``batch_size`` wide.
+
+    Each range starts at the next pk still in ``rows`` at or after the
+    previous range, so a gap between candidates costs one query rather
+    than a batch (and a pause) per ``batch_size`` ids. Rows added past
+    the highest pk seen at the start are left for the next run.
+    """
+    bounds = rows.aggregate(low=Min("pk"), high=Max("pk"))
+    low = bounds["low"]
+    while low is not None:
+        high = min(low + batch_size, bounds["high"] + 1)
+        yield low, high
+        if high > bounds["high"]:
+            return
+        low = rows.filter(pk__gte=high, pk__lte=bounds["high"]).order_by(
+            "pk").values_list("pk", flat=True).first()
+
+
+def close_batch(low, high, before, status=Status.COMPLETED):
+    """Close scheduled appointments before ``before`` with pk in [low, high).
+
+    Returns how many were closed. The rows are locked and read first so
+    the rollup can be moved to the new status.
+    """
+    with transaction.atomic():
+        rows = list(Appointments.objects.select_for_update().filter(
+            pk__gte=low, pk__lt=high, status=Status.SCHEDULED,
+            appointment_date__lt=before,
+        ).values_list("pk", "doctor_id", "appointment_date"))
+        if not rows:
+            return 0
+        Appointments.objects.filter(
+            pk__in=[pk for pk, _, _ in rows]).update(status=status)
+        rollups.move_counts(Counter(
+            (rollups.appointment_key(Appointments(
+                doctor_id=doctor_id, appointment_date=when,
+                status=Status.SCHEDULED)),
+             rollups.appointment_key(Appointments(
+                 doctor_id=doctor_id, appointment_date=when, status=status)))
+            for _, doctor_id, when in rows))
+    return len(rows)
+
+
+def close_past_appointments(before=None, batch_size=1000, pause=0,
+                            start_after=None, status=Status.COMPLETED,
+                            progress=None):
+    """Mark scheduled appointments before ``before`` as ``status``.
+
+    Works through primary-key ranges of ``batch_size`` with a short
+    transaction each, sleeping ``pause`` seconds after each batch that
+    closed rows so bookings are not blocked for long. Ranges holding no
+    overdue rows are skipped (see pk_ranges); ``start_after`` resumes an
+    interrupted run from the last pk it reported.
+    ``progress(closed_so_far, last_pk)`` is called after every batch.
+    """
+    before = before or timezone.now()
+    overdue = Appointments.objects.filter(status=Status.SCHEDULED,
+                                          appointment_date__lt=before)
+    if start_after is not None:
+        overdue = overdue.filter(pk__gt=start_after)
+    started = monotonic()
+    closed, last_pk = 0, start_after
+    wrote = False
+    for low, high in pk_ranges(overdue, batch_size):
+        if wrote and pause:
+            sleep(pause)
+        count = close_batch(low, high, before, status)
+        wrote = count > 0
+        closed += count
+        last_pk = high - 1
+        if progress is not None:
+            progress(closed, last_pk)
+    return Closed(closed, last_pk, monotonic() - started)
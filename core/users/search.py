@@ -0,0 +1,262 @@
+import re
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from .models import Appointments, Medicines, Patients, Prescriptions, Surgeries
+
+# Patient search over full_name, email, phone number and address, and
+# full-text search over prescriptions and appointment/surgery notes.
+#
+# SQLite: an FTS5 table keyed by patient_id, kept current by triggers on
+# users_patients and users_customuser (so bulk_create and raw updates are
+# covered too) and queried with ranked prefix matches. Only the local part
+# of emails is indexed; the domains would match nearly every row. Ranking
+# is limited to the first RANK_WINDOW matches so broad terms cost the
+# same on a few million rows as on a few thousand. Rebuilding either
+# table in a migration drops its triggers; install_triggers() runs again
+# after every migrate to put them back.
+#
+# PostgreSQL: pg_trgm GIN indexes on UPPER(column), the expression
+# icontains compiles to, serve each term; matches on users_patients and on
+# users_customuser are looked up separately so each side can use its own
+# indexes. Results are ranked by trigram word similarity to the name.
+#
+# Clinical text uses FTS5 external-content tables (the text stays in the
+# source table, only the index is stored) with Porter stemming, so
+# "painkillers" finds "Painkiller". Other backends fall back to
+# icontains.
+
+TABLE = "users_patientsearch"
+TERMS = re.compile(r"\w+")
+EMAIL_DOMAINS = re.compile(r"@\S*")
+RANK_WINDOW = 1000
+
+SQLITE_ROW = """
+SELECT p.patient_id, p.full_name, substr(u.email, 1, instr(u.email, '@') - 1),
+       u.phone_number, p.address
+FROM users_patients p JOIN users_customuser u ON u.id = p.user_id
+"""
+SQLITE_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLE}_insert
+    AFTER INSERT ON users_patients BEGIN
+        INSERT INTO {TABLE} (rowid, full_name, email, phone_number, address)
+        {SQLITE_ROW} WHERE p.patient_id = new.patient_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLE}_update
+    AFTER UPDATE OF full_name, address, user_id ON users_patients BEGIN
+        DELETE FROM {TABLE} WHERE rowid = old.patient_id;
+        INSERT INTO {TABLE} (rowid, full_name, email, phone_number, address)
+        {SQLITE_ROW} WHERE p.patient_id = new.patient_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLE}_delete
+    AFTER DELETE ON users_patients BEGIN
+        DELETE FROM {TABLE} WHERE rowid = old.patient_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLE}_user
+    AFTER UPDATE OF email, phone_number ON users_customuser BEGIN
+        UPDATE {TABLE}
+        SET email = substr(new.email, 1, instr(new.email, '@') - 1),
+            phone_number = new.phone_number
+        WHERE rowid IN (
+            SELECT patient_id FROM users_patients WHERE user_id = new.id);
+    END
+    """,
+]
+TEXT_INDEXES = {
+    "prescriptions": (Prescriptions, "users_prescriptionsearch",
+                      ["medicine_detail", "instructions"]),
+    "appointments": (Appointments, "users_appointmentsearch", ["notes"]),
+    "surgeries": (Surgeries, "users_surgerysearch", ["notes"]),
+}
+
+
+def _text_triggers(model, table, columns):
+    source, pk = model._meta.db_table, model._meta.pk.column
+    names = ", ".join(columns)
+    new = ", ".join(f"new.{column}" for column in columns)
+    old = ", ".join(f"old.{column}" for column in columns)
+    delete = (f"INSERT INTO {table} ({table}, rowid, {names}) "
+              f"VALUES ('delete', old.{pk}, {old});")
+    insert = f"INSERT INTO {table} (rowid, {names}) VALUES (new.{pk}, {new});"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {table}_insert AFTER INSERT ON "
+        f"{source} BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_delete AFTER DELETE ON "
+        f"{source} BEGIN {delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_update AFTER UPDATE OF "
+        f"{names} ON {source} BEGIN {delete} {insert} END",
+    ]
+
+
+TRIGGERS = {TABLE: SQLITE_TRIGGERS} | {
+    table: _text_triggers(model, table, columns)
+    for model, table, columns in TEXT_INDEXES.values()
+}
+# Created by migration 0015; search_patients depends on them.
+POSTGRES_INDEXES = {
+    "patient_full_name_upper_trgm": ("users_patients", "full_name"),
+    "patient_address_upper_trgm": ("users_patients", "address"),
+    "user_email_upper_trgm": ("users_customuser", "email"),
+    "user_phone_number_upper_trgm": ("users_customuser", "phone_number"),
+}
+
+
+def install_triggers(connection):
+    # Only for the search tables that exist, which a partly applied set
+    # of migrations may not have.
+    if connection.vendor != "sqlite":
+        return
+    tables = set(connection.introspection.table_names())
+    with connection.cursor() as cursor:
+        for table, triggers in TRIGGERS.items():
+            if table in tables:
+                for trigger in triggers:
+                    cursor.execute(trigger)
+
+
+def rebuild_index(using="default"):
+    """Refill the SQLite search table from scratch."""
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE}")
+        cursor.execute(f"INSERT INTO {TABLE} (rowid, full_name, email, "
+                       f"phone_number, address) {SQLITE_ROW}")
+
+
+def _sqlite_ids(connection, terms, limit):
+    # Earlier words must match whole, the last one (still being typed) as
+    # a prefix, which the prefix indexes answer from a single letter on.
+    # Name and contact hits outrank address ones.
+    match = " ".join([f'"{term}"' for term in terms[:-1]]
+                     + [f'"{terms[-1]}"*'])
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM (SELECT rowid, bm25({TABLE}, 10.0, 5.0, "
+            f"5.0, 1.0) AS score FROM {TABLE} WHERE {TABLE} MATCH %s "
+            f"LIMIT %s) ORDER BY score LIMIT %s",
+            [match, RANK_WINDOW, limit])
+        return [pk for pk, in cursor.fetchall()]
+
+
+def _postgres_matches(terms, using):
+    # One OR across the join could only be checked row by row, so every
+    # term is a UNION of a patients-only and a users-only lookup.
+    patients = Patients.objects.using(using)
+    matches = patients
+    for term in terms:
+        on_patient = patients.filter(
+            Q(full_name__icontains=term) | Q(address__icontains=term))
+        on_user = patients.filter(
+            Q(user__email__icontains=term)
+            | Q(user__phone_number__icontains=term))
+        matches = matches.filter(pk__in=on_patient.values("pk").union(
+            on_user.values("pk")))
+    return matches
+
+
+def _postgres_ids(terms, limit, using):
+    from django.contrib.postgres.search import TrigramWordSimilarity
+
+    patients = _postgres_matches(terms, using)
+    return list(patients.annotate(
+        rank=TrigramWordSimilarity(" ".join(terms), "full_name"),
+    ).order_by("-rank", "full_name").values_list("pk", flat=True)[:limit])
+
+
+def search_patients(query, limit=20, using="default"):
+    """Best matching Patients (with user) for free text, best first."""
+    terms = [term.lower()
+             for term in TERMS.findall(EMAIL_DOMAINS.sub(" ", query))]
+    if not terms:
+        return []
+    connection = connections[using]
+    if connection.vendor == "sqlite":
+        ids = _sqlite_ids(connection, terms, limit)
+    elif connection.vendor == "postgresql":
+        ids = _postgres_ids(terms, limit, using)
+    else:
+        patients = Patients.objects.using(using)
+        for term in terms:
+            patients = patients.filter(
+                Q(full_name__icontains=term) | Q(user__email__icontains=term))
+        ids = list(patients.order_by("full_name").values_list(
+            "pk", flat=True)[:limit])
+    found = Patients.objects.using(using).select_related("user").in_bulk(ids)
+    return [found[pk] for pk in ids if pk in found]
+
+
+def text_filter(kind, query, using="default"):
+    """A Q matching ``kind`` rows that contain every word of ``query``.
+
+    Words match as prefixes, so "pain" finds "painkiller".
+    """
+    model, table, columns = TEXT_INDEXES[kind]
+    terms = [term.lower() for term in TERMS.findall(query)]
+    if not terms:
+        return Q(pk__in=[])
+    if connections[using].vendor == "sqlite":
+        match = " ".join(f'"{term}"*' for term in terms)
+        return Q(pk__in=RawSQL(
+            f"SELECT rowid FROM {table} WHERE {table} MATCH %s", [match]))
+    matches = Q()
+    for term in terms:
+        any_column = Q()
+        for column in columns:
+            any_column |= Q(**{f"{column}__icontains": term})
+        matches &= any_column
+    return matches
+
+
+def search_text(kind, query, limit=20, using="default"):
+    """Best matching ``kind`` rows for ``query``, best first."""
+    model, table, columns = TEXT_INDEXES[kind]
+    terms = [term.lower() for term in TERMS.findall(query)]
+    if not terms:
+        return []
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        return list(model.objects.using(using).filter(
+            text_filter(kind, query, using)).order_by("-pk")[:limit])
+    match = " ".join(f'"{term}"*' for term in terms)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM (SELECT rowid, bm25({table}) AS score "
+            f"FROM {table} WHERE {table} MATCH %s LIMIT %s) "
+            f"ORDER BY score LIMIT %s", [match, RANK_WINDOW, limit])
+        ids = [pk for pk, in cursor.fetchall()]
+    found = model.objects.using(using).in_bulk(ids)
+    return [found[pk] for pk in ids if pk in found]
+
+
+def normalize_medicine(detail):
+    """Vocabulary key for a medicine_detail: lower case, single spaces."""
+    if not detail:
+        return None
+    return " ".join(detail.lower().split()).strip(" .,;:")[:255] or None
+
+
+def medicine_ids(details):
+    """{normalised name: Medicines id}, creating missing vocabulary rows."""
+    names = {normalize_medicine(detail) for detail in details} - {None}
+    Medicines.objects.bulk_create(
+        [Medicines(name=name) for name in names], ignore_conflicts=True)
+    return dict(Medicines.objects.filter(name__in=names).values_list(
+        "name", "pk"))
+
+
+def link_medicines(prescriptions):
+    """Set medicine_id on unsaved Prescriptions before a bulk_create."""
+    ids = medicine_ids(prescription.medicine_detail
+                       for prescription in prescriptions)
+    for prescription in prescriptions:
+        prescription.medicine_id = ids.get(
+            normalize_medicine(prescription.medicine_detail))
@@ -0,0 +1,87 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from . import reference, rollups, search
+from .models import (
+    Appointments, CustomUser, Department, Doctors, Medicines, Patients,
+    Prescriptions, Surgeries
+)
+
+ROLLUP_KEYS = {
+    Appointments: rollups.appointment_key,
+    Surgeries: rollups.surgery_key,
+    Prescriptions: rollups.prescription_key,
+}
+
+
+@receiver(pre_save, sender=Appointments)
+@receiver(pre_save, sender=Surgeries)
+@receiver(pre_save, sender=Prescriptions)
+def remember_rollup_key(sender, instance, raw=False, **kwargs):
+    instance._rollup_key = None
+    if raw or instance.pk is None:
+        return
+    previous = sender.objects.filter(pk=instance.pk).first()
+    if previous is not None:
+        instance._rollup_key = ROLLUP_KEYS[sender](previous)
+
+
+@receiver(post_save, sender=Appointments)
+@receiver(post_save, sender=Surgeries)
+@receiver(post_save, sender=Prescriptions)
+def update_rollup(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    old_key = getattr(instance, "_rollup_key", None)
+    rollups.move(old_key, ROLLUP_KEYS[sender](instance))
+    if sender is Appointments and old_key is not None:
+        # The prescription is dated by the appointment, so it moves too.
+        rollups.reschedule_prescription(instance, old_key[2])
+
+
+@receiver(post_delete, sender=Appointments)
+@receiver(post_delete, sender=Surgeries)
+@receiver(post_delete, sender=Prescriptions)
+def remove_from_rollup(sender, instance, **kwargs):
+    rollups.move(ROLLUP_KEYS[sender](instance), None)
+
+
+@receiver(pre_save, sender=Patients)
+@receiver(pre_save, sender=Doctors)
+def copy_full_name(sender, instance, raw=False, **kwargs):
+    # Fetches the user only for new rows; existing ones are kept current
+    # by sync_full_name below.
+    if raw:
+        return
+    if instance._state.adding or sender.user.is_cached(instance):
+        instance.full_name = instance.user.full_name
+
+
+@receiver(post_save, sender=CustomUser)
+def sync_full_name(sender, instance, update_fields=None, **kwargs):
+    # Logins save only last_login; skip anything that cannot rename.
+    if update_fields is not None and not (
+            {"first_name", "last_name"} & set(update_fields)):
+        return
+    full_name = instance.full_name
+    Patients.objects.filter(user=instance).exclude(
+        full_name=full_name).update(full_name=full_name)
+    if Doctors.objects.filter(user=instance).exclude(
+            full_name=full_name).update(full_name=full_name):
+        reference.invalidate()
+
+
+@receiver(pre_save, sender=Prescriptions)
+def link_medicine(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    name = search.normalize_medicine(instance.medicine_detail)
+    instance.medicine_id = (
+        Medicines.objects.get_or_create(name=name)[0].pk if name else None)
+
+
+@receiver(post_save, sender=Department)
+@receiver(post_save, sender=Doctors)
+@receiver(post_delete, sender=Department)
+@receiver(post_delete, sender=Doctors)
+def invalidate_reference_data(sender, **kwargs):
+    reference.invalidate()
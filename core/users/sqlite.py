@@ -0,0 +1,30 @@
+from django.conf import settings
+
+# Per-connection SQLite tuning, applied from the connection_created signal
+# (see UsersConfig.ready) so every connection Django opens, including
+# those of management commands and test databases, gets the same
+# settings.SQLITE_PRAGMAS. journal_mode=wal is stored in the database
+# file; the rest only last as long as the connection.
+
+
+def apply_pragmas(raw_connection, pragmas):
+    """Run ``PRAGMA name = value`` for each item on a sqlite3 connection."""
+    for name, value in pragmas.items():
+        # Setting journal_mode locks the database even when the mode does
+        # not change, which adds up where every request opens a new
+        # connection (ASGI), so it is read first.
+        if name == "journal_mode" and str(value).lower() == str(
+                pragma_values(raw_connection, [name])[name]).lower():
+            continue
+        raw_connection.execute(f"PRAGMA {name} = {value}")
+
+
+def pragma_values(raw_connection, names):
+    return {name: raw_connection.execute(f"PRAGMA {name}").fetchone()[0]
+            for name in names}
+
+
+def configure_connection(sender, connection, **kwargs):
+    if connection.vendor == "sqlite":
+        apply_pragmas(connection.connection,
+                      getattr(settings, "SQLITE_PRAGMAS", {}))
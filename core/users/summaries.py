@@ -0,0 +1,72 @@
+from asyncio import gather
+from django.db.models import F
+from .models import (
+    Appointments, Insurance, Patient_Doctor, Patients, Prescriptions,
+    Surgeries
+)
+
+# The patient overview as JSON-ready dicts: the patient, their insurance
+# and the latest SUMMARY_LIMIT rows of each related list, every part one
+# query on an indexed patient_id. patient_summary runs the queries one
+# after another; apatient_summary is the same for async views. It gathers
+# the six queries, but Django 5.2's async ORM runs each one through
+# sync_to_async on the request's single thread, so they still execute
+# one at a time, each with a thread handoff on top (bench_patient_summary
+# measured about half the WSGI throughput).
+
+SUMMARY_LIMIT = 50
+
+
+def _patient(patient_id):
+    return Patients.objects.filter(pk=patient_id).values(
+        "patient_id", "full_name", "dob", "gender", "address",
+        email=F("user__email"), phone_number=F("user__phone_number"))
+
+
+def _insurance(patient_id):
+    return Insurance.objects.filter(patient_id=patient_id).values(
+        "provider", "policy_number", "coverage_details")
+
+
+def _lists(patient_id):
+    doctor_name = F("doctor__full_name")
+    return {
+        "appointments": Appointments.objects.filter(
+            patient_id=patient_id).order_by("-appointment_date").values(
+            "appointment_id", "appointment_date", "duration_minutes",
+            "status", "doctor_id", "notes", doctor_name=doctor_name),
+        "prescriptions": Prescriptions.objects.filter(
+            patient_id=patient_id).order_by("-prescription_id").values(
+            "prescription_id", "appointment_id", "medicine_detail",
+            "instructions", "doctor_id", doctor_name=doctor_name),
+        "surgeries": Surgeries.objects.filter(
+            patient_id=patient_id).order_by("-surgery_date").values(
+            "surgery_id", "surgery_date", "surgery_type", "notes",
+            "doctor_id", doctor_name=doctor_name),
+        "doctors": Patient_Doctor.objects.filter(
+            patient_id=patient_id).order_by("doctor__full_name").values(
+            "doctor_id", "relationship_type", doctor_name=doctor_name,
+            specialization=F("doctor__specialization")),
+    }
+
+
+def patient_summary(patient_id):
+    """The overview for ``patient_id``; raises Patients.DoesNotExist."""
+    summary = {"patient": _patient(patient_id).get(),
+               "insurance": _insurance(patient_id).first()}
+    for name, rows in _lists(patient_id).items():
+        summary[name] = list(rows[:SUMMARY_LIMIT])
+    return summary
+
+
+async def apatient_summary(patient_id):
+    """patient_summary for async views; the queries still run serially."""
+    async def fetch(rows):
+        return [row async for row in rows[:SUMMARY_LIMIT]]
+
+    lists = _lists(patient_id)
+    patient, insurance, *rows = await gather(
+        _patient(patient_id).aget(), _insurance(patient_id).afirst(),
+        *map(fetch, lists.values()))
+    return {"patient": patient, "insurance": insurance,
+            **dict(zip(lists, rows))}
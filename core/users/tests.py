@@ -1,3 +1,1869 @@
-from django.test import TestCase
+import base64
+import csv
+import gzip
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from importlib import import_module
+from datetime import date, datetime, time, timedelta
+from io import StringIO
+from unittest import mock, skipUnless
+from asgiref.sync import iscoroutinefunction
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Index
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory, TestCase, TransactionTestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import make_aware, now
+from . import (
+    archive, authentication, benchmarks, exports, managers, reference,
+    reports, rollups, routers, scheduling, search, sqlite, summaries
+)
+from .management.commands import populate_db
+from .benchmarks import QUERIES, compare, run_benchmark
+from .middleware import QueryProfilerMiddleware, fingerprint
+from .paginators import EstimatedCountPaginator
+from .models import (
+    CustomUser, Patients, Doctors, Department, Appointments, Prescriptions,
+    Surgeries, Patient_Doctor, Insurance, DailyStatistics, DoctorSchedule,
+    Medicines, ArchivedPrescriptions
+)
 
-# Create your tests here.
+
+def make_patient(email, last_name="Smith", dob=date(1980, 1, 1),
+                 gender="Male", phone_number=None):
+    user = CustomUser.objects.create(email=email, first_name="Pat",
+                                     last_name=last_name,
+                                     phone_number=phone_number)
+    return Patients.objects.create(user=user, dob=dob, gender=gender)
+
+
+def make_doctor(email, specialization="Dermatology", department=None):
+    user = CustomUser.objects.create(email=email, first_name="Doc",
+                                     last_name="Tor", is_staff=True)
+    return Doctors.objects.create(user=user, specialization=specialization,
+                                  department=department)
+
+
+def make_appointment(patient, doctor, days=0, status="Scheduled"):
+    return Appointments.objects.create(
+        patient=patient, doctor=doctor, status=status,
+        appointment_date=now() + timedelta(days=days))
+
+
+class PopulateDbTests(TestCase):
+    def populate(self, **options):
+        call_command("populate_db", stdout=StringIO(), **options)
+
+    def test_creates_requested_volume_in_batches(self):
+        self.populate(doctors=4, patients=25, appointments=40, surgeries=6,
+                      batch_size=7, seed=3)
+
+        self.assertEqual(Doctors.objects.count(), 4)
+        self.assertEqual(Patients.objects.count(), 25)
+        self.assertEqual(Appointments.objects.count(), 40)
+        self.assertEqual(Prescriptions.objects.count(), 20)
+        self.assertEqual(Surgeries.objects.count(), 6)
+        self.assertTrue(Patient_Doctor.objects.exists())
+
+    def test_users_share_one_unusable_password(self):
+        self.populate(doctors=2, patients=5, appointments=0, surgeries=0)
+
+        passwords = set(CustomUser.objects.values_list("password", flat=True))
+        self.assertEqual(len(passwords), 1)
+        self.assertFalse(CustomUser.objects.first().has_usable_password())
+
+    def test_repeated_runs_keep_emails_and_departments_unique(self):
+        self.populate(doctors=3, patients=3, seed=1)
+        # As in a new process, Faker has forgotten what it handed out.
+        populate_db.fake.unique.clear()
+        self.populate(doctors=3, patients=3, seed=1)
+
+        self.assertEqual(CustomUser.objects.count(), 12)
+        self.assertEqual(Department.objects.count(), 10)
+
+    def test_workers_generate_same_rows_as_single_process(self):
+        def snapshot():
+            return (
+                sorted(CustomUser.objects.values_list(
+                    "first_name", "last_name")),
+                sorted(Appointments.objects.values_list("status", "notes")),
+            )
+
+        options = dict(doctors=3, patients=10, appointments=12,
+                       departments=0, batch_size=4, seed=7)
+        self.populate(**options)
+        single_process = snapshot()
+        CustomUser.objects.all().delete()
+        self.populate(workers=2, **options)
+
+        self.assertEqual(snapshot(), single_process)
+
+
+class BenchQueriesTests(TestCase):
+    def result(self, wall_ms=10.0, queries=1, plan="SCAN"):
+        return {"wall_ms": wall_ms, "queries": queries, "plan": plan}
+
+    def test_every_report_runs_and_is_measured(self):
+        call_command("populate_db", doctors=3, patients=10, appointments=20,
+                     surgeries=5, seed=1, stdout=StringIO())
+
+        for name, func in QUERIES.items():
+            with self.subTest(name):
+                result = run_benchmark(func, runs=1)
+                self.assertGreaterEqual(result["queries"], 1)
+                self.assertGreater(result["peak_kib"], 0)
+
+    def test_compare_flags_slower_plans_and_extra_queries(self):
+        baseline = {"queries": {
+            "same": self.result(),
+            "slower": self.result(),
+            "chatty": self.result(),
+            "replanned": self.result(),
+        }}
+        current = {"queries": {
+            "same": self.result(wall_ms=11.0),
+            "slower": self.result(wall_ms=20.0),
+            "chatty": self.result(queries=3),
+            "replanned": self.result(plan="SEARCH"),
+        }}
+
+        problems = {name: found for name, _, _, found
+                    in compare(baseline, current)}
+
+        self.assertEqual(problems, {
+            "same": [],
+            "slower": ["slower"],
+            "chatty": ["more queries"],
+            "replanned": ["plan changed"],
+        })
+
+    def test_command_writes_and_compares_json(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "run.json")
+            call_command("bench_queries", "b25", runs=1, output=path,
+                         stdout=StringIO())
+            with open(path) as output:
+                self.assertEqual(list(json.load(output)["queries"]),
+                                 ["b25_gender_counts"])
+
+            call_command("bench_queries", compare=[path, path],
+                         stdout=StringIO())
+
+            with open(path) as output:
+                results = json.load(output)
+            results["queries"]["b25_gender_counts"]["queries"] += 1
+            regressed = os.path.join(directory, "regressed.json")
+            with open(regressed, "w") as output:
+                json.dump(results, output)
+            with self.assertRaises(CommandError):
+                call_command("bench_queries", compare=[path, regressed],
+                             stdout=StringIO())
+
+
+class ReportsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name="Skin")
+        cls.dermatologist = make_doctor("derm@example.com",
+                                        department=cls.department)
+        cls.surgeon = make_doctor("surgeon@example.com", "Surgery",
+                                  department=cls.department)
+        # Seen twice recently, by two doctors, with a prescription.
+        cls.regular = make_patient("regular@example.com", dob=date(1950, 5, 1),
+                                   phone_number="0300")
+        # Insured, one appointment, one surgery.
+        cls.insured = make_patient("insured@example.com", last_name="Jones",
+                                   dob=date(1990, 5, 1), gender="Female")
+        # Surgery only.
+        cls.surgical = make_patient("surgical@example.com",
+                                    dob=date(1960, 1, 1))
+
+        first = make_appointment(cls.regular, cls.dermatologist, days=-2)
+        make_appointment(cls.regular, cls.surgeon, days=-1,
+                         status="Completed")
+        make_appointment(cls.insured, cls.dermatologist, days=3)
+        Prescriptions.objects.create(
+            appointment=first, doctor=cls.dermatologist, patient=cls.regular,
+            medicine_detail="Painkiller 50mg")
+        Insurance.objects.create(patient=cls.insured, provider="XYZ Insurance")
+        for patient in (cls.insured, cls.surgical):
+            Surgeries.objects.create(patient=patient, doctor=cls.surgeon,
+                                     surgery_date=now() - timedelta(days=5))
+
+    def assertPatients(self, queryset, *patients):
+        with self.assertNumQueries(1):
+            self.assertCountEqual(list(queryset), patients)
+
+    def test_membership_reports_use_one_statement(self):
+        self.assertPatients(reports.uninsured_patients_seen_since(),
+                            self.regular)
+        self.assertPatients(reports.patients_with_appointment_or_surgery(),
+                            self.regular, self.insured, self.surgical)
+        self.assertPatients(
+            reports.patients_with_appointment_and_prescription(),
+            self.regular)
+        self.assertPatients(
+            reports.patients_with_appointment_no_prescription(),
+            self.insured)
+        self.assertPatients(reports.patients_with_prescription_matching(),
+                            self.regular)
+        self.assertPatients(reports.patients_with_appointment_no_surgery(),
+                            self.regular)
+        self.assertPatients(
+            reports.patients_with_appointment_prescription_surgery())
+        self.assertPatients(reports.patients_with_surgery_no_prescription(),
+                            self.insured, self.surgical)
+        self.assertPatients(reports.patients_by_last_name_prefix("J"),
+                            self.insured)
+        self.assertPatients(reports.patients_without_phone(),
+                            self.insured, self.surgical)
+
+    def test_average_age_is_aggregated_in_the_database(self):
+        with self.assertNumQueries(1):
+            average = reports.average_age_surgery_without_appointment(
+                today=now().replace(year=2020))
+        self.assertEqual(average, 60.0)
+
+    def test_oldest_and_youngest_patient_in_one_statement(self):
+        with self.assertNumQueries(1):
+            oldest, youngest = reports.oldest_and_youngest_patient()
+            self.assertEqual(oldest.user.email, "regular@example.com")
+        self.assertEqual(youngest, self.insured)
+
+    def test_recent_patients_are_listed_once_with_prescriptions(self):
+        # Plus the archive horizon check.
+        with self.assertNumQueries(3):
+            patients = list(reports.recent_patients_with_prescriptions())
+            prescriptions = [len(patient.prescription_patient_id.all())
+                             for patient in patients]
+        self.assertEqual(patients, [self.insured, self.regular])
+        self.assertEqual(prescriptions, [0, 1])
+
+    def test_uninsured_patients_with_several_doctors(self):
+        with self.assertNumQueries(2):
+            patients = list(reports.uninsured_patients_with_several_doctors())
+            doctors = {appointment.doctor for appointment
+                       in patients[0].appointments_as_patient.all()}
+        self.assertEqual(patients, [self.regular])
+        self.assertEqual(doctors, {self.dermatologist, self.surgeon})
+
+    def test_doctor_aggregates(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                list(reports.doctors_with_surgeries_since(minimum=2)),
+                [self.surgeon.pk])
+        with self.assertNumQueries(2):
+            self.assertEqual(
+                list(reports.doctors_with_patient_count_between(low=1,
+                                                                high=3)),
+                [self.dermatologist])
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                list(reports.doctors_with_appointments_since(minimum=1)),
+                [self.dermatologist])
+        with self.assertNumQueries(1):
+            self.assertEqual(reports.top_surgeon(), self.surgeon)
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                list(reports.doctors_with_prescriptions(minimum=1)),
+                [self.dermatologist])
+
+    def test_department_and_insurance_aggregates(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(list(reports.surgeries_per_department()),
+                             [{"name": "Skin", "total_surgeries": 2}])
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                list(reports.departments_without_head(minimum_doctors=2)),
+                [self.department])
+        with self.assertNumQueries(1):
+            self.assertEqual(list(reports.providers_with_active_patients()),
+                             ["XYZ Insurance"])
+        with self.assertNumQueries(1):
+            self.assertEqual(reports.gender_counts(),
+                             {"male_count": 2, "female_count": 1})
+        with self.assertNumQueries(1):
+            self.assertEqual(reports.most_prescribed_medicine(),
+                             {"name": "painkiller 50mg",
+                              "medicine_count": 1})
+
+    def test_appointment_listings(self):
+        # Ranged listings check the archive horizon first.
+        with self.assertNumQueries(2):
+            appointments = list(reports.appointments_between(
+                now() - timedelta(days=7), now() + timedelta(days=7)))
+            names = {appointment.patient.name for appointment in appointments}
+        self.assertEqual(len(appointments), 3)
+        self.assertEqual(names, {"Pat Smith", "Pat Jones"})
+        with self.assertNumQueries(1):
+            self.assertEqual(len(reports.scheduled_between()), 1)
+        with self.assertNumQueries(2):
+            self.assertEqual(len(reports.prescriptions_since()), 1)
+
+    def test_specialization_and_insurance_listings(self):
+        with self.assertNumQueries(1):
+            appointments = list(reports.appointments_for_specialization(
+                "derm"))
+            specializations = {appointment.doctor.specialization
+                               for appointment in appointments}
+        self.assertEqual(len(appointments), 2)
+        self.assertEqual(specializations, {"Dermatology"})
+
+        sunday = make_aware(datetime(2027, 1, 3, 10))
+        monday = sunday + timedelta(days=1)
+        on_sunday, on_monday = [
+            Appointments.objects.create(
+                patient=self.insured, doctor=self.surgeon,
+                appointment_date=when, status="Scheduled")
+            for when in (sunday, monday)]
+        with self.assertNumQueries(1):
+            found = [appointment.pk for appointment in
+                     reports.insured_appointments_excluding_sunday()]
+        self.assertIn(on_monday.pk, found)
+        self.assertNotIn(on_sunday.pk, found)
+        self.assertEqual(
+            list(reports.insured_appointments_excluding_sunday("Other")), [])
+
+        with self.assertNumQueries(2):
+            patients = list(reports.insured_patients_with_surgery())
+            details = [(patient.user.email,
+                        patient.insurance_patient.provider,
+                        len(patient.patient_surgery.all()))
+                       for patient in patients]
+        self.assertEqual(details,
+                         [("insured@example.com", "XYZ Insurance", 1)])
+
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                list(reports.providers_covering_more_than(0)),
+                [{"provider": "XYZ Insurance", "count_provider": 1}])
+        with self.assertNumQueries(1):
+            self.assertEqual(list(reports.providers_covering_more_than(1)),
+                             [])
+
+    def test_doctor_counts(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                {doctor: doctor.count_appoint
+                 for doctor in reports.doctor_appointment_counts()},
+                {self.dermatologist: 2, self.surgeon: 1})
+        with self.assertNumQueries(1):
+            self.assertCountEqual(
+                list(reports.specializations_by_doctor_count()),
+                [{"specialization": "Dermatology", "number_of_doc": 1},
+                 {"specialization": "Surgery", "number_of_doc": 1}])
+
+        with self.assertNumQueries(1):
+            self.assertEqual(list(reports.repeat_visits()), [])
+        make_appointment(self.regular, self.dermatologist, days=5)
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                list(reports.repeat_visits()),
+                [{"patient": self.regular.pk,
+                  "doctor": self.dermatologist.pk, "visit_count": 2}])
+
+    def test_department_listings(self):
+        theatre = Department.objects.create(name="Theatre",
+                                            head_doctor=self.surgeon)
+
+        with self.assertNumQueries(1):
+            heads = {department.name: department.head_doctor
+                     for department in reports.department_head_doctors()}
+        self.assertEqual(heads, {"Skin": None, "Theatre": self.surgeon})
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                [(department, department.count_doc) for department
+                 in reports.departments_by_doctor_count()],
+                [(self.department, 2), (theatre, 0)])
+        with self.assertNumQueries(1):
+            self.assertEqual(list(reports.departments_with_doctors(2)),
+                             [self.department])
+        with self.assertNumQueries(1):
+            self.assertEqual(list(reports.departments_with_doctors()), [])
+
+
+class RollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name="Heart")
+        cls.doctor = make_doctor("heart@example.com", "Cardiology",
+                                 department=cls.department)
+        cls.patient = make_patient("patient@example.com")
+
+    def snapshot(self):
+        return sorted(DailyStatistics.objects.filter(count__gt=0).values_list(
+            "kind", "doctor_id", "date", "status", "count"))
+
+    def test_signals_track_creates_updates_and_deletes(self):
+        first = make_appointment(self.patient, self.doctor)
+        second = make_appointment(self.patient, self.doctor)
+        Prescriptions.objects.create(appointment=first, doctor=self.doctor,
+                                     patient=self.patient)
+        Surgeries.objects.create(patient=self.patient, doctor=self.doctor,
+                                 surgery_date=now())
+
+        second.status = "Completed"
+        second.save()
+        self.assertEqual(
+            {row["doctor"]: row["total"]
+             for row in rollups.appointments_per_doctor(status="Scheduled")},
+            {self.doctor.pk: 1})
+        self.assertEqual(list(rollups.surgeries_per_department()),
+                         [{"doctor__department": self.department.pk,
+                           "total": 1}])
+
+        first.delete()
+        self.assertEqual(list(rollups.prescriptions_per_doctor()), [])
+        self.assertEqual(
+            list(rollups.appointments_per_doctor()),
+            [{"doctor": self.doctor.pk, "total": 1}])
+
+    def test_rebuild_matches_incremental_counts(self):
+        for days, status in ((0, "Scheduled"), (0, "Scheduled"),
+                             (-3, "Completed")):
+            appointment = make_appointment(self.patient, self.doctor, days,
+                                           status)
+        Prescriptions.objects.create(appointment=appointment,
+                                     doctor=self.doctor, patient=self.patient)
+        incremental = self.snapshot()
+
+        self.assertEqual(rollups.rebuild(), 3)
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_rescheduling_moves_the_prescription(self):
+        appointment = make_appointment(self.patient, self.doctor, -10,
+                                       "Completed")
+        Prescriptions.objects.create(appointment=appointment,
+                                     doctor=self.doctor, patient=self.patient)
+
+        appointment.appointment_date = now() - timedelta(days=3)
+        appointment.save()
+        incremental = self.snapshot()
+
+        rollups.rebuild()
+        self.assertEqual(self.snapshot(), incremental)
+        self.assertIn(
+            ("Prescription", self.doctor.pk,
+             (now() - timedelta(days=3)).date(), "", 1), incremental)
+
+    def test_rebuild_picks_up_bulk_loaded_rows(self):
+        Appointments.objects.bulk_create([
+            Appointments(patient=self.patient, doctor=self.doctor,
+                         appointment_date=now(), status="Scheduled")
+            for _ in range(4)
+        ])
+        self.assertEqual(list(rollups.appointments_per_doctor()), [])
+
+        call_command("rebuild_rollups", stdout=StringIO())
+
+        self.assertEqual(list(rollups.appointments_per_doctor()),
+                         [{"doctor": self.doctor.pk, "total": 4}])
+
+    def test_deleting_doctor_cascades_cleanly(self):
+        make_appointment(self.patient, self.doctor)
+
+        self.doctor.delete()
+
+        self.assertFalse(DailyStatistics.objects.exists())
+
+
+class AdminChangelistTests(TestCase):
+    models = (CustomUser, Patients, Department, Doctors, Insurance,
+              Appointments)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin_user = CustomUser.objects.create_superuser(
+            "admin@example.com", "secret")
+
+    def setUp(self):
+        self.client.force_login(self.admin_user)
+
+    def add_rows(self, count):
+        start = Patients.objects.count()
+        for number in range(start, start + count):
+            department = Department.objects.create(name=f"Dept {number}")
+            doctor = make_doctor(f"doctor{number}@example.com",
+                                 department=department)
+            patient = make_patient(f"patient{number}@example.com")
+            department.head_doctor = doctor
+            department.save()
+            Insurance.objects.create(patient=patient, provider="XYZ")
+            make_appointment(patient, doctor)
+
+    def changelist_queries(self, model):
+        url = reverse(f"admin:users_{model._meta.model_name}_changelist")
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(captured)
+
+    def test_changelist_query_count_does_not_grow_with_rows(self):
+        self.add_rows(2)
+        small = {model: self.changelist_queries(model)
+                 for model in self.models}
+        self.add_rows(8)
+
+        for model in self.models:
+            with self.subTest(model.__name__):
+                self.assertEqual(self.changelist_queries(model), small[model])
+
+    def test_full_result_count_is_skipped(self):
+        self.add_rows(1)
+        url = reverse("admin:users_appointments_changelist")
+
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get(url, {"status": "Scheduled"})
+
+        counts = [query["sql"] for query in captured
+                  if "COUNT(*)" in query["sql"]
+                  and "users_appointments" in query["sql"]]
+        self.assertEqual(len(counts), 1)
+
+
+@override_settings(ESTIMATED_COUNT_THRESHOLD=3)
+class EstimatedCountPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_doctor("doctor@example.com")
+        cls.patient = make_patient("patient@example.com")
+
+    def setUp(self):
+        cache.clear()
+
+    def add_appointments(self, count, status="Scheduled"):
+        for _ in range(count):
+            make_appointment(self.patient, self.doctor, status=status)
+
+    def count(self, queryset):
+        return EstimatedCountPaginator(queryset.order_by("pk"), 10).count
+
+    def test_large_unfiltered_count_is_cached(self):
+        self.add_appointments(4)
+        self.assertEqual(self.count(Appointments.objects.all()), 4)
+        self.add_appointments(1)
+
+        with self.assertNumQueries(1):
+            # Only the failed sqlite_stat1 lookup; the count is cached.
+            self.assertEqual(self.count(Appointments.objects.all()), 4)
+
+    def test_planner_estimate_is_used_after_analyze(self):
+        self.add_appointments(6)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        self.add_appointments(2)
+
+        self.assertEqual(self.count(Appointments.objects.all()), 6)
+
+    def test_small_or_filtered_sets_count_exactly(self):
+        self.add_appointments(2)
+        with self.assertNumQueries(2):
+            # The sqlite_stat1 lookup and one COUNT(*), reused as is.
+            self.assertEqual(self.count(Appointments.objects.all()), 2)
+        self.add_appointments(3, status="Completed")
+
+        self.assertEqual(
+            self.count(Appointments.objects.filter(status="Completed")), 3)
+        self.assertEqual(self.count(Appointments.objects.all()), 5)
+
+
+class AppointmentsApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = CustomUser.objects.create_user(
+            "staff@example.com", "secret", is_staff=True)
+        cls.doctor = make_doctor("doctor@example.com")
+        cls.other_doctor = make_doctor("other@example.com")
+        cls.patient = make_patient("patient@example.com")
+        # Several appointments share a timestamp to exercise the tiebreak.
+        when = now()
+        cls.appointments = Appointments.objects.bulk_create([
+            Appointments(patient=cls.patient,
+                         doctor=cls.doctor if number % 3 else cls.other_doctor,
+                         appointment_date=when + timedelta(days=number // 2),
+                         status="Completed" if number % 2 else "Scheduled")
+            for number in range(11)
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def get(self, **params):
+        return self.client.get(reverse("appointments_api"), params)
+
+    def walk(self, **params):
+        ids, cursor = [], None
+        while True:
+            if cursor:
+                params["cursor"] = cursor
+            page = self.get(**params).json()
+            ids.extend(row["appointment_id"] for row in page["results"])
+            cursor = page["next"]
+            if cursor is None:
+                return ids
+
+    def test_pages_cover_every_row_once_in_order(self):
+        expected = list(Appointments.objects.order_by(
+            "appointment_date", "appointment_id"
+        ).values_list("appointment_id", flat=True))
+
+        self.assertEqual(self.walk(limit=2), expected)
+
+    def test_filters(self):
+        self.assertEqual(
+            sorted(self.walk(doctor=self.other_doctor.pk, status="Scheduled")),
+            sorted(Appointments.objects.filter(
+                doctor=self.other_doctor, status="Scheduled"
+            ).values_list("appointment_id", flat=True)))
+        start = self.appointments[4].appointment_date
+        self.assertEqual(
+            len(self.walk(**{"from": start.isoformat(), "limit": 3})), 7)
+
+    def test_deep_page_is_a_single_query(self):
+        cursor = self.get(limit=8).json()["next"]
+
+        with CaptureQueriesContext(connection) as captured:
+            self.get(limit=8, cursor=cursor)
+
+        appointment_queries = [query for query in captured
+                               if "users_appointments" in query["sql"]]
+        self.assertEqual(len(appointment_queries), 1)
+        self.assertNotIn("OFFSET", appointment_queries[0]["sql"])
+
+    def test_rejects_bad_input_and_non_staff(self):
+        self.assertEqual(self.get(cursor="nope").status_code, 400)
+        self.assertEqual(self.get(limit=0).status_code, 400)
+        self.assertEqual(self.get(doctor="x").status_code, 400)
+        self.assertEqual(self.get(doctor="9" * 23).status_code, 400)
+        self.assertEqual(self.get(**{"from": "2024-02-30T00:00:00"})
+                         .status_code, 400)
+        cursor = base64.urlsafe_b64encode(
+            f"{now().isoformat()}|{'9' * 23}".encode()).decode()
+        self.assertEqual(self.get(cursor=cursor).status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.get().status_code, 403)
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = CustomUser.objects.create_user(
+            "staff@example.com", "secret", is_staff=True)
+        doctor = make_doctor("doctor@example.com")
+        patient = make_patient("patient@example.com", last_name="Khan")
+        for days in range(5):
+            appointment = make_appointment(patient, doctor, days)
+            Prescriptions.objects.create(appointment=appointment,
+                                         doctor=doctor, patient=patient,
+                                         medicine_detail=f"Dose {days}")
+
+    def test_command_streams_csv_with_joined_names(self):
+        output = StringIO()
+        call_command("export_records", "prescriptions", stdout=output)
+
+        rows = list(csv.DictReader(StringIO(output.getvalue())))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]["patient_name"], "Pat Khan")
+        self.assertEqual(rows[0]["doctor_name"], "Doc Tor")
+        self.assertEqual(rows[4]["medicine_detail"], "Dose 4")
+
+    def test_command_writes_gzipped_ndjson(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "appointments.ndjson.gz")
+            call_command("export_records", "appointments", format="ndjson",
+                         gzip=True, output=path, chunk_size=2)
+            with gzip.open(path, "rt") as output:
+                rows = [json.loads(line) for line in output]
+
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]["status"], "Scheduled")
+
+    def test_endpoint_streams_single_query(self):
+        self.client.force_login(self.staff)
+        url = reverse("export_records", args=["surgeries"])
+        Surgeries.objects.create(patient=Patients.objects.get(),
+                                 doctor=Doctors.objects.get(),
+                                 surgery_date=now())
+
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url, {"gzip": "1"})
+            body = gzip.decompress(b"".join(response.streaming_content))
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertEqual(len(body.decode().splitlines()), 2)
+        self.assertEqual(len([query for query in captured
+                              if "users_surgeries" in query["sql"]]), 1)
+
+    def test_endpoint_rejects_unknown_exports(self):
+        self.client.force_login(self.staff)
+
+        self.assertEqual(self.client.get(reverse(
+            "export_records", args=["patients"])).status_code, 404)
+        self.assertEqual(self.client.get(reverse(
+            "export_records", args=["surgeries"]),
+            {"format": "xml"}).status_code, 400)
+
+    def test_endpoint_rejects_impossible_dates(self):
+        self.client.force_login(self.staff)
+
+        response = self.client.get(
+            reverse("export_records", args=["appointments"]),
+            {"from": "2024-02-30T00:00:00"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(),
+                         {"error": "from must be an ISO 8601 datetime."})
+
+
+class SchedulingTests(TestCase):
+    # 2030-01-07 is a Monday.
+    monday = date(2030, 1, 7)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name="Clinic")
+        cls.doctor = make_doctor("doctor@example.com",
+                                 department=cls.department)
+        cls.colleague = make_doctor("colleague@example.com",
+                                    department=cls.department)
+        cls.patient = make_patient("patient@example.com")
+        DoctorSchedule.objects.create(doctor=cls.doctor, weekday=0,
+                                      start_time=time(9),
+                                      end_time=time(11))
+        DoctorSchedule.objects.create(doctor=cls.colleague, weekday=0,
+                                      start_time=time(10),
+                                      end_time=time(11), slot_minutes=60)
+
+    def at(self, hour, minute=0, day=None):
+        return make_aware(datetime.combine(day or self.monday,
+                                           time(hour, minute)))
+
+    def test_booking_takes_the_slot(self):
+        appointment = scheduling.book_appointment(self.doctor, self.patient,
+                                                  self.at(9, 30))
+
+        self.assertEqual(appointment.duration_minutes, 30)
+        with self.assertRaises(scheduling.SlotUnavailable):
+            scheduling.book_appointment(self.doctor, self.patient,
+                                        self.at(9, 30))
+
+    def test_booking_rejects_times_off_the_grid(self):
+        for start in (self.at(9, 15), self.at(11),
+                      self.at(9, day=self.monday + timedelta(days=1))):
+            with self.subTest(start=start):
+                with self.assertRaises(scheduling.SlotUnavailable):
+                    scheduling.book_appointment(self.doctor, self.patient,
+                                                start)
+
+    def test_longer_existing_appointment_blocks_overlapping_slots(self):
+        Appointments.objects.create(
+            patient=self.patient, doctor=self.doctor, status="Scheduled",
+            appointment_date=self.at(8, 45), duration_minutes=60)
+
+        with self.assertRaises(scheduling.SlotUnavailable):
+            scheduling.book_appointment(self.doctor, self.patient,
+                                        self.at(9, 30))
+        scheduling.book_appointment(self.doctor, self.patient,
+                                    self.at(10))
+
+    def test_cancelled_appointments_free_their_slot(self):
+        appointment = scheduling.book_appointment(self.doctor, self.patient,
+                                                  self.at(9))
+        appointment.status = "Cancelled"
+        appointment.save()
+
+        scheduling.book_appointment(self.doctor, self.patient, self.at(9))
+
+    def test_next_free_slots_for_doctor(self):
+        scheduling.book_appointment(self.doctor, self.patient, self.at(9))
+        scheduling.book_appointment(self.doctor, self.patient,
+                                    self.at(10, 30))
+
+        with self.assertNumQueries(2):
+            slots = scheduling.free_slots_for_doctor(
+                self.doctor, after=self.at(0), count=3)
+
+        self.assertEqual([slot.start for slot in slots],
+                         [self.at(9, 30), self.at(10), self.at(9, day=date(
+                             2030, 1, 14))])
+
+    def test_next_free_slots_for_department_merge_doctors(self):
+        slots = scheduling.free_slots_for_department(
+            self.department, after=self.at(9, 45), count=3)
+
+        self.assertEqual(
+            [(slot.start, slot.doctor_id) for slot in slots],
+            [(self.at(10), self.doctor.pk), (self.at(10), self.colleague.pk),
+             (self.at(10, 30), self.doctor.pk)])
+
+
+class FollowupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_doctor("doctor@example.com")
+        cls.other = make_doctor("other@example.com")
+        cls.seen = [make_patient(f"seen{i}@example.com") for i in range(5)]
+        for patient in cls.seen:
+            make_appointment(patient, cls.doctor, -10, "Completed")
+        cls.booked = make_patient("booked@example.com")
+        make_appointment(cls.booked, cls.doctor, -10, "Completed")
+        make_appointment(cls.booked, cls.doctor, 5)
+        cls.cancelled = make_patient("cancelled@example.com")
+        make_appointment(cls.cancelled, cls.doctor, -10, "Cancelled")
+        cls.elsewhere = make_patient("elsewhere@example.com")
+        make_appointment(cls.elsewhere, cls.other, -10, "Completed")
+        cls.when = now() + timedelta(days=3)
+
+    def test_only_seen_and_unbooked_patients_are_eligible(self):
+        self.assertQuerySetEqual(
+            scheduling.followup_candidates(self.doctor).order_by("pk"),
+            self.seen)
+
+    def test_books_in_batches_and_updates_rollup(self):
+        with CaptureQueriesContext(connection) as queries:
+            result = scheduling.schedule_followups(self.doctor, self.when,
+                                                   batch_size=2)
+
+        self.assertEqual(result, (5, 5, 0))
+        inserts = [query for query in queries.captured_queries
+                   if query["sql"].startswith('INSERT OR IGNORE INTO '
+                                              '"users_appointments"')]
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(
+            Appointments.objects.filter(doctor=self.doctor,
+                                        appointment_date=self.when).count(),
+            5)
+        self.assertEqual(
+            {row["doctor"]: row["total"]
+             for row in rollups.appointments_per_doctor(status="Scheduled")},
+            {self.doctor.pk: 6})
+
+        self.assertEqual(
+            scheduling.schedule_followups(self.doctor, self.when), (0, 0, 0))
+
+    def test_rows_booked_after_the_eligibility_query_are_skipped(self):
+        seen = Patients.objects.filter(pk__in=[p.pk for p in self.seen])
+        Appointments.objects.bulk_create([Appointments(
+            doctor=self.doctor, patient=self.seen[0],
+            appointment_date=self.when, status="Scheduled")])
+
+        with mock.patch.object(scheduling, "followup_candidates",
+                               return_value=seen):
+            result = scheduling.schedule_followups(self.doctor, self.when)
+
+        self.assertEqual(result, (5, 4, 1))
+
+    def test_command_reports_counts(self):
+        stdout = StringIO()
+        call_command("schedule_followups", self.doctor.pk,
+                     when=self.when, stdout=stdout)
+        self.assertIn("Scheduled 5 follow-ups", stdout.getvalue())
+        self.assertIn("(5 eligible, 0 already booked)", stdout.getvalue())
+
+        with self.assertRaises(CommandError):
+            call_command("schedule_followups", 0, stdout=StringIO())
+
+
+class ClosePastAppointmentsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_doctor("doctor@example.com")
+        cls.patient = make_patient("patient@example.com")
+        cls.past = [make_appointment(cls.patient, cls.doctor, -days)
+                    for days in range(1, 8)]
+        cls.future = make_appointment(cls.patient, cls.doctor, 2)
+        cls.cancelled = make_appointment(cls.patient, cls.doctor, -1,
+                                         "Cancelled")
+        rollups.rebuild()
+
+    def statuses(self):
+        return dict(Appointments.objects.values_list("pk", "status"))
+
+    def snapshot_after_rebuild(self):
+        with transaction.atomic():
+            rollups.rebuild()
+            rows = sorted(DailyStatistics.objects.filter(
+                count__gt=0).values_list("doctor_id", "date", "status",
+                                         "count"))
+            transaction.set_rollback(True)
+        return rows
+
+    def test_closes_overdue_rows_in_pk_ranges(self):
+        with CaptureQueriesContext(connection) as queries:
+            result = scheduling.close_past_appointments(batch_size=3)
+
+        self.assertEqual(result.closed, 7)
+        self.assertEqual(result.last_pk, self.past[-1].pk)
+        updates = [query for query in queries.captured_queries
+                   if query["sql"].startswith('UPDATE "users_appointments"')]
+        self.assertEqual(len(updates), 3)
+        statuses = self.statuses()
+        self.assertTrue(all(statuses[appointment.pk] == "Completed"
+                            for appointment in self.past))
+        self.assertEqual(statuses[self.future.pk], "Scheduled")
+        self.assertEqual(statuses[self.cancelled.pk], "Cancelled")
+
+    def test_rollup_follows_the_bulk_update(self):
+        scheduling.close_past_appointments(batch_size=2)
+        expected = self.snapshot_after_rebuild()
+
+        self.assertEqual(
+            sorted(DailyStatistics.objects.filter(count__gt=0).values_list(
+                "doctor_id", "date", "status", "count")), expected)
+
+    def test_skips_ranges_without_overdue_rows(self):
+        Appointments.objects.filter(
+            pk__in=[appointment.pk for appointment in self.past[1:6]]
+        ).update(status="Cancelled")
+
+        with CaptureQueriesContext(connection) as queries, \
+                mock.patch("users.scheduling.sleep") as sleep:
+            result = scheduling.close_past_appointments(batch_size=1,
+                                                        pause=0.5)
+
+        self.assertEqual(result.closed, 2)
+        updates = [query for query in queries.captured_queries
+                   if query["sql"].startswith('UPDATE "users_appointments"')]
+        self.assertEqual(len(updates), 2)
+        sleep.assert_called_once_with(0.5)
+
+    def test_resumes_after_a_pk(self):
+        result = scheduling.close_past_appointments(
+            start_after=self.past[3].pk)
+
+        self.assertEqual(result.closed, 3)
+        statuses = self.statuses()
+        self.assertEqual([statuses[appointment.pk]
+                          for appointment in self.past],
+                         ["Scheduled"] * 4 + ["Completed"] * 3)
+
+    def test_nothing_overdue(self):
+        scheduling.close_past_appointments()
+
+        with self.assertNumQueries(1):
+            result = scheduling.close_past_appointments()
+        self.assertEqual(result.closed, 0)
+
+    def test_command_reports_throughput(self):
+        stdout = StringIO()
+        call_command("close_past_appointments", sleep=0, batch_size=4,
+                     verbosity=2, stdout=stdout)
+
+        output = stdout.getvalue()
+        self.assertIn("4 closed, up to id", output)
+        self.assertIn("Closed 7 appointments in", output)
+        self.assertIn("/s), up to id", output)
+
+    def test_commands_reject_unparseable_datetimes(self):
+        for args in (["close_past_appointments", "--before", "last tuesday"],
+                     ["export_records", "appointments", "--from", "2024-13"],
+                     ["schedule_followups", str(self.doctor.pk), "--when",
+                      "soon"]):
+            with self.subTest(args[0]), self.assertRaises(CommandError):
+                call_command(*args, stdout=StringIO())
+        self.assertEqual(Appointments.objects.filter(
+            status="Completed").count(), 0)
+
+        call_command("close_past_appointments", "--before",
+                     (now() - timedelta(days=3)).strftime("%Y-%m-%d %H:%M"),
+                     sleep=0, stdout=StringIO())
+        # The naive value is read in TIME_ZONE: days 4 to 7 are before it.
+        self.assertEqual(Appointments.objects.filter(
+            status="Completed").count(), 4)
+
+
+@override_settings(QUERY_PROFILER_ENABLED=True,
+                   QUERY_PROFILER_N_PLUS_ONE_THRESHOLD=3)
+class QueryProfilerMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        doctor = make_doctor("doctor@example.com")
+        for i in range(4):
+            make_appointment(make_patient(f"p{i}@example.com"), doctor)
+
+    def profile(self, view):
+        def get_response(request):
+            view()
+            return HttpResponse()
+
+        middleware = QueryProfilerMiddleware(get_response)
+        with self.assertLogs("users.queries", "INFO") as logs:
+            response = middleware(RequestFactory().get("/report/"))
+        return response, logs.output
+
+    def test_lazy_loads_in_a_loop_are_flagged(self):
+        response, output = self.profile(lambda: [
+            str(appointment) for appointment in Appointments.objects.all()])
+
+        self.assertRegex(response["Server-Timing"],
+                         r'^db;dur=[\d.]+;desc="5 queries, 1 repeated"$')
+        self.assertIn("path=/report/ status=200 queries=5", output[0])
+        self.assertEqual(len(output), 2)
+        self.assertIn("N+1 suspected path=/report/ count=4", output[1])
+
+    def test_joined_query_is_clean(self):
+        response, output = self.profile(lambda: [
+            str(appointment) for appointment in
+            Appointments.objects.select_related("patient")])
+
+        self.assertIn('desc="1 queries, 0 repeated"',
+                      response["Server-Timing"])
+        self.assertEqual(len(output), 1)
+
+    async def test_async_requests_stay_async(self):
+        async def get_response(request):
+            await summaries.apatient_summary(
+                await Patients.objects.values_list("pk", flat=True).afirst())
+            return HttpResponse()
+
+        middleware = QueryProfilerMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        with self.assertLogs("users.queries", "INFO"):
+            response = await middleware(RequestFactory().get("/summary/"))
+
+        self.assertIn('desc="7 queries, 0 repeated"',
+                      response["Server-Timing"])
+
+    def test_in_lists_share_a_fingerprint(self):
+        self.assertEqual(fingerprint("WHERE id IN (%s, %s)"),
+                         fingerprint("WHERE id IN (%s, %s, %s)"))
+
+    @override_settings(QUERY_PROFILER_ENABLED=False)
+    def test_disabled_middleware_is_dropped(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            QueryProfilerMiddleware(HttpResponse)
+
+
+class FullNameTests(TestCase):
+    def test_copied_on_create_and_kept_in_sync(self):
+        patient = make_patient("patient@example.com")
+        doctor = make_doctor("doctor@example.com")
+        self.assertEqual(patient.full_name, "Pat Smith")
+        self.assertEqual(doctor.full_name, "Doc Tor")
+
+        user = patient.user
+        user.last_name = None
+        user.save()
+        patient.refresh_from_db()
+        self.assertEqual(patient.full_name, "Pat")
+
+    def test_login_saves_do_not_touch_profiles(self):
+        patient = make_patient("patient@example.com")
+        with self.assertNumQueries(1):
+            patient.user.save(update_fields=["last_login"])
+
+    def test_str_of_related_rows_skips_the_user_join(self):
+        patient = make_patient("patient@example.com")
+        make_appointment(patient, make_doctor("doctor@example.com"))
+        Insurance.objects.create(patient=patient, provider="Acme")
+
+        appointment = Appointments.objects.get()
+        insurance = Insurance.objects.get()
+        with self.assertNumQueries(2):
+            self.assertTrue(str(appointment).startswith("Pat Smith - "))
+            self.assertEqual(str(insurance), "Insurance for Pat Smith")
+
+    def test_backfill_matches_display_name(self):
+        patient = make_patient("patient@example.com")
+        Patients.objects.update(full_name="")
+        backfill = import_module("users.migrations.0009_full_name")
+
+        backfill.backfill_full_names(django_apps, None)
+
+        patient.refresh_from_db()
+        self.assertEqual(patient.full_name, "Pat Smith")
+
+
+class PatientSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.smith = make_patient("sam.smith@example.com", "Smith",
+                                 phone_number="5550101")
+        cls.smithers = make_patient("waylon@example.com", "Smithers")
+        cls.jones = make_patient("oldmail@example.com", "Jones")
+        cls.jones.address = "12 Smith Street"
+        cls.jones.save()
+        cls.staff = CustomUser.objects.create(email="staff@example.com",
+                                              is_staff=True)
+
+    def search(self, query, **options):
+        return [patient.pk for patient in
+                search.search_patients(query, **options)]
+
+    def test_prefix_matches_are_ranked_name_first(self):
+        with self.assertNumQueries(2):
+            found = self.search("smi")
+
+        self.assertEqual(set(found[:2]), {self.smith.pk, self.smithers.pk})
+        self.assertEqual(found[2], self.jones.pk)
+        self.assertEqual(self.search("pat smithe"), [self.smithers.pk])
+        self.assertEqual(self.search("smi", limit=1), found[:1])
+
+    def test_matches_email_phone_and_address(self):
+        self.assertEqual(self.search("waylon"), [self.smithers.pk])
+        self.assertEqual(self.search("waylon@example.com"),
+                         [self.smithers.pk])
+        self.assertEqual(self.search("555"), [self.smith.pk])
+        self.assertEqual(self.search("street"), [self.jones.pk])
+        self.assertEqual(self.search(' "*- '), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        user = self.jones.user
+        user.last_name = "Jonas"
+        user.email = "jj.doe@example.org"
+        user.save()
+
+        self.assertEqual(self.search("jonas"), [self.jones.pk])
+        self.assertEqual(self.search("jj doe"), [self.jones.pk])
+        self.assertEqual(self.search("oldmail"), [])
+
+        self.smith.delete()
+        self.assertEqual(self.search("5550101"), [])
+
+    def test_single_initial_matches_any_name_part(self):
+        Patients.objects.filter(pk=self.smithers.pk).update(
+            full_name="Quinn Smithers")
+
+        self.assertEqual(self.search("q"), [self.smithers.pk])
+        # Last names too, ranked like longer prefixes.
+        found = self.search("s")
+        self.assertEqual(set(found[:2]), {self.smith.pk, self.smithers.pk})
+        self.assertEqual(found, self.search("sm"))
+        self.assertEqual(self.search("S"), found)
+
+    def test_rebuild_index(self):
+        search.rebuild_index()
+        self.assertEqual(self.search("jones"), [self.jones.pk])
+
+    def test_postgres_matches_combine_patient_and_user_columns(self):
+        # Plain SQL, so it runs on every backend.
+        def matches(*terms):
+            return set(search._postgres_matches(terms, "default")
+                       .values_list("pk", flat=True))
+
+        self.assertEqual(matches("smith"), {self.smith.pk, self.smithers.pk,
+                                            self.jones.pk})
+        self.assertEqual(matches("smith", "555"), {self.smith.pk})
+        self.assertEqual(matches("street", "oldmail"), {self.jones.pk})
+        self.assertEqual(matches("waylon", "street"), set())
+
+    @skipUnless(connection.vendor == "postgresql", "PostgreSQL only")
+    def test_postgres_lookups_use_the_trigram_indexes(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        plan = search._postgres_matches(["smith"], "default").explain()
+
+        for name in search.POSTGRES_INDEXES:
+            self.assertIn(name, plan)
+        self.assertEqual(set(self.search("smith")),
+                         {self.smith.pk, self.smithers.pk, self.jones.pk})
+
+    def test_api(self):
+        url = reverse("patient_search")
+        self.client.force_login(self.staff)
+
+        response = self.client.get(url, {"q": "smithers"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"], [{
+            "patient_id": self.smithers.pk, "full_name": "Pat Smithers",
+            "email": "waylon@example.com", "phone_number": None,
+            "dob": "1980-01-01"}])
+        self.assertEqual(self.client.get(url, {"q": "x", "limit": 0})
+                         .status_code, 400)
+
+
+class ClinicalSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_doctor("doctor@example.com")
+        cls.patient = make_patient("patient@example.com")
+        cls.visit = make_appointment(cls.patient, cls.doctor)
+        cls.visit.notes = "Follow-up on persistent migraines"
+        cls.visit.save()
+        cls.prescription = Prescriptions.objects.create(
+            appointment=cls.visit, doctor=cls.doctor, patient=cls.patient,
+            medicine_detail="Painkiller  50mg.", instructions="After meals")
+        cls.surgery = Surgeries.objects.create(
+            patient=cls.patient, doctor=cls.doctor, surgery_date=now(),
+            notes="Knee arthroscopy, no complications")
+
+    def test_stemmed_prefix_search_per_kind(self):
+        self.assertEqual(search.search_text("prescriptions", "painkillers"),
+                         [self.prescription])
+        self.assertEqual(search.search_text("prescriptions", "meal"),
+                         [self.prescription])
+        self.assertEqual(search.search_text("appointments", "migraine"),
+                         [self.visit])
+        self.assertEqual(search.search_text("surgeries", "knee arthro"),
+                         [self.surgery])
+        self.assertEqual(search.search_text("surgeries", "migraine"), [])
+        self.assertEqual(search.search_text("surgeries", "--"), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.surgery.notes = "Hip replacement"
+        self.surgery.save()
+        self.assertEqual(search.search_text("surgeries", "knee"), [])
+        self.assertEqual(search.search_text("surgeries", "hip"),
+                         [self.surgery])
+
+        self.prescription.delete()
+        self.assertFalse(Prescriptions.objects.filter(
+            search.text_filter("prescriptions", "painkiller")).exists())
+
+    def test_medicine_vocabulary_is_normalised(self):
+        second = make_appointment(self.patient, self.doctor)
+        Prescriptions.objects.create(appointment=second, doctor=self.doctor,
+                                     patient=self.patient,
+                                     medicine_detail="painkiller 50MG")
+        self.assertEqual(list(Medicines.objects.values_list("name",
+                                                            flat=True)),
+                         ["painkiller 50mg"])
+        self.assertEqual(reports.most_prescribed_medicine(),
+                         {"name": "painkiller 50mg", "medicine_count": 2})
+
+        self.prescription.medicine_detail = "Ibuprofen 400mg"
+        self.prescription.save()
+        self.assertEqual(self.prescription.medicine.name, "ibuprofen 400mg")
+
+    def test_bulk_created_prescriptions_are_linked(self):
+        prescriptions = [Prescriptions(
+            appointment=make_appointment(self.patient, self.doctor),
+            doctor=self.doctor, patient=self.patient, medicine_detail=detail)
+            for detail in ("Ibuprofen 400mg", "ibuprofen 400mg ", None)]
+
+        search.link_medicines(prescriptions)
+        Prescriptions.objects.bulk_create(prescriptions)
+
+        first, second, third = prescriptions
+        self.assertEqual(first.medicine_id, second.medicine_id)
+        self.assertIsNone(third.medicine_id)
+        self.assertCountEqual(search.search_text("prescriptions", "ibuprofen",
+                                                 limit=5), [first, second])
+
+    def test_backfill_links_existing_prescriptions(self):
+        Prescriptions.objects.update(medicine=None)
+        Medicines.objects.all().delete()
+        migration = import_module("users.migrations.0011_clinical_search")
+
+        migration.link_medicines(django_apps, None)
+
+        self.prescription.refresh_from_db()
+        self.assertEqual(self.prescription.medicine.name, "painkiller 50mg")
+
+
+class ReferenceCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.heart = Department.objects.create(name="Heart")
+        cls.doctor = make_doctor("heart@example.com", "Cardiology",
+                                 department=cls.heart)
+
+    def setUp(self):
+        reference.invalidate()
+        reference.reset_stats()
+
+    def test_lookups_are_read_through(self):
+        with self.assertNumQueries(4):
+            first = (reference.departments(), reference.specializations(),
+                     reference.doctors_in("Cardiology"),
+                     reference.department_heads())
+        with self.assertNumQueries(0):
+            second = (reference.departments(), reference.specializations(),
+                      reference.doctors_in("Cardiology"),
+                      reference.department_heads())
+
+        self.assertEqual(first, second)
+        self.assertEqual(second[0], [self.heart])
+        self.assertEqual(second[2], [self.doctor])
+        self.assertEqual(reference.stats()["departments", "hit"], 1)
+        self.assertEqual(reference.stats()["departments", "miss"], 1)
+
+    def test_saves_and_deletes_invalidate(self):
+        reference.doctors_in("Cardiology")
+        other = make_doctor("other@example.com", "Cardiology")
+        self.assertEqual(reference.doctors_in("Cardiology"),
+                         [self.doctor, other])
+
+        reference.departments()
+        self.heart.name = "Cardiology"
+        self.heart.save()
+        self.assertEqual(reference.departments()[0].name, "Cardiology")
+
+        other.delete()
+        self.assertEqual(reference.doctors_in("Cardiology"), [self.doctor])
+
+    def test_doctor_rename_invalidates(self):
+        reference.doctors_in("Cardiology")
+        user = self.doctor.user
+        user.first_name = "Ada"
+        user.save()
+
+        self.assertEqual(reference.doctors_in("Cardiology")[0].name,
+                         "Ada Tor")
+
+    def test_metrics_endpoint(self):
+        reference.departments()
+        reference.departments()
+
+        response = self.client.get(reverse("reference_cache_metrics"))
+
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn("# TYPE hospital_reference_cache_requests_total "
+                      "counter", body)
+        self.assertIn('hospital_reference_cache_requests_total{lookup='
+                      '"departments",result="hit"} 1', body)
+
+
+class SqliteTuningTests(TestCase):
+    def test_connections_get_pragmas(self):
+        connection.ensure_connection()
+
+        self.assertEqual(connection.transaction_mode, "IMMEDIATE")
+        self.assertEqual(sqlite.pragma_values(
+            connection.connection,
+            ["synchronous", "cache_size", "busy_timeout", "temp_store"]),
+            {"synchronous": 1, "cache_size": -64 * 1024,
+             "busy_timeout": 10_000, "temp_store": 2})
+
+    def test_file_database_switches_to_wal(self):
+        with tempfile.TemporaryDirectory() as directory:
+            raw = sqlite3.connect(os.path.join(directory, "db.sqlite3"))
+            try:
+                sqlite.apply_pragmas(raw, settings.SQLITE_PRAGMAS)
+                self.assertEqual(sqlite.pragma_values(
+                    raw, ["journal_mode"]), {"journal_mode": "wal"})
+            finally:
+                raw.close()
+
+    def test_failed_concurrency_run_restores_journal_mode(self):
+        journal_modes = []
+
+        def apply_pragmas(raw, pragmas):
+            if threading.current_thread() is not threading.main_thread():
+                raise RuntimeError("worker failed")
+            journal_modes.append(pragmas["journal_mode"])
+
+        with mock.patch.object(benchmarks.sqlite, "apply_pragmas",
+                               apply_pragmas), \
+                mock.patch("threading.excepthook"), \
+                self.assertRaises(threading.BrokenBarrierError):
+            benchmarks.run_concurrency("baseline", readers=1, writers=1)
+
+        self.assertEqual(journal_modes, ["delete", "wal"])
+
+    def test_bench_concurrency_rejects_unknown_profile(self):
+        with self.assertRaises(CommandError):
+            call_command("bench_concurrency", "fast", stdout=StringIO())
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    # The test database is the primary and a second SQLite file the
+    # replica; replicate() copies the primary over it, as replication
+    # would, so rows created afterwards exist on the primary only. The
+    # alias is added in setUpClass; "__all__" picks it up from there.
+    databases = "__all__"
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        connections.settings[routers.REPLICA] = {
+            **connections.settings["default"],
+            "NAME": os.path.join(cls.directory.name, "replica.sqlite3"),
+        }
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[routers.REPLICA].close()
+        del connections[routers.REPLICA]
+        del connections.settings[routers.REPLICA]
+        cls.directory.cleanup()
+
+    def replicate(self):
+        primary, replica = connections["default"], connections[routers.REPLICA]
+        primary.ensure_connection()
+        replica.ensure_connection()
+        primary.connection.backup(replica.connection)
+
+    def setUp(self):
+        self.doctor = make_doctor("doc@example.com")
+        self.seen = make_patient("seen@example.com")
+        make_appointment(self.seen, self.doctor)
+        self.replicate()
+        self.late = make_patient("late@example.com")
+        make_appointment(self.late, self.doctor)
+
+    def test_reports_read_the_replica(self):
+        patients = list(reports.patients_without_phone())
+
+        self.assertEqual(patients, [self.seen])
+        self.assertEqual(patients[0]._state.db, routers.REPLICA)
+        self.assertEqual(reports.gender_counts()["male_count"], 1)
+
+    def test_exports_read_the_replica(self):
+        rows = list(exports.export_rows("appointments"))
+
+        self.assertEqual([row[3] for row in rows], [self.seen.pk])
+
+    def test_other_reads_and_writes_use_the_primary(self):
+        self.assertEqual(Patients.objects.count(), 2)
+
+        with routers.replica_reads():
+            self.assertEqual(Patients.objects.count(), 1)
+            make_patient("new@example.com")
+            # Read-after-write: the rest of the block reads the primary.
+            self.assertEqual(Patients.objects.count(), 3)
+
+        self.assertEqual(Patients.objects.using(routers.REPLICA).count(), 1)
+
+    def test_transactions_read_the_primary(self):
+        with transaction.atomic():
+            make_patient("new@example.com")
+
+            self.assertEqual(reports.patients_without_phone().count(), 3)
+
+
+class PatientSummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_doctor("doc@example.com")
+        cls.patient = make_patient("pat@example.com")
+        appointment = make_appointment(cls.patient, cls.doctor)
+        Prescriptions.objects.create(appointment=appointment,
+                                     doctor=cls.doctor, patient=cls.patient,
+                                     medicine_detail="Ibuprofen 200mg")
+        Surgeries.objects.create(patient=cls.patient, doctor=cls.doctor,
+                                 surgery_date=now(), surgery_type="Knee")
+        Insurance.objects.create(patient=cls.patient, provider="XYZ")
+        Patient_Doctor.objects.create(patient=cls.patient, doctor=cls.doctor)
+
+    def url(self, name="patient_summary", patient_id=None):
+        return reverse(name, args=[patient_id or self.patient.pk])
+
+    def test_one_query_per_section(self):
+        with self.assertNumQueries(6):
+            summary = summaries.patient_summary(self.patient.pk)
+
+        self.assertEqual(summary["patient"]["email"], "pat@example.com")
+        self.assertEqual(summary["insurance"]["provider"], "XYZ")
+        for name in ("appointments", "prescriptions", "surgeries",
+                     "doctors"):
+            self.assertEqual(len(summary[name]), 1)
+            self.assertEqual(summary[name][0]["doctor_name"], "Doc Tor")
+
+    async def test_async_view_matches_sync_view(self):
+        await self.async_client.aforce_login(self.doctor.user)
+
+        response = await self.async_client.get(self.url())
+        sync_response = await self.async_client.get(
+            self.url("patient_summary_sync"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), sync_response.json())
+
+    async def test_async_view_answers_404_and_403(self):
+        response = await self.async_client.get(self.url())
+        self.assertEqual(response.status_code, 403)
+
+        await self.async_client.aforce_login(self.doctor.user)
+        response = await self.async_client.get(
+            self.url(patient_id=self.patient.pk + 1000))
+        self.assertEqual(response.status_code, 404)
+
+
+class PatientDoctorThroughTests(TransactionTestCase):
+    # Schema changes cannot run inside TestCase's transaction on SQLite.
+    before = [("users", "0011_clinical_search")]
+    after = [("users", "0012_patient_doctor_through")]
+
+    def test_panel_is_one_table(self):
+        doctor = make_doctor("doc@example.com")
+        first = make_patient("first@example.com")
+        second = make_patient("second@example.com")
+        doctor.patient.add(first)
+        Patient_Doctor.objects.create(patient=second, doctor=doctor,
+                                      relationship_type="Specialist")
+
+        self.assertEqual(set(doctor.patient.all()), {first, second})
+        self.assertEqual(Patient_Doctor.objects.get(patient=first)
+                         .relationship_type, "Primary_Care")
+        top = reports.top_doctors_by_patients().get()
+        self.assertEqual(top.patient_count, 2)
+
+    def test_migration_merges_both_tables(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        old = executor.loader.project_state(self.before).apps
+        OldUser = old.get_model("users", "CustomUser")
+        OldPatients = old.get_model("users", "Patients")
+        OldDoctors = old.get_model("users", "Doctors")
+        OldPatientDoctor = old.get_model("users", "Patient_Doctor")
+        doctor = OldDoctors.objects.create(
+            user=OldUser.objects.create(email="doc@example.com"))
+        first, second = [
+            OldPatients.objects.create(
+                dob=date(1980, 1, 1),
+                user=OldUser.objects.create(email=f"{number}@example.com"))
+            for number in range(2)]
+        doctor.patient.add(first, second)
+        for relationship_type in ("Specialist", "Consultation"):
+            OldPatientDoctor.objects.create(
+                patient=first, doctor=doctor,
+                relationship_type=relationship_type)
+
+        executor.loader.build_graph()
+        executor.migrate(self.after)
+
+        self.assertEqual(
+            sorted(Patient_Doctor.objects.values_list(
+                "patient_id", "relationship_type")),
+            [(first.pk, "Specialist"), (second.pk, "Primary_Care")])
+
+        executor.loader.build_graph()
+        executor.migrate(self.before)
+        self.assertEqual(doctor.patient.count(), 2)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+
+class UniqueScheduledVisitMigrationTests(TransactionTestCase):
+    before = [("users", "0007_doctor_schedules")]
+    after = [("users", "0008_appointment_unique_scheduled_visit")]
+
+    def test_duplicate_bookings_are_cancelled(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        old = executor.loader.project_state(self.before).apps
+        OldUser = old.get_model("users", "CustomUser")
+        OldAppointments = old.get_model("users", "Appointments")
+        OldStatistics = old.get_model("users", "DailyStatistics")
+        doctor = old.get_model("users", "Doctors").objects.create(
+            user=OldUser.objects.create(email="doc@example.com"))
+        patient = old.get_model("users", "Patients").objects.create(
+            dob=date(1980, 1, 1),
+            user=OldUser.objects.create(email="pat@example.com"))
+        when = now()
+        booked = [
+            OldAppointments.objects.create(
+                doctor=doctor, patient=patient, appointment_date=when,
+                status="Scheduled")
+            for _ in range(3)]
+        OldStatistics.objects.create(
+            kind="Appointment", doctor=doctor, date=when.date(),
+            status="Scheduled", count=3)
+
+        executor.loader.build_graph()
+        executor.migrate(self.after)
+
+        self.assertEqual(
+            list(Appointments.objects.order_by("pk").values_list(
+                "status", flat=True)),
+            ["Scheduled", "Cancelled", "Cancelled"])
+        self.assertEqual(Appointments.objects.get(
+            status="Scheduled").pk, booked[0].pk)
+        self.assertEqual(
+            dict(DailyStatistics.objects.values_list("status", "count")),
+            {"Scheduled": 1, "Cancelled": 2})
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+
+class ExplainIndexesTests(TransactionTestCase):
+    def index_names(self):
+        with connection.cursor() as cursor:
+            return set(connection.introspection.get_constraints(
+                cursor, Appointments._meta.db_table))
+
+    def test_skips_missing_indexes_and_restores_the_rest(self):
+        names = self.index_names()
+        missing = Index(fields=["duration_minutes"],
+                        name="appointment_missing_idx")
+        out = StringIO()
+        with mock.patch.object(Appointments._meta, "indexes",
+                               [*Appointments._meta.indexes, missing]):
+            call_command("explain_indexes", runs=1, yes=True, stdout=out)
+
+        output = out.getvalue()
+        self.assertIn("appointment_doctor_date_idx", output)
+        self.assertIn("Not in the database, skipped: "
+                      "appointment_missing_idx", output)
+        self.assertIn("Kept, as they back constraints: "
+                      "appointment_unique_scheduled_visit", output)
+        self.assertEqual(self.index_names(), names)
+
+    def test_needs_yes_on_every_backend(self):
+        for vendor in ("sqlite", "postgresql"):
+            with self.subTest(vendor), \
+                    mock.patch.object(connection, "vendor", vendor), \
+                    self.assertRaisesMessage(CommandError, "--yes"):
+                call_command("explain_indexes", stdout=StringIO())
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.doctor = make_doctor("doc@example.com")
+        self.patient = make_patient("pat@example.com")
+        self.old = make_appointment(self.patient, self.doctor, days=-400,
+                                    status="Completed")
+        self.prescription = Prescriptions.objects.create(
+            appointment=self.old, doctor=self.doctor, patient=self.patient,
+            medicine_detail="Ibuprofen")
+        make_appointment(self.patient, self.doctor, days=-390,
+                         status="Cancelled")
+        self.overdue = make_appointment(self.patient, self.doctor,
+                                        days=-380)
+        self.recent = make_appointment(self.patient, self.doctor, days=-10,
+                                       status="Completed")
+        Surgeries.objects.create(patient=self.patient, doctor=self.doctor,
+                                 surgery_date=now() - timedelta(days=500))
+        Surgeries.objects.create(patient=self.patient, doctor=self.doctor,
+                                 surgery_date=now())
+        self.cutoff = now() - timedelta(days=365)
+
+    def totals(self):
+        return {row["doctor"]: row["total"]
+                for row in rollups.appointments_per_doctor()}
+
+    def test_moves_old_closed_records_in_batches(self):
+        totals = self.totals()
+
+        result = archive.archive_records(self.cutoff, batch_size=1)
+
+        self.assertEqual(result[:3], (2, 1, 1))
+        self.assertEqual(set(Appointments.objects.all()),
+                         {self.overdue, self.recent})
+        self.assertFalse(Prescriptions.objects.exists())
+        self.assertEqual(ArchivedPrescriptions.objects.get().appointment_id,
+                         self.old.pk)
+        self.assertEqual(Surgeries.objects.count(), 1)
+        self.assertEqual(self.totals(), totals)
+        rollups.rebuild()
+        self.assertEqual(self.totals(), totals)
+        self.assertEqual(archive.archive_records(self.cutoff)[:3],
+                         (0, 0, 0))
+
+    def test_sleeps_only_after_batches_that_moved_rows(self):
+        # Past the overdue and recent rows, which are never candidates.
+        make_appointment(self.patient, self.doctor, days=-370,
+                         status="Completed")
+
+        with mock.patch("users.archive.sleep") as sleep:
+            result = archive.archive_records(self.cutoff, batch_size=1,
+                                             pause=0.5)
+
+        # Four one-row batches, so three pauses and none for the gap.
+        self.assertEqual(result[:3], (3, 1, 1))
+        self.assertEqual(sleep.call_count, 3)
+
+    def test_records_span_hot_and_archived_rows(self):
+        archive.archive_records(self.cutoff)
+
+        rows = list(archive.records("appointments",
+                                    start=now() - timedelta(days=395)))
+        self.assertEqual([(row["appointment_id"], row["archived"])
+                          for row in rows],
+                         [(self.old.pk + 1, True), (self.overdue.pk, False),
+                          (self.recent.pk, False)])
+        prescriptions = list(archive.records("prescriptions",
+                                             patient_id=self.patient.pk))
+        self.assertEqual(prescriptions[0]["prescription_id"],
+                         self.prescription.pk)
+
+        # Ranges after the archive horizon never read the archive.
+        with CaptureQueriesContext(connection) as captured:
+            rows = list(archive.records(
+                "appointments", start=now() - timedelta(days=30)))
+        self.assertEqual([row["appointment_id"] for row in rows],
+                         [self.recent.pk])
+        self.assertNotIn("users_archivedappointments",
+                         captured[-1]["sql"])
+
+    def test_exports_and_reports_include_archived_rows(self):
+        start = now() - timedelta(days=450)
+
+        def exported(kind, start=None):
+            return [row[0] for row in exports.export_rows(kind, start)]
+
+        def counts():
+            return (
+                exported("appointments", start), exported("prescriptions"),
+                exported("surgeries", start),
+                {doctor: doctor.count_appoint
+                 for doctor in reports.doctor_appointment_counts()},
+                reports.most_prescribed_medicine(),
+                list(reports.surgeries_per_department()),
+                list(reports.doctors_with_prescriptions(minimum=1)),
+                set(reports.patients_with_appointment_and_prescription()),
+            )
+
+        before = counts()
+        archive.archive_records(self.cutoff)
+
+        self.assertEqual(counts(), before)
+        # Ranges after the horizon only read the hot rows.
+        self.assertEqual(exported("appointments", now() - timedelta(days=30)),
+                         [self.recent.pk])
+
+    def test_ranged_reports_refuse_archived_ranges(self):
+        archive.archive_records(self.cutoff)
+
+        with self.assertRaisesMessage(archive.ArchivedRange,
+                                      "appointments up to"):
+            reports.appointments_between(now() - timedelta(days=450))
+        with self.assertRaises(archive.ArchivedRange):
+            reports.prescriptions_since(now() - timedelta(days=450))
+        self.assertEqual(
+            list(reports.appointments_between(now() - timedelta(days=11))),
+            [self.recent])
+
+    def test_command(self):
+        out = StringIO()
+        call_command("archive_records", "--older-than", "365", "--sleep",
+                     "0", stdout=out)
+        self.assertIn("Archived 2 appointments, 1 prescriptions and 1 "
+                      "surgeries", out.getvalue())
+
+
+@override_settings(PASSWORD_HASHERS=[
+    "django.contrib.auth.hashers.MD5PasswordHasher"])
+class BulkCreateUsersTests(TestCase):
+    def test_creates_users_and_skips_taken_emails(self):
+        CustomUser.objects.create_user("taken@example.com")
+
+        created, duplicates = CustomUser.objects.bulk_create_users([
+            {"email": "taken@EXAMPLE.com"},
+            {"email": "new@Example.COM", "password": "secret",
+             "first_name": "New"},
+            {"email": "new@example.com", "password": "other"},
+            {"email": "nopass@example.com", "is_staff": True},
+            {"email": "hashed@example.com",
+             "password_hash": make_password("imported")},
+        ])
+
+        self.assertEqual(duplicates, ["new@example.com", "taken@example.com"])
+        self.assertEqual([user.email for user in created],
+                         ["new@example.com", "nopass@example.com",
+                          "hashed@example.com"])
+        users = CustomUser.objects.in_bulk(
+            [user.email for user in created], field_name="email")
+        self.assertTrue(users["new@example.com"].check_password("secret"))
+        self.assertEqual(users["new@example.com"].first_name, "New")
+        self.assertFalse(users["nopass@example.com"].has_usable_password())
+        self.assertTrue(users["nopass@example.com"].is_staff)
+        self.assertTrue(
+            users["hashed@example.com"].check_password("imported"))
+
+    def test_rejects_unknown_hashes_before_writing(self):
+        with self.assertRaises(ValueError):
+            CustomUser.objects.bulk_create_users([
+                {"email": "a@example.com", "password": "secret"},
+                {"email": "b@example.com", "password_hash": "plaintext"},
+            ])
+        self.assertFalse(CustomUser.objects.exists())
+
+    def test_hashes_passwords_across_processes(self):
+        passwords = [f"secret-{number}" for number in range(10)]
+
+        hashed = managers.hash_passwords(passwords, workers=2)
+
+        self.assertEqual(len(set(hashed)), len(passwords))
+        for password, encoded in zip(passwords, hashed):
+            self.assertTrue(check_password(password, encoded))
+
+
+# Cheap costs so the tests do not spend seconds hashing.
+FAST_HASHER_PARAMS = {
+    "pbkdf2": {"iterations": 1000},
+    "scrypt": {"work_factor": 2 ** 10, "block_size": 8, "parallelism": 1},
+}
+
+
+@override_settings(PASSWORD_HASHERS=["users.hashers.ScryptPasswordHasher",
+                                     "users.hashers.PBKDF2PasswordHasher"],
+                   PASSWORD_HASHER_PARAMS=FAST_HASHER_PARAMS)
+class LoginTests(TestCase):
+    def setUp(self):
+        authentication.reset_stats()
+        self.user = CustomUser.objects.create(
+            email="staff@example.com", is_staff=True,
+            password=make_password("secret", hasher="pbkdf2_sha256"))
+
+    def test_login_rehashes_with_the_preferred_tier_and_costs(self):
+        self.assertTrue(self.user.password.startswith("pbkdf2_sha256$1000$"))
+
+        authenticate(username="staff@example.com", password="secret")
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("scrypt$1024$"))
+
+        with override_settings(
+                PASSWORD_HASHERS=["users.hashers.ScryptPasswordHasher"],
+                PASSWORD_HASHER_PARAMS={"scrypt": {
+                    **FAST_HASHER_PARAMS["scrypt"], "work_factor": 2 ** 11}}):
+            self.assertIsNotNone(
+                authenticate(username="staff@example.com", password="secret"))
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("scrypt$2048$"))
+
+    def test_only_logins_write_last_login(self):
+        self.assertIsNone(self.user.last_login)
+        self.user.first_name = "Renamed"
+        self.user.save()
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.last_login)
+
+        self.assertTrue(self.client.login(username="staff@example.com",
+                                          password="secret"))
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+
+    def test_model_backend_sessions_stay_logged_in(self):
+        self.client.force_login(
+            self.user, backend="django.contrib.auth.backends.ModelBackend")
+
+        self.assertEqual(self.client.get(reverse("auth_metrics")).status_code,
+                         200)
+
+    def test_rejected_password_is_hashed_once(self):
+        with mock.patch("django.contrib.auth.base_user.check_password",
+                        return_value=False) as check:
+            self.assertIsNone(authenticate(username="staff@example.com",
+                                           password="wrong"))
+        self.assertEqual(check.call_count, 1)
+
+    def test_metrics_endpoint(self):
+        authenticate(username="staff@example.com", password="secret")
+        authenticate(username="staff@example.com", password="wrong")
+        authenticate(username="nobody@example.com", password="wrong")
+        url = reverse("auth_metrics")
+
+        self.assertEqual(self.client.get(url).status_code, 403)
+        # The login above rehashed the password.
+        self.user.refresh_from_db()
+        self.client.force_login(self.user)
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn("# TYPE hospital_auth_duration_seconds histogram", body)
+        self.assertIn('hospital_auth_duration_seconds_bucket{'
+                      'outcome="failure",hasher="scrypt",le="+Inf"} 2', body)
+        self.assertIn('hospital_auth_duration_seconds_count{'
+                      'outcome="success",hasher="scrypt"} 1', body)
@@ -1,6 +1,19 @@
 from django.urls import path
-from .views import home
+from .views import (
+    home, appointments_api, auth_metrics, export_records, patient_search,
+    patient_summary, patient_summary_sync, reference_cache_metrics
+)
 
 urlpatterns = [
     path("", home, name="home"),
+    path("api/appointments/", appointments_api, name="appointments_api"),
+    path("api/export/<str:kind>/", export_records, name="export_records"),
+    path("api/patients/search/", patient_search, name="patient_search"),
+    path("api/patients/<int:patient_id>/summary/", patient_summary,
+         name="patient_summary"),
+    path("api/patients/<int:patient_id>/summary/sync/", patient_summary_sync,
+         name="patient_summary_sync"),
+    path("metrics/reference-cache/", reference_cache_metrics,
+         name="reference_cache_metrics"),
+    path("metrics/auth/", auth_metrics, name="auth_metrics"),
 ]